@@ -0,0 +1,113 @@
+"""
+agent/action_log.py — Buffered, bulk writer for action_log rows.
+Tools append entries in memory (no DB round-trip on the tool's critical path);
+a background task flushes them with one multi-row INSERT when
+ACTION_LOG_FLUSH_SIZE entries are pending or every ACTION_LOG_FLUSH_INTERVAL
+seconds. run_agent flushes at the end of every run, success or failure.
+One writer per process, shared by all concurrent runs.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import insert
+
+from db.base import session_context
+from db.models import ActionLog
+
+log = logging.getLogger(__name__)
+
+ACTION_LOG_FLUSH_SIZE = int(os.environ.get("ACTION_LOG_FLUSH_SIZE", "50"))
+ACTION_LOG_FLUSH_INTERVAL = float(os.environ.get("ACTION_LOG_FLUSH_INTERVAL", "2"))
+# Entries kept for retry when Postgres is unavailable; oldest are dropped beyond this
+ACTION_LOG_MAX_BUFFER = 10_000
+
+
+class ActionLogWriter:
+    def __init__(self) -> None:
+        self._buffer: List[Dict[str, Any]] = []
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._wake: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    def add(
+        self,
+        run_id: int,
+        tool_used: str,
+        input_data: Dict[str, Any],
+        output_data: Dict[str, Any],
+        requires_approval: bool = False,
+        approval_status: Optional[str] = None,
+    ) -> None:
+        """Queue one entry. Must be called from the event loop; never blocks."""
+        self._ensure_started()
+        self._buffer.append({
+            "run_id": run_id,
+            "tool_used": tool_used,
+            "input_data": input_data,
+            "output_data": output_data,
+            "requires_approval": requires_approval,
+            "approval_status": approval_status,
+            "timestamp": datetime.now(tz=timezone.utc),
+        })
+        if len(self._buffer) >= ACTION_LOG_FLUSH_SIZE:
+            self._wake.set()
+
+    def _ensure_started(self) -> None:
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._wake = asyncio.Event()
+            self._task = asyncio.create_task(self._flush_loop(), name="action-log-writer")
+
+    async def _flush_loop(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=ACTION_LOG_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        """Write everything buffered so far in one bulk INSERT. Returns only after
+        every entry added before the call is written (or put back after a failure),
+        including entries a concurrent flush had already taken."""
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            rows, self._buffer = self._buffer, []
+            if not rows:
+                return
+            try:
+                async with session_context() as db:
+                    await db.execute(insert(ActionLog), rows)
+            except BaseException as exc:
+                # Put them back in front of anything queued meanwhile, bounded;
+                # this includes cancellation mid-INSERT, so aclose still writes them
+                self._buffer = (rows + self._buffer)[-ACTION_LOG_MAX_BUFFER:]
+                if not isinstance(exc, Exception):
+                    raise
+                log.error("Action log flush of %d entries failed: %s", len(rows), exc)
+
+    async def aclose(self) -> None:
+        """Stop the background loop (letting an in-progress flush finish) and write the rest."""
+        task, self._task = self._task, None
+        if task is not None:
+            self._stopping = True
+            self._wake.set()
+            try:
+                await task
+            except Exception as exc:
+                log.error("Action log writer stopped with an error: %s", exc)
+        await self.flush()
+
+
+action_log_writer = ActionLogWriter()
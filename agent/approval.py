@@ -1,9 +1,13 @@
 """
-agent/approval.py — Approval gate with Redis pub/sub wait.
+agent/approval.py — Approval gate for consequential tool calls.
 When an agent tool requires user approval, this module:
   1. Creates a pending_approval DB row.
   2. Sends a Telegram message with Approve/Reject inline buttons.
-  3. Subscribes to Redis channel and waits up to APPROVAL_TIMEOUT_SECONDS.
+  3. Waits for the decision, in one of two modes (AGENT_APPROVAL_MODE):
+     • suspend (default) — the tool calls LangGraph interrupt(); the run is
+       checkpointed to Postgres and the worker slot is released. agent/graph.py
+       creates the approval and resumes the run when the decision arrives.
+     • wait — subscribes to Redis and blocks up to APPROVAL_TIMEOUT_SECONDS.
   4. Returns True (approved), False (rejected), or None (timeout/expired).
 """
 
@@ -17,47 +21,41 @@ from typing import Any, Dict, Optional
 
 import redis.asyncio as aioredis
 
+from agent.checkpoint import AGENT_APPROVAL_MODE
+from agent.context import current_run, get_run
 from core.config import get_settings
-from core.encryption import decrypt_dict
+from core.credentials import get_credentials
 from db.base import session_context
-from db.models import Integration, PendingApproval
+from db.models import PendingApproval
 
 log = logging.getLogger(__name__)
 
 APPROVAL_TIMEOUT_SECONDS = 600  # 10 minutes
 REDIS_APPROVAL_CHANNEL_PREFIX = "toora:approvals:"
+# Sorted set of approval ids of suspended runs, scored by expiry (see worker/scheduler.py)
+REDIS_APPROVAL_EXPIRY_KEY = "toora:approval_expiry"
 
 DEFAULT_USER_ID = 1
 
 
-async def _get_telegram_creds() -> Optional[Dict[str, str]]:
-    async with session_context() as db:
-        from sqlalchemy import select
-        result = await db.execute(
-            select(Integration).where(
-                Integration.user_id == DEFAULT_USER_ID,
-                Integration.platform == "telegram",
-                Integration.status == "connected",
-            )
-        )
-        integration = result.scalar_one_or_none()
-        if not integration:
-            return None
-        return decrypt_dict(integration.encrypted_credentials)
+async def _get_telegram_creds(user_id: Optional[int] = None) -> Optional[Dict[str, str]]:
+    run = get_run()
+    if user_id is None:
+        user_id = run.user_id if run else DEFAULT_USER_ID
+    if run is not None and run.user_id == user_id:
+        # Loaded once at run start — no DB round-trip or decrypt
+        return run.creds("telegram")
+    return await get_credentials(user_id, "telegram")
 
 
-async def require_approval(
+async def create_approval(
     run_id: int,
     action_description: str,
     full_context: Dict[str, Any],
-) -> Optional[bool]:
-    """
-    Create a pending approval, notify via Telegram, and wait for decision.
-    Returns True if approved, False if rejected, None if timed out or error.
-    """
-    settings = get_settings(required=["DATABASE_URL", "REDIS_URL"])
-
-    # Create DB record
+    user_id: Optional[int] = None,
+) -> int:
+    """Create a pending approval row and send the Telegram Approve/Reject message.
+    Returns the approval id."""
     expires = datetime.now(tz=timezone.utc) + timedelta(seconds=APPROVAL_TIMEOUT_SECONDS)
     async with session_context() as db:
         approval = PendingApproval(
@@ -75,7 +73,7 @@ async def require_approval(
     log.info("Approval %d created for run %d: %s", approval_id, run_id, action_description)
 
     # Send Telegram approval request
-    tg_creds = await _get_telegram_creds()
+    tg_creds = await _get_telegram_creds(user_id)
     if tg_creds:
         from agent.integrations.telegram import build_approval_keyboard, send_message
         text = (
@@ -99,6 +97,51 @@ async def require_approval(
         except Exception as exc:
             log.error("Failed to send Telegram approval message: %s", exc)
 
+    return approval_id
+
+
+async def expire_approval(approval_id: int) -> bool:
+    """Mark a still-pending approval as expired. Returns True if it was pending."""
+    async with session_context() as db:
+        from sqlalchemy import select
+        result = await db.execute(
+            select(PendingApproval).where(PendingApproval.id == approval_id)
+        )
+        row = result.scalar_one_or_none()
+        if row and row.status == "pending":
+            row.status = "expired"
+            row.resolved_at = datetime.now(tz=timezone.utc)
+            return True
+    return False
+
+
+async def request_approval(
+    action_description: str,
+    full_context: Dict[str, Any],
+) -> Optional[bool]:
+    """
+    Approval gate used by tools. In suspend mode this raises LangGraph's interrupt
+    on first execution (the run is checkpointed and released) and returns the
+    decision when the tool is re-executed on resume.
+    """
+    if AGENT_APPROVAL_MODE == "suspend":
+        from langgraph.types import interrupt
+        return interrupt({"action_description": action_description, "full_context": full_context})
+    return await require_approval(current_run().run_id, action_description, full_context)
+
+
+async def require_approval(
+    run_id: int,
+    action_description: str,
+    full_context: Dict[str, Any],
+) -> Optional[bool]:
+    """
+    Create a pending approval, notify via Telegram, and wait for decision.
+    Returns True if approved, False if rejected, None if timed out or error.
+    """
+    settings = get_settings(required=["DATABASE_URL", "REDIS_URL"])
+    approval_id = await create_approval(run_id, action_description, full_context)
+
     # Subscribe to Redis and wait
     r = aioredis.from_url(settings.redis_url, decode_responses=True)
     channel = f"{REDIS_APPROVAL_CHANNEL_PREFIX}{approval_id}"
@@ -123,14 +166,6 @@ async def require_approval(
 
     # Update DB if timed out
     if decision is None:
-        async with session_context() as db:
-            from sqlalchemy import select
-            result = await db.execute(
-                select(PendingApproval).where(PendingApproval.id == approval_id)
-            )
-            row = result.scalar_one_or_none()
-            if row and row.status == "pending":
-                row.status = "expired"
-                row.resolved_at = datetime.now(tz=timezone.utc)
+        await expire_approval(approval_id)
 
     return decision
@@ -0,0 +1,116 @@
+"""
+agent/cache.py — Process-wide cache of LLM clients and compiled ReAct agents.
+Both depend only on the OpenRouter key, model, enabled tools and system prompt,
+so they are keyed by a fingerprint of those inputs and reused across runs. All
+ChatOpenAI clients share one keep-alive HTTP pool to openrouter.ai.
+Entries are dropped when the backend publishes on REDIS_AGENT_CACHE_CHANNEL
+(agent config or OpenRouter credentials changed).
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from typing import Any, List, Optional
+
+import httpx
+from langchain_openai import ChatOpenAI
+from langgraph.prebuilt import create_react_agent
+
+log = logging.getLogger(__name__)
+
+REDIS_AGENT_CACHE_CHANNEL = "toora:agent_cache:invalidate"
+OPENROUTER_BASE = "https://openrouter.ai/api/v1"
+MODEL = "deepseek/deepseek-chat-v3-0324"
+AGENT_CACHE_SIZE = 32
+
+_llms: "OrderedDict[str, ChatOpenAI]" = OrderedDict()
+_agents: "OrderedDict[str, Any]" = OrderedDict()
+_http_client: Optional[httpx.AsyncClient] = None
+
+
+def fingerprint(*parts: Any) -> str:
+    raw = json.dumps(parts, sort_keys=True, default=str)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _remember(cache: OrderedDict, key: str, value: Any) -> Any:
+    cache[key] = value
+    cache.move_to_end(key)
+    while len(cache) > AGENT_CACHE_SIZE:
+        cache.popitem(last=False)
+    return value
+
+
+def _openrouter_http_client() -> httpx.AsyncClient:
+    global _http_client
+    if _http_client is None:
+        _http_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(120.0, connect=10.0),
+            limits=httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60),
+        )
+    return _http_client
+
+
+def get_llm(api_key: str, model: str = MODEL) -> ChatOpenAI:
+    key = fingerprint(api_key, model)
+    llm = _llms.get(key)
+    if llm is not None:
+        _llms.move_to_end(key)
+        return llm
+    return _remember(_llms, key, ChatOpenAI(
+        model=model,
+        base_url=OPENROUTER_BASE,
+        api_key=api_key,
+        temperature=0.2,
+        http_async_client=_openrouter_http_client(),
+    ))
+
+
+def get_agent(api_key: str, tools: List[Any], system_prompt: str, checkpointer: Any = None, model: str = MODEL) -> Any:
+    """Return a compiled agent for these inputs, compiling it on first use."""
+    key = fingerprint(api_key, model, sorted(t.name for t in tools), system_prompt, checkpointer is not None)
+    agent = _agents.get(key)
+    if agent is not None:
+        _agents.move_to_end(key)
+        return agent
+    log.info("Compiling agent (cache size %d).", len(_agents))
+    agent = create_react_agent(get_llm(api_key, model), tools, prompt=system_prompt, checkpointer=checkpointer)
+    return _remember(_agents, key, agent)
+
+
+def invalidate() -> None:
+    _agents.clear()
+    _llms.clear()
+
+
+async def listen_for_invalidation(redis_url: str) -> None:
+    """Long-running task: clear the cache whenever the backend says inputs changed."""
+    import redis.asyncio as aioredis
+    while True:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        pubsub = r.pubsub()
+        try:
+            await pubsub.subscribe(REDIS_AGENT_CACHE_CHANNEL)
+            async for message in pubsub.listen():
+                if message["type"] == "message":
+                    invalidate()
+                    log.info("Agent cache invalidated: %s", message["data"])
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.error("Agent cache listener error: %s — resubscribing in 5s", exc)
+            await asyncio.sleep(5)
+        finally:
+            await r.aclose()
+
+
+async def close() -> None:
+    global _http_client
+    invalidate()
+    if _http_client is not None:
+        await _http_client.aclose()
+        _http_client = None
@@ -0,0 +1,274 @@
+"""
+agent/calendar_sync.py — Local Google Calendar store (calendar_events).
+sync() brings the store up to date with one incremental events.list call
+against the saved syncToken (a full listing the first time, after Google
+expires the token with 410, or when the connected account changes). A full
+listing only reaches CALENDAR_SYNC_HORIZON_DAYS ahead (synced_until), so it is
+redone once that horizon gets within CALENDAR_RESYNC_MARGIN_DAYS of now or a
+caller asks about later dates. It runs at
+most once per CALENDAR_SYNC_INTERVAL_SECONDS per user, under a per-user Redis
+lock so concurrent runs read the store instead of syncing twice. Changes are
+fetched from Google outside any transaction, then applied in one short
+transaction that first re-checks the sync token (a sync that raced another is
+discarded). read_calendar and the conflict check before
+create_calendar_event are then indexed range queries on (user_id, start_at).
+"""
+
+from __future__ import annotations
+
+import logging
+import os
+import uuid
+from contextlib import asynccontextmanager
+from datetime import datetime, timedelta, timezone
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+import redis.asyncio as aioredis
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+
+from agent.integrations.blocking import run_blocking
+from db.base import session_context
+from db.models import CalendarEvent, CalendarSyncState
+
+log = logging.getLogger(__name__)
+
+CALENDAR_SYNC_INTERVAL_SECONDS = int(os.environ.get("CALENDAR_SYNC_INTERVAL_SECONDS", "60"))
+# How far ahead a full sync lists events, and how close that horizon may come
+# before the next sync redoes the full listing
+CALENDAR_SYNC_HORIZON_DAYS = int(os.environ.get("CALENDAR_SYNC_HORIZON_DAYS", "180"))
+CALENDAR_RESYNC_MARGIN_DAYS = int(os.environ.get("CALENDAR_RESYNC_MARGIN_DAYS", "90"))
+CALENDAR_ID = "primary"
+REDIS_CALENDAR_SYNC_LOCK_PREFIX = "toora:calendar_sync:lock:"
+# Longer than a full sync can take (paginated list calls, each bounded by run_blocking)
+CALENDAR_SYNC_LOCK_SECONDS = 300
+
+# KEYS[1] = lock key; ARGV[1] = owner token
+_RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
+
+# Rows per INSERT (asyncpg caps a statement at 32767 bind parameters)
+UPSERT_CHUNK = 1000
+
+_UPSERT_FIELDS = ("summary", "start_at", "end_at", "all_day", "organizer", "availability", "html_link")
+
+
+async def _apply(db: Any, user_id: int, events: List[Dict[str, Any]]) -> None:
+    cancelled = {e["event_id"] for e in events if e["status"] == "cancelled" or e["start_at"] is None}
+    if cancelled:
+        await db.execute(
+            delete(CalendarEvent).where(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.calendar_id == CALENDAR_ID,
+                CalendarEvent.event_id.in_(list(cancelled)),
+            )
+        )
+    # Last change wins when one event appears twice in a listing
+    rows = list({
+        e["event_id"]: {"user_id": user_id, "calendar_id": CALENDAR_ID, "event_id": e["event_id"],
+                        **{k: e[k] for k in _UPSERT_FIELDS}}
+        for e in events
+        if e["event_id"] not in cancelled
+    }.values())
+    for i in range(0, len(rows), UPSERT_CHUNK):
+        stmt = insert(CalendarEvent).values(rows[i:i + UPSERT_CHUNK])
+        await db.execute(
+            stmt.on_conflict_do_update(
+                index_elements=["user_id", "calendar_id", "event_id"],
+                set_={**{k: stmt.excluded[k] for k in _UPSERT_FIELDS}, "updated_at": datetime.now(tz=timezone.utc)},
+            )
+        )
+
+
+_State = Tuple[str, Optional[str], Optional[datetime], Optional[datetime]]
+
+
+async def _load_state(user_id: int) -> Optional[_State]:
+    """(account, sync_token, synced_at, synced_until) or None before the first sync."""
+    async with session_context() as db:
+        result = await db.execute(
+            select(
+                CalendarSyncState.account,
+                CalendarSyncState.sync_token,
+                CalendarSyncState.synced_at,
+                CalendarSyncState.synced_until,
+            ).where(CalendarSyncState.user_id == user_id, CalendarSyncState.calendar_id == CALENDAR_ID)
+        )
+        row = result.first()
+    return tuple(row) if row is not None else None
+
+
+def _horizon_needed(until: Optional[datetime]) -> datetime:
+    """How far ahead the store must cover: the resync margin, or until if that is later."""
+    needed = datetime.now(tz=timezone.utc) + timedelta(days=CALENDAR_RESYNC_MARGIN_DAYS)
+    return max(needed, until) if until is not None else needed
+
+
+def _covers(state: Optional[_State], account: str, until: Optional[datetime]) -> bool:
+    """True if the saved token belongs to account and its full sync reached far enough."""
+    return (
+        state is not None and state[0] == account and state[1] is not None
+        and state[3] is not None and state[3] >= _horizon_needed(until)
+    )
+
+
+def _needs_sync(state: Optional[_State], account: str, until: Optional[datetime] = None) -> bool:
+    if not _covers(state, account, until) or state[2] is None:
+        return True
+    return datetime.now(tz=timezone.utc) - state[2] >= timedelta(seconds=CALENDAR_SYNC_INTERVAL_SECONDS)
+
+
+@asynccontextmanager
+async def _sync_lock(user_id: int) -> AsyncIterator[bool]:
+    """Per-user Redis lock so only one process syncs a calendar at a time; yields False if held elsewhere."""
+    from core.config import get_settings
+
+    key = f"{REDIS_CALENDAR_SYNC_LOCK_PREFIX}{user_id}"
+    owner = uuid.uuid4().hex
+    r = aioredis.from_url(get_settings(required=["REDIS_URL"]).redis_url, decode_responses=True)
+    try:
+        try:
+            acquired = bool(await r.set(key, owner, nx=True, ex=CALENDAR_SYNC_LOCK_SECONDS))
+        except Exception as exc:
+            # The apply step re-checks the token, so syncing unlocked is only wasteful
+            log.warning("Calendar sync lock unavailable (%s); syncing without it.", exc)
+            acquired, owner = True, None
+        try:
+            yield acquired
+        finally:
+            if acquired and owner is not None:
+                try:
+                    await r.eval(_RELEASE_LOCK, 1, key, owner)
+                except Exception as exc:
+                    log.warning("Failed to release calendar sync lock for user %d: %s", user_id, exc)
+    finally:
+        await r.aclose()
+
+
+async def sync(user_id: int, creds: Dict[str, str], force: bool = False, until: Optional[datetime] = None) -> bool:
+    """
+    Pull calendar changes into the store; False when it was fresh or another run
+    is syncing. until is the latest time the caller will query: a full sync
+    runs if the store's horizon does not reach it.
+    """
+    from agent.integrations.google_calendar import SyncTokenExpired, account_key, list_event_changes
+
+    account = account_key(creds)
+    if not force and not _needs_sync(await _load_state(user_id), account, until):
+        return False
+    async with _sync_lock(user_id) as acquired:
+        if not acquired:
+            return False
+        # Another process may have finished a sync while we waited for the lock
+        state = await _load_state(user_id)
+        if not force and not _needs_sync(state, account, until):
+            return False
+        base_token = state[1] if state is not None and state[0] == account else None
+        horizon = max(
+            datetime.now(tz=timezone.utc) + timedelta(days=CALENDAR_SYNC_HORIZON_DAYS), _horizon_needed(until)
+        )
+
+        # Google round-trips happen outside any DB transaction
+        token = base_token if _covers(state, account, until) else None
+        try:
+            events, next_token = await run_blocking(
+                "google_calendar", list_event_changes, creds, token, CALENDAR_ID, None if token else horizon
+            )
+        except SyncTokenExpired:
+            log.info("Calendar sync token for user %d expired; running a full sync.", user_id)
+            token = None
+            events, next_token = await run_blocking(
+                "google_calendar", list_event_changes, creds, None, CALENDAR_ID, horizon
+            )
+
+        async with session_context() as db:
+            await db.execute(
+                insert(CalendarSyncState)
+                .values(user_id=user_id, calendar_id=CALENDAR_ID, account=account)
+                .on_conflict_do_nothing(index_elements=["user_id", "calendar_id"])
+            )
+            result = await db.execute(
+                select(CalendarSyncState)
+                .where(CalendarSyncState.user_id == user_id, CalendarSyncState.calendar_id == CALENDAR_ID)
+                .with_for_update()
+            )
+            current = result.scalar_one()
+            current_token = current.sync_token if current.account == account else None
+            if current_token != base_token:
+                log.info("Calendar for user %d was synced concurrently; discarding this sync.", user_id)
+                return False
+            if token is None:
+                await db.execute(
+                    delete(CalendarEvent).where(CalendarEvent.user_id == user_id, CalendarEvent.calendar_id == CALENDAR_ID)
+                )
+                current.synced_until = horizon
+            await _apply(db, user_id, events)
+            current.account = account
+            current.sync_token = next_token
+            current.synced_at = datetime.now(tz=timezone.utc)
+    log.info("Calendar sync for user %d: %s, %d change(s).", user_id, "incremental" if token else "full", len(events))
+    return True
+
+
+async def is_synced(user_id: int) -> bool:
+    async with session_context() as db:
+        result = await db.execute(
+            select(CalendarSyncState.synced_at).where(
+                CalendarSyncState.user_id == user_id, CalendarSyncState.calendar_id == CALENDAR_ID
+            )
+        )
+        return result.scalar_one_or_none() is not None
+
+
+async def record_created(user_id: int, event: Dict[str, Any]) -> None:
+    """Write an event we just created, so reads before the next sync see it."""
+    async with session_context() as db:
+        await _apply(db, user_id, [event])
+
+
+def _as_dict(e: CalendarEvent) -> Dict[str, Any]:
+    return {
+        "id": e.event_id,
+        "summary": e.summary,
+        "start": e.start_at.date().isoformat() if e.all_day else e.start_at.isoformat(),
+        "end": e.end_at.date().isoformat() if e.all_day else e.end_at.isoformat(),
+        "organizer": e.organizer or "",
+    }
+
+
+async def upcoming_events(user_id: int, max_results: int = 10, days_ahead: int = 7) -> List[Dict[str, Any]]:
+    """Events still running or starting within the next days_ahead days, by start time."""
+    now = datetime.now(tz=timezone.utc)
+    async with session_context() as db:
+        result = await db.execute(
+            select(CalendarEvent)
+            .where(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.calendar_id == CALENDAR_ID,
+                CalendarEvent.start_at < now + timedelta(days=days_ahead),
+                CalendarEvent.end_at > now,
+            )
+            .order_by(CalendarEvent.start_at)
+            .limit(max_results)
+        )
+        return [_as_dict(e) for e in result.scalars()]
+
+
+async def find_conflicts(user_id: int, start: datetime, end: datetime) -> List[Dict[str, Any]]:
+    """Busy, timed events overlapping [start, end)."""
+    async with session_context() as db:
+        result = await db.execute(
+            select(CalendarEvent)
+            .where(
+                CalendarEvent.user_id == user_id,
+                CalendarEvent.calendar_id == CALENDAR_ID,
+                CalendarEvent.start_at < end,
+                CalendarEvent.end_at > start,
+                CalendarEvent.availability == "busy",
+                CalendarEvent.all_day.is_(False),
+            )
+            .order_by(CalendarEvent.start_at)
+        )
+        return [_as_dict(e) for e in result.scalars()]
@@ -0,0 +1,83 @@
+"""
+agent/checkpoint.py — Postgres checkpointer for runs suspended on an approval.
+Each run is a LangGraph thread ("run-<id>"). When a tool interrupts for approval
+the graph state is saved here and the worker returns; a later resume job picks
+the thread up again from the checkpoint.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+from typing import Any, Dict, Optional
+
+from core.config import get_settings
+
+log = logging.getLogger(__name__)
+
+# suspend: checkpoint + release the worker while waiting for approval
+# wait: legacy — keep the run (and its worker slot) blocked on Redis pub/sub
+AGENT_APPROVAL_MODE = os.environ.get("AGENT_APPROVAL_MODE", "suspend").strip().lower() or "suspend"
+
+_saver = None
+_pool = None
+_lock: Optional[asyncio.Lock] = None
+
+
+def _psycopg_url(url: str) -> str:
+    """DATABASE_URL may carry the asyncpg driver; psycopg wants plain postgresql://."""
+    for prefix in ("postgresql+asyncpg://", "postgres://"):
+        if url.startswith(prefix):
+            return "postgresql://" + url[len(prefix):]
+    return url
+
+
+async def get_checkpointer():
+    """Return the process-wide AsyncPostgresSaver, creating its tables on first use."""
+    global _saver, _pool, _lock
+    if _saver is not None:
+        return _saver
+    if _lock is None:
+        _lock = asyncio.Lock()
+    async with _lock:
+        if _saver is None:
+            from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+            from psycopg.rows import dict_row
+            from psycopg_pool import AsyncConnectionPool
+
+            settings = get_settings(required=["DATABASE_URL"])
+            _pool = AsyncConnectionPool(
+                _psycopg_url(settings.database_url),
+                max_size=5,
+                kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+                open=False,
+            )
+            await _pool.open()
+            saver = AsyncPostgresSaver(_pool)
+            await saver.setup()
+            _saver = saver
+            log.info("Postgres checkpointer ready.")
+    return _saver
+
+
+def thread_config(run_id: int) -> Dict[str, Any]:
+    return {"configurable": {"thread_id": f"run-{run_id}"}}
+
+
+async def delete_thread(run_id: int) -> None:
+    """Drop a finished run's checkpoints so the tables don't grow unbounded."""
+    if _saver is None:
+        return
+    try:
+        await _saver.adelete_thread(thread_config(run_id)["configurable"]["thread_id"])
+    except Exception as exc:
+        log.warning("Failed to delete checkpoints for run %d: %s", run_id, exc)
+
+
+async def close_checkpointer() -> None:
+    global _saver, _pool
+    if _pool is not None:
+        await _pool.close()
+    _saver = None
+    _pool = None
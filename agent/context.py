@@ -0,0 +1,73 @@
+"""
+agent/context.py — Run-scoped state for tools, action logging and approvals.
+Backed by a ContextVar so several run_agent calls can share one worker process:
+each asyncio task (and the tool coroutines LangGraph awaits inside it) sees only
+its own run.
+
+The context also carries the user's agent config and decrypted credentials,
+loaded once at run start (agent/graph.py) and read-only for the whole run.
+"""
+
+from __future__ import annotations
+
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from types import MappingProxyType
+from typing import Any, Dict, Iterator, Mapping, Optional
+
+DEFAULT_USER_ID = 1
+
+_EMPTY: Mapping[str, Any] = MappingProxyType({})
+
+
+@dataclass(frozen=True)
+class RunContext:
+    run_id: int
+    user_id: int = DEFAULT_USER_ID
+    # enabled_tools / system_prompt / memory / approval_rules
+    config: Mapping[str, Any] = field(default=_EMPTY)
+    # platform → decrypted credentials, for connected integrations only
+    credentials: Mapping[str, Mapping[str, str]] = field(default=_EMPTY)
+
+    def creds(self, platform: str) -> Optional[Dict[str, str]]:
+        """Copy of the platform's credentials, or None if not connected."""
+        found = self.credentials.get(platform)
+        return dict(found) if found is not None else None
+
+    @property
+    def approval_rules(self) -> Mapping[str, bool]:
+        return self.config.get("approval_rules") or _EMPTY
+
+
+def freeze(data: Dict[str, Any]) -> Mapping[str, Any]:
+    """Read-only view for RunContext fields (nested dicts included)."""
+    return MappingProxyType({
+        k: freeze(v) if isinstance(v, dict) else v for k, v in data.items()
+    })
+
+
+_current_run: ContextVar[Optional[RunContext]] = ContextVar("toora_run", default=None)
+
+
+def current_run() -> RunContext:
+    """Return the active run context. Raises if called outside run_agent."""
+    ctx = _current_run.get()
+    if ctx is None:
+        raise RuntimeError("No active agent run in this context.")
+    return ctx
+
+
+def get_run() -> Optional[RunContext]:
+    """Return the active run context, or None outside a run."""
+    return _current_run.get()
+
+
+@contextmanager
+def run_context(ctx: RunContext) -> Iterator[RunContext]:
+    """Bind ctx for the duration of the block; restores the previous value on exit."""
+    token = _current_run.set(ctx)
+    try:
+        yield ctx
+    finally:
+        _current_run.reset(token)
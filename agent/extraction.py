@@ -0,0 +1,138 @@
+"""
+agent/extraction.py — trafilatura extraction in a bounded process pool.
+HTML parsing is CPU-heavy and holds the GIL, so it runs in EXTRACT_WORKERS
+long-lived processes instead of on the worker's event loop. Pool processes
+come from a forkserver that has trafilatura preloaded (no fork of the threaded
+asyncio parent, no per-task import cost) and each one caps its address space
+(RLIMIT_AS) at start-up. Every task gets an ITIMER_REAL deadline inside the
+worker plus a slightly longer wait in the parent. Pages are passed as raw bytes,
+so trafilatura decodes them once in the worker instead of the loop doing it first.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Optional
+
+log = logging.getLogger(__name__)
+
+EXTRACT_WORKERS = int(os.environ.get("EXTRACT_WORKERS", "2"))
+EXTRACT_MEMORY_LIMIT_MB = int(os.environ.get("EXTRACT_MEMORY_LIMIT_MB", "512"))
+EXTRACT_TIMEOUT_SECONDS = float(os.environ.get("EXTRACT_TIMEOUT_SECONDS", "15"))
+# Recycle a pool process after this many pages (bounds slow leaks in lxml)
+EXTRACT_TASKS_PER_CHILD = 500
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class ExtractionTimeout(Exception):
+    pass
+
+
+# ── Pool-process side ─────────────────────────────────────────────────────────
+
+def _init_worker(memory_limit_mb: int) -> None:
+    import resource
+    if memory_limit_mb > 0:
+        limit = memory_limit_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    # The parent handles Ctrl+C / SIGTERM and shuts the pool down
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    import trafilatura  # noqa: F401 — already loaded by the forkserver; cheap
+
+
+def _on_alarm(signum: int, frame: Any) -> None:
+    raise ExtractionTimeout()
+
+
+def _extract(html: Any, time_limit: float) -> Optional[str]:
+    import trafilatura
+    previous = signal.signal(signal.SIGALRM, _on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, time_limit)
+    try:
+        return trafilatura.extract(html)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _ping() -> int:
+    return os.getpid()
+
+
+# ── Event-loop side ───────────────────────────────────────────────────────────
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        methods = multiprocessing.get_all_start_methods()
+        ctx = multiprocessing.get_context("forkserver" if "forkserver" in methods else "spawn")
+        if ctx.get_start_method() == "forkserver":
+            ctx.set_forkserver_preload(["trafilatura"])
+        _pool = ProcessPoolExecutor(
+            max_workers=EXTRACT_WORKERS,
+            mp_context=ctx,
+            initializer=_init_worker,
+            initargs=(EXTRACT_MEMORY_LIMIT_MB,),
+            max_tasks_per_child=EXTRACT_TASKS_PER_CHILD,
+        )
+    return _pool
+
+
+async def warm() -> None:
+    """Start every pool process now so the first page doesn't pay the start-up cost."""
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        await asyncio.gather(*(loop.run_in_executor(pool, _ping) for _ in range(EXTRACT_WORKERS)))
+        log.info("Extraction pool warm (%d processes).", EXTRACT_WORKERS)
+    except Exception as exc:
+        log.warning("Failed to warm extraction pool: %s", exc)
+
+
+async def extract_text(
+    html: Any, time_limit: float = EXTRACT_TIMEOUT_SECONDS, deadline: Optional[float] = None
+) -> Optional[str]:
+    """
+    Main-content text from an HTML document (bytes preferred), computed in the
+    pool. Raises ExtractionTimeout if the page takes longer than time_limit (or
+    runs past deadline, a time.monotonic() value) and RuntimeError if its
+    process died (typically the memory limit).
+    """
+    global _pool
+    wait = time_limit + 5  # slack for the in-process alarm to fire first
+    if deadline is not None:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            raise ExtractionTimeout()
+        time_limit = min(time_limit, remaining)
+        wait = min(wait, remaining)
+    loop = asyncio.get_running_loop()
+    pool = _get_pool()
+    try:
+        return await asyncio.wait_for(
+            loop.run_in_executor(pool, _extract, html, time_limit),
+            timeout=wait,
+        )
+    except asyncio.TimeoutError as exc:
+        raise ExtractionTimeout() from exc
+    except BrokenProcessPool as exc:
+        # One process was killed (e.g. hit RLIMIT_AS); the executor is unusable now
+        if _pool is pool:
+            _pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+        raise RuntimeError("extraction process died (page too large?)") from exc
+
+
+def shutdown() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
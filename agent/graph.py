@@ -1,7 +1,13 @@
 """
 agent/graph.py — LangGraph ReAct agent.
 Loads user config, builds the tool-enabled agent, and runs the loop.
-Publishes status updates to Redis pub/sub for real-time WebSocket forwarding.
+Publishes status updates — and, with AGENT_STREAMING, live token/tool events
+(agent/stream.py) — to Redis pub/sub for real-time WebSocket forwarding.
+
+When a tool interrupts for approval (AGENT_APPROVAL_MODE=suspend) the run is
+checkpointed, its approvals are created, and run_agent returns so the worker
+slot is freed. resume_agent continues it once approval_svc.resolve (or the
+expiry sweep in worker/scheduler.py) enqueues a resume job.
 """
 
 from __future__ import annotations
@@ -10,70 +16,109 @@ import asyncio
 import json
 import os
 import logging
-from typing import Any, Dict, Optional
-
-from langchain_openai import ChatOpenAI
-from langgraph.prebuilt import create_react_agent
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
 
-from agent.tools import ALL_TOOLS, set_run_id, set_main_loop
+from agent import cache as agent_cache
+from agent import mail_sync
+from agent.action_log import action_log_writer
+from agent.approval import APPROVAL_TIMEOUT_SECONDS, REDIS_APPROVAL_EXPIRY_KEY, create_approval
+from agent.checkpoint import AGENT_APPROVAL_MODE, delete_thread, get_checkpointer, thread_config
+from agent.context import RunContext, freeze, run_context
+from agent.stream import AGENT_STREAMING, stream_run
+from agent.tools import ALL_TOOLS
 from core.config import get_settings
 from core.encryption import decrypt_dict
 from db.base import session_context
-from db.models import AgentConfig, AgentRun, Integration
+from db.models import AgentConfig, AgentRun, Integration, PendingApproval, User
 
 log = logging.getLogger(__name__)
 
 DEFAULT_USER_ID = 1
-OPENROUTER_BASE = "https://openrouter.ai/api/v1"
-MODEL = "deepseek/deepseek-chat-v3-0324"
 
+# Hash per suspended run: LangGraph interrupt id → approval id
+REDIS_RUN_INTERRUPTS_PREFIX = "toora:run_interrupts:"
+# Held while a run is being resumed so two decisions can't resume it twice.
+# Short TTL renewed by a heartbeat, so a crashed holder frees it within a minute
+REDIS_RUN_LOCK_PREFIX = "toora:run_lock:"
+RUN_LOCK_TTL_SECONDS = 60
+RUN_LOCK_RENEW_SECONDS = 20
+# How long the interrupt map outlives the approval timeout
+RUN_INTERRUPTS_GRACE_SECONDS = 3600
+
+# KEYS[1] = lock key; ARGV[1] = owner, ARGV[2] = ttl seconds
+_RENEW_RUN_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('EXPIRE', KEYS[1], tonumber(ARGV[2])) end
+return 0
+"""
+# KEYS[1] = lock key; ARGV[1] = owner
+_RELEASE_RUN_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then return redis.call('DEL', KEYS[1]) end
+return 0
+"""
 
-async def _get_openrouter_api_key() -> str:
-    """Load OpenRouter API key from Connections (dashboard)."""
+
+_DEFAULT_CONFIG: Dict[str, Any] = {"enabled_tools": {}, "system_prompt": None, "memory": None, "approval_rules": {}}
+
+
+async def _load_run_inputs(user_id: int) -> Tuple[Dict[str, Any], Dict[str, Dict[str, str]]]:
+    """
+    Load agent config and every connected integration's credentials in one query
+    (users ⟕ agent_config ⟕ connected integrations), decrypting each once.
+    Returns (config, {platform: creds}).
+    """
+    from sqlalchemy import and_, select
     async with session_context() as db:
-        from sqlalchemy import select
         result = await db.execute(
-            select(Integration).where(
-                Integration.user_id == DEFAULT_USER_ID,
-                Integration.platform == "openrouter",
-                Integration.status == "connected",
+            select(AgentConfig, Integration)
+            .select_from(User)
+            .outerjoin(AgentConfig, AgentConfig.user_id == User.id)
+            .outerjoin(
+                Integration,
+                and_(Integration.user_id == User.id, Integration.status == "connected"),
             )
+            .where(User.id == user_id)
         )
-        integration = result.scalar_one_or_none()
-    if not integration:
+        rows = result.all()
+
+    config = dict(_DEFAULT_CONFIG)
+    credentials: Dict[str, Dict[str, str]] = {}
+    for cfg, integration in rows:
+        if cfg is not None:
+            config = {
+                "enabled_tools": cfg.enabled_tools or {},
+                "system_prompt": cfg.system_prompt,
+                "memory": cfg.memory,
+                "approval_rules": cfg.approval_rules or {},
+            }
+        if integration is not None and integration.platform not in credentials:
+            try:
+                credentials[integration.platform] = decrypt_dict(integration.encrypted_credentials)
+            except Exception as exc:
+                log.error("Failed to decrypt %s credentials: %s", integration.platform, exc)
+    return config, credentials
+
+
+def _openrouter_api_key(ctx: RunContext) -> str:
+    """OpenRouter API key from Connections (dashboard)."""
+    creds = ctx.creds("openrouter")
+    if not creds:
         raise RuntimeError(
             "OpenRouter not configured. Add your API key in Connections (openrouter.ai/keys)."
         )
-    creds = decrypt_dict(integration.encrypted_credentials)
     key = (creds.get("api_key") or "").strip()
     if not key:
         raise RuntimeError("OpenRouter API key is empty. Update it in Connections.")
     return key
 
 
-async def _get_user_config() -> Dict[str, Any]:
-    async with session_context() as db:
-        from sqlalchemy import select
-        result = await db.execute(
-            select(AgentConfig).where(AgentConfig.user_id == DEFAULT_USER_ID)
-        )
-        cfg = result.scalar_one_or_none()
-        if not cfg:
-            return {"enabled_tools": {}, "system_prompt": None, "memory": None, "approval_rules": {}}
-        return {
-            "enabled_tools": cfg.enabled_tools or {},
-            "system_prompt": cfg.system_prompt,
-            "memory": cfg.memory,
-            "approval_rules": cfg.approval_rules or {},
-        }
-
-
-async def _send_summary_to_telegram(summary: str) -> None:
+async def _send_summary_to_telegram(summary: str, user_id: int = DEFAULT_USER_ID) -> None:
     """Send agent run summary to Telegram with action menu (BotFather style)."""
     try:
         from agent.approval import _get_telegram_creds
         from agent.integrations.telegram import build_briefing_keyboard, send_message
-        creds = await _get_telegram_creds()
+        creds = await _get_telegram_creds(user_id)
         if creds:
             text = f"*🤖 Toora briefing*\n\n{summary[:4000]}"
             frontend_url = os.environ.get("FRONTEND_URL", "https://frontend-production-8833b.up.railway.app")
@@ -95,15 +140,180 @@ async def _publish_status(redis_url: str, run_id: int, status: str, payload: Opt
         log.error("Failed to publish status: %s", exc)
 
 
-async def run_agent(run_id: int, user_input: str = "Process my inbox and provide a daily briefing.") -> str:
-    """Run the LangGraph ReAct agent for the given run_id."""
+async def _set_run_status(run_id: int, status: str) -> None:
+    async with session_context() as db:
+        from sqlalchemy import select
+        r = await db.execute(select(AgentRun).where(AgentRun.id == run_id))
+        run = r.scalar_one_or_none()
+        if run:
+            run.status = status
+
+
+def _interrupt_id(intr: Any) -> str:
+    return getattr(intr, "id", None) or intr.interrupt_id
+
+
+async def _pending_interrupts(agent: Any, config: Dict[str, Any]) -> List[Any]:
+    state = await agent.aget_state(config)
+    return [i for task in state.tasks for i in (task.interrupts or ())]
+
+
+async def _suspend_for_approval(ctx: RunContext, interrupts: List[Any], redis_url: str) -> None:
+    """Create an approval per new interrupt and park the run until decisions arrive."""
+    import redis.asyncio as aioredis
+    r = aioredis.from_url(redis_url, decode_responses=True)
+    key = f"{REDIS_RUN_INTERRUPTS_PREFIX}{ctx.run_id}"
+    try:
+        known = await r.hgetall(key)
+        for intr in interrupts:
+            interrupt_id = _interrupt_id(intr)
+            if interrupt_id in known:
+                continue  # still waiting on an approval created earlier
+            value = intr.value if isinstance(intr.value, dict) else {}
+            approval_id = await create_approval(
+                ctx.run_id,
+                value.get("action_description", "Agent action"),
+                value.get("full_context", {}),
+                ctx.user_id,
+            )
+            await r.hset(key, interrupt_id, approval_id)
+            await r.zadd(REDIS_APPROVAL_EXPIRY_KEY, {str(approval_id): time.time() + APPROVAL_TIMEOUT_SECONDS})
+        await r.expire(key, APPROVAL_TIMEOUT_SECONDS + RUN_INTERRUPTS_GRACE_SECONDS)
+    finally:
+        await r.aclose()
+    await _set_run_status(ctx.run_id, "waiting_for_approval")
+    await _publish_status(redis_url, ctx.run_id, "waiting_for_approval")
+    log.info("Run %d suspended on %d approval(s).", ctx.run_id, len(interrupts))
+
+
+async def _release_inflight(redis_url: str, run_id: int) -> None:
+    """Let new identical run requests through once this run is finished."""
+    import redis.asyncio as aioredis
+    from core import singleflight
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await singleflight.release(r, run_id)
+        await r.aclose()
+    except Exception as exc:
+        log.warning("Failed to release in-flight key for run %d: %s", run_id, exc)
+
+
+async def _clear_suspension(redis_url: str, run_id: int) -> None:
+    """Forget a failed run's outstanding interrupts so late decisions don't resume it."""
+    import redis.asyncio as aioredis
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await r.delete(f"{REDIS_RUN_INTERRUPTS_PREFIX}{run_id}")
+        await r.aclose()
+    except Exception as exc:
+        log.warning("Failed to clear suspension state for run %d: %s", run_id, exc)
+
+
+async def _resolved_decisions(approval_ids: List[int]) -> Dict[int, Optional[bool]]:
+    """Decisions for approvals that are no longer pending (expired → None)."""
+    if not approval_ids:
+        return {}
+    async with session_context() as db:
+        from sqlalchemy import select
+        result = await db.execute(
+            select(PendingApproval.id, PendingApproval.status).where(
+                PendingApproval.id.in_(approval_ids),
+                PendingApproval.status != "pending",
+            )
+        )
+        return {
+            row_id: True if status == "approved" else False if status == "rejected" else None
+            for row_id, status in result.all()
+        }
+
+
+async def resume_agent(
+    run_id: int,
+    user_id: int = DEFAULT_USER_ID,
+    approval_id: Optional[int] = None,
+    approved: Optional[bool] = None,
+) -> bool:
+    """
+    Resume a suspended run with every decision available so far. approved, when
+    given, overrides the DB status of approval_id (the resolver's transaction may
+    not be committed yet). Returns False if the run is already being resumed.
+    """
+    import redis.asyncio as aioredis
+    from core.queue import enqueue_job
+
+    settings = get_settings(required=["DATABASE_URL", "REDIS_URL", "ENCRYPTION_KEY"])
+    r = aioredis.from_url(settings.redis_url, decode_responses=True)
+    lock_key = f"{REDIS_RUN_LOCK_PREFIX}{run_id}"
+    key = f"{REDIS_RUN_INTERRUPTS_PREFIX}{run_id}"
+    owner = uuid.uuid4().hex
+
+    async def _heartbeat() -> None:
+        while True:
+            await asyncio.sleep(RUN_LOCK_RENEW_SECONDS)
+            try:
+                await r.eval(_RENEW_RUN_LOCK, 1, lock_key, owner, RUN_LOCK_TTL_SECONDS)
+            except Exception as exc:
+                log.warning("Failed to renew resume lock for run %d: %s", run_id, exc)
+
+    try:
+        if not await r.set(lock_key, owner, nx=True, ex=RUN_LOCK_TTL_SECONDS):
+            return False
+        heartbeat = asyncio.create_task(_heartbeat())
+        try:
+            waiting = {iid: int(aid) for iid, aid in (await r.hgetall(key)).items()}
+            decisions = await _resolved_decisions(list(waiting.values()))
+            if approval_id is not None and approved is not None:
+                decisions[approval_id] = approved
+            resume_map = {iid: decisions[aid] for iid, aid in waiting.items() if aid in decisions}
+            if resume_map:
+                await r.hdel(key, *resume_map.keys())
+                await run_agent(run_id, user_id=user_id, resume=resume_map)
+        finally:
+            heartbeat.cancel()
+            await r.eval(_RELEASE_RUN_LOCK, 1, lock_key, owner)
+
+        # A decision may have landed while we held the lock — make sure it's picked up
+        waiting = {iid: int(aid) for iid, aid in (await r.hgetall(key)).items()}
+        if waiting and await _resolved_decisions(list(waiting.values())):
+            await enqueue_job(r, {"type": "resume", "run_id": run_id, "user_id": user_id})
+        return True
+    finally:
+        await r.aclose()
+
+
+async def run_agent(
+    run_id: int,
+    user_input: str = "Process my inbox and provide a daily briefing.",
+    user_id: int = DEFAULT_USER_ID,
+    resume: Optional[Dict[str, Optional[bool]]] = None,
+) -> str:
+    """Run the LangGraph ReAct agent for the given run_id.
+    Safe to call concurrently: run state lives in a RunContext bound to the calling task.
+    resume maps interrupt ids to approval decisions to continue a suspended run."""
+    config, credentials = await _load_run_inputs(user_id)
+    ctx = RunContext(
+        run_id=run_id,
+        user_id=user_id,
+        config=freeze(config),
+        credentials=freeze(credentials),
+    )
+    with run_context(ctx):
+        try:
+            return await _run_agent(ctx, user_input, resume)
+        finally:
+            # Completed, suspended or failed: this run's action log is written before we return
+            await action_log_writer.flush()
+
+
+async def _run_agent(ctx: RunContext, user_input: str, resume: Optional[Dict[str, Optional[bool]]] = None) -> str:
     settings = get_settings(required=["DATABASE_URL", "REDIS_URL", "ENCRYPTION_KEY"])
-    set_run_id(run_id)
-    set_main_loop(asyncio.get_running_loop())
+    run_id = ctx.run_id
 
     await _publish_status(settings.redis_url, run_id, "running")
+    if resume is not None:
+        await _set_run_status(run_id, "running")
 
-    config = await _get_user_config()
+    config = ctx.config
 
     # Filter tools based on user's enabled_tools setting
     enabled = config.get("enabled_tools", {})
@@ -120,23 +330,38 @@ async def run_agent(run_id: int, user_input: str = "Process my inbox and provide
     if memory:
         system_prompt = f"{base_prompt}\n\n**Things to remember about this user:**\n{memory}"
 
-    openrouter_key = await _get_openrouter_api_key()
-    llm = ChatOpenAI(
-        model=MODEL,
-        base_url=OPENROUTER_BASE,
-        api_key=openrouter_key,
-        temperature=0.2,
-    )
+    openrouter_key = _openrouter_api_key(ctx)
+    checkpointer = await get_checkpointer() if AGENT_APPROVAL_MODE == "suspend" else None
+    # Reuses the compiled graph + LLM client when key, tools and prompt are unchanged
+    agent = agent_cache.get_agent(openrouter_key, active_tools, system_prompt, checkpointer)
+    graph_config = thread_config(run_id)
 
-    agent = create_react_agent(llm, active_tools, prompt=system_prompt)
+    if resume is not None:
+        from langgraph.types import Command
+        graph_input: Any = Command(resume=resume)
+    else:
+        graph_input = {"messages": [("user", user_input)]}
 
     try:
-        result = await agent.ainvoke({"messages": [("user", user_input)]})
+        if AGENT_STREAMING:
+            # Token deltas + tool events go to the dashboard as they happen
+            result = await stream_run(agent, graph_input, graph_config, settings.redis_url, run_id)
+        else:
+            result = await agent.ainvoke(graph_input, config=graph_config)
+        if checkpointer is not None:
+            interrupts = await _pending_interrupts(agent, graph_config)
+            if interrupts:
+                await _suspend_for_approval(ctx, interrupts, settings.redis_url)
+                return "Run suspended — waiting for approval."
+            if not isinstance(result, dict):
+                result = (await agent.aget_state(graph_config)).values
+        result = result if isinstance(result, dict) else {}
+
         summary = result["messages"][-1].content if result.get("messages") else "Agent run completed."
         await _publish_status(settings.redis_url, run_id, "idle", {"summary": summary[:500]})
 
         # Send summary to Telegram if connected
-        await _send_summary_to_telegram(summary)
+        await _send_summary_to_telegram(summary, ctx.user_id)
 
         # Update run record
         async with session_context() as db:
@@ -149,6 +374,10 @@ async def run_agent(run_id: int, user_input: str = "Process my inbox and provide
                 run.completed_at = datetime.now(tz=timezone.utc)
                 run.summary = summary[:2000]
 
+        # Messages this run read are now handled; later runs start after them
+        await mail_sync.commit_run(run_id)
+        await delete_thread(run_id)
+        await _release_inflight(settings.redis_url, run_id)
         return summary
     except Exception as exc:
         log.error("Agent run %d failed: %s", run_id, exc)
@@ -164,4 +393,9 @@ async def run_agent(run_id: int, user_input: str = "Process my inbox and provide
                 run.completed_at = datetime.now(tz=timezone.utc)
                 run.summary = str(exc)[:2000]
 
+        # Unread again by the next run
+        await mail_sync.discard_run(run_id)
+        await delete_thread(run_id)
+        await _clear_suspension(settings.redis_url, run_id)
+        await _release_inflight(settings.redis_url, run_id)
         return f"Agent failed: {exc}"
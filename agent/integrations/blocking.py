@@ -0,0 +1,63 @@
+"""
+agent/integrations/blocking.py — Bounded executors for the synchronous SDKs.
+imaplib/smtplib, the Google API client and DDGS block the calling thread, so
+every such call goes through run_blocking(integration, fn, ...): each
+integration gets its own small thread pool (its concurrency limit) and a
+timeout that covers queueing plus execution. A hung IMAP login can exhaust
+Gmail's threads but never the event loop, and never Calendar's or search's.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import functools
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Tuple, TypeVar
+
+log = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+# integration → (max concurrent calls per process, timeout seconds)
+INTEGRATION_LIMITS: Dict[str, Tuple[int, float]] = {
+    "gmail": (4, 60.0),
+    "smtp": (2, 60.0),
+    "google_calendar": (4, 30.0),
+    "search": (4, 20.0),
+}
+DEFAULT_LIMITS: Tuple[int, float] = (2, 30.0)
+
+_executors: Dict[str, ThreadPoolExecutor] = {}
+
+
+class IntegrationTimeout(TimeoutError):
+    pass
+
+
+def _executor(integration: str) -> ThreadPoolExecutor:
+    executor = _executors.get(integration)
+    if executor is None:
+        workers, _ = INTEGRATION_LIMITS.get(integration, DEFAULT_LIMITS)
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"toora-{integration}")
+        _executors[integration] = executor
+    return executor
+
+
+async def run_blocking(integration: str, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """Run fn(*args, **kwargs) on the integration's executor; raise IntegrationTimeout if it's too slow."""
+    _, timeout = INTEGRATION_LIMITS.get(integration, DEFAULT_LIMITS)
+    loop = asyncio.get_running_loop()
+    future = loop.run_in_executor(_executor(integration), functools.partial(fn, *args, **kwargs))
+    try:
+        return await asyncio.wait_for(future, timeout=timeout)
+    except asyncio.TimeoutError as exc:
+        # A queued call is dropped; a running one finishes in its thread and is discarded
+        log.warning("%s call %s timed out after %.0fs", integration, getattr(fn, "__name__", fn), timeout)
+        raise IntegrationTimeout(f"{integration} did not respond within {timeout:.0f}s") from exc
+
+
+def shutdown() -> None:
+    for executor in _executors.values():
+        executor.shutdown(wait=False, cancel_futures=True)
+    _executors.clear()
@@ -1,61 +1,419 @@
 """
 agent/integrations/gmail.py — Gmail IMAP (read) and SMTP (send) integration.
 Credentials: {"email": "...", "app_password": "..."}
+
+IMAP sessions are pooled per account and reused across reads; a pooled session
+is health-checked (NOOP) only when it has been idle a while, so TLS + LOGIN
+happen only when Gmail has dropped it. read_new_emails reads by UID watermark
+(agent/mail_sync.py) and never changes flags: a quiet inbox is one STATUS;
+otherwise a read-only SELECT, a UID SEARCH above the watermark and one UID
+FETCH for the whole set, whatever the message count. That FETCH asks only for
+headers and a partial body range (BODY.PEEK[...]<0.n>); full text is fetched
+per message, size-capped, by read_email_body.
+Sending reuses one authenticated SMTP connection per account (smtp_session).
+All functions here are blocking — call them through run_blocking("gmail", ...).
 """
 
 from __future__ import annotations
 
 import email as email_lib
+import hashlib
 import imaplib
+import logging
+import re
 import smtplib
+import threading
+import time
+from contextlib import contextmanager
+from email.header import decode_header, make_header
+from email.message import Message
 from email.mime.text import MIMEText
-from typing import Any, Dict, List
+from html.parser import HTMLParser
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from agent.integrations.blocking import run_blocking
+
+log = logging.getLogger(__name__)
+
+IMAP_HOST = "imap.gmail.com"
+IMAP_PORT = 993
+# Socket timeout for every IMAP read/write. Pooled sessions can be silently
+# dropped (NAT, idle reaping); without it a read on one blocks until TCP gives
+# up (~15 min), pinning a gmail executor thread long after run_blocking's timeout
+IMAP_TIMEOUT_SECONDS = 30
+# Idle sessions kept per account (matches the gmail executor's concurrency)
+IMAP_POOL_SIZE = 4
+# Reuse without a NOOP if the session was used this recently
+IMAP_HEALTHCHECK_AFTER_SECONDS = 60
+# Gmail drops idle IMAP connections after ~30 min; retire ours well before
+IMAP_MAX_IDLE_SECONDS = 10 * 60
+
+# Header + preview mode
+PREVIEW_BYTES = 2048
+SNIPPET_CHARS = 200
+BODY_MAX_BYTES = 64 * 1024
+_PREVIEW_HEADERS = "FROM SUBJECT DATE MESSAGE-ID MIME-VERSION CONTENT-TYPE CONTENT-TRANSFER-ENCODING"
+
+_UID_RE = re.compile(rb"UID (\d+)")
+_NEW_RESPONSE_RE = re.compile(rb"^\d+ \(")
+_SECTION_RE = re.compile(rb"BODY\[([^\]]*)\](?:<\d+>)? \{\d+\}$")
+_STATUS_RE = re.compile(rb"(UIDVALIDITY|UIDNEXT|HIGHESTMODSEQ) (\d+)")
+
+SMTP_HOST = "smtp.gmail.com"
+SMTP_PORT = 465
+# Gmail closes idle SMTP connections after a few minutes
+SMTP_MAX_IDLE_SECONDS = 4 * 60
+
+# account key → [(session, last_used)]
+_idle: Dict[str, List[Tuple[imaplib.IMAP4_SSL, float]]] = {}
+_smtp_idle: Dict[str, Tuple[smtplib.SMTP_SSL, float]] = {}
+_idle_lock = threading.Lock()
+
+
+def _account_key(creds: Dict[str, str]) -> str:
+    # Include the password so a changed app password never reuses an old login
+    secret = hashlib.sha256(creds["app_password"].encode("utf-8")).hexdigest()[:16]
+    return f"{creds['email'].lower()}:{secret}"
 
 
 def _imap_connect(creds: Dict[str, str]) -> imaplib.IMAP4_SSL:
-    imap = imaplib.IMAP4_SSL("imap.gmail.com", 993)
+    imap = imaplib.IMAP4_SSL(IMAP_HOST, IMAP_PORT, timeout=IMAP_TIMEOUT_SECONDS)
     imap.login(creds["email"], creds["app_password"])
+    # IMAP4_SSL applies timeout to the connect; keep it on the wrapped socket for every read
+    imap.sock.settimeout(IMAP_TIMEOUT_SECONDS)
     return imap
 
 
-async def test_connection(creds: Dict[str, str]) -> str:
+def _discard(imap: imaplib.IMAP4_SSL) -> None:
     try:
-        imap = _imap_connect(creds)
         imap.logout()
+    except Exception:
+        pass
+
+
+def _checkout(key: str, creds: Dict[str, str]) -> imaplib.IMAP4_SSL:
+    now = time.monotonic()
+    while True:
+        with _idle_lock:
+            entries = _idle.get(key)
+            if not entries:
+                break
+            imap, last_used = entries.pop()
+        age = now - last_used
+        if age > IMAP_MAX_IDLE_SECONDS:
+            _discard(imap)
+            continue
+        if age > IMAP_HEALTHCHECK_AFTER_SECONDS:
+            try:
+                imap.noop()
+            except Exception:
+                _discard(imap)
+                continue
+        return imap
+    log.info("Opening IMAP session for %s", creds["email"])
+    return _imap_connect(creds)
+
+
+def _checkin(key: str, imap: imaplib.IMAP4_SSL) -> None:
+    with _idle_lock:
+        entries = _idle.setdefault(key, [])
+        if len(entries) < IMAP_POOL_SIZE:
+            entries.append((imap, time.monotonic()))
+            return
+    _discard(imap)
+
+
+@contextmanager
+def imap_session(creds: Dict[str, str]) -> Iterator[imaplib.IMAP4_SSL]:
+    """Borrow a logged-in session; it goes back to the pool unless the block raised."""
+    key = _account_key(creds)
+    imap = _checkout(key, creds)
+    try:
+        yield imap
+    except BaseException:
+        _discard(imap)  # unknown protocol state — don't reuse
+        raise
+    _checkin(key, imap)
+
+
+def close_sessions() -> None:
+    with _idle_lock:
+        entries = [imap for pool in _idle.values() for imap, _ in pool]
+        _idle.clear()
+        smtps = [smtp for smtp, _ in _smtp_idle.values()]
+        _smtp_idle.clear()
+    for imap in entries:
+        _discard(imap)
+    for smtp in smtps:
+        _smtp_discard(smtp)
+
+
+async def test_connection(creds: Dict[str, str]) -> str:
+    def _probe() -> None:
+        with imap_session(creds) as imap:
+            imap.noop()
+
+    try:
+        await run_blocking("gmail", _probe)
         return "Gmail IMAP connection successful."
     except Exception as exc:
         raise RuntimeError(f"Gmail connection failed: {exc}") from exc
 
 
-def read_unread_emails(creds: Dict[str, str], max_count: int = 10) -> List[Dict[str, Any]]:
-    imap = _imap_connect(creds)
-    imap.select("INBOX")
-    _, data = imap.search(None, "UNSEEN")
-    ids = data[0].split()[-max_count:] if data[0] else []
-    results: List[Dict[str, Any]] = []
-    for uid in ids:
-        _, msg_data = imap.fetch(uid, "(RFC822)")
-        raw = msg_data[0][1]
-        msg = email_lib.message_from_bytes(raw)
-        body = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                if part.get_content_type() == "text/plain":
-                    body = part.get_payload(decode=True).decode("utf-8", errors="replace")
-                    break
+class _HTMLText(HTMLParser):
+    """Minimal HTML → text: drops script/style/head, breaks lines at block tags."""
+
+    _SKIP = {"script", "style", "head", "title"}
+    _BLOCK = {"p", "div", "br", "tr", "li", "h1", "h2", "h3", "h4", "h5", "h6", "table", "blockquote"}
+
+    def __init__(self) -> None:
+        super().__init__(convert_charrefs=True)
+        self.parts: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag: str, attrs: Any) -> None:
+        if tag in self._SKIP:
+            self._skip_depth += 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_endtag(self, tag: str) -> None:
+        if tag in self._SKIP and self._skip_depth:
+            self._skip_depth -= 1
+        elif tag in self._BLOCK:
+            self.parts.append("\n")
+
+    def handle_data(self, data: str) -> None:
+        if not self._skip_depth:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    parser = _HTMLText()
+    try:
+        parser.feed(html)
+        parser.close()
+    except Exception:
+        pass  # truncated markup — keep what was parsed
+    lines = (" ".join(line.split()) for line in "".join(parser.parts).splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+def _header(msg: Message, name: str) -> str:
+    value = msg.get(name)
+    if value is None:
+        return ""
+    try:
+        return str(make_header(decode_header(value)))
+    except Exception:
+        return str(value)
+
+
+def _decode_part(part: Message) -> str:
+    payload = part.get_payload(decode=True) or b""
+    try:
+        return payload.decode(part.get_content_charset() or "utf-8", errors="replace")
+    except LookupError:
+        return payload.decode("utf-8", errors="replace")
+
+
+def _message_text(msg: Message) -> str:
+    """text/plain if present, else text/html converted to text."""
+    html = None
+    for part in msg.walk() if msg.is_multipart() else [msg]:
+        if part.get_content_maintype() == "multipart" or part.get_filename():
+            continue
+        ctype = part.get_content_type()
+        if ctype == "text/plain":
+            return _decode_part(part)
+        if ctype == "text/html" and html is None:
+            html = _decode_part(part)
+    return html_to_text(html) if html is not None else ""
+
+
+def _parse_message(uid: str, raw: bytes, full: bool) -> Dict[str, Any]:
+    msg = email_lib.message_from_bytes(raw)
+    text = _message_text(msg).strip()
+    out: Dict[str, Any] = {
+        "uid": uid,
+        "from": _header(msg, "From"),
+        "subject": _header(msg, "Subject"),
+        "date": _header(msg, "Date"),
+        "snippet": " ".join(text[:SNIPPET_CHARS * 2].split())[:SNIPPET_CHARS],
+    }
+    if full:
+        out["body"] = text
+    return out
+
+
+def _fetch_sections(imap: imaplib.IMAP4_SSL, uids: List[bytes], query: str) -> Dict[str, Dict[str, bytes]]:
+    """
+    One UID FETCH for the whole set → {uid: {section: literal}}, where section is
+    "HEADER", "TEXT" or "" (whole message). A message's response is split over
+    several tuples when it carries several literals; a new one starts with "<seq> (".
+    """
+    _, data = imap.uid("FETCH", b",".join(uids), query)
+    out: Dict[str, Dict[str, bytes]] = {}
+    uid, sections = None, {}
+    for item in data or []:
+        prefix = item[0] if isinstance(item, tuple) else item
+        if not isinstance(prefix, bytes):
+            continue
+        if _NEW_RESPONSE_RE.match(prefix):
+            uid, sections = None, {}
+        match = _UID_RE.search(prefix)
+        if match:
+            uid = match.group(1).decode()
+            out[uid] = sections
+        if isinstance(item, tuple) and len(item) >= 2:
+            section = _SECTION_RE.search(prefix)
+            if section:
+                name = section.group(1).decode().split(".")[0].split(" ")[0]
+                sections[name] = item[1]
+    return out
+
+
+def _raw_message(sections: Dict[str, bytes]) -> bytes:
+    if "" in sections:
+        return sections[""]
+    return sections.get("HEADER", b"").rstrip(b"\r\n") + b"\r\n\r\n" + sections.get("TEXT", b"")
+
+
+def _fetch_messages(imap: imaplib.IMAP4_SSL, uids: List[bytes], full: bool) -> List[Dict[str, Any]]:
+    # PEEK: reading never changes the message's flags
+    query = "(UID BODY.PEEK[])" if full else f"(UID BODY.PEEK[HEADER.FIELDS ({_PREVIEW_HEADERS})] BODY.PEEK[TEXT]<0.{PREVIEW_BYTES}>)"
+    by_uid = _fetch_sections(imap, uids, query)
+    return [
+        _parse_message(uid.decode(), _raw_message(by_uid[uid.decode()]), full)
+        for uid in uids
+        if uid.decode() in by_uid
+    ]
+
+
+def mailbox_status(imap: imaplib.IMAP4_SSL, mailbox: str) -> Dict[str, int]:
+    """UIDVALIDITY / UIDNEXT (and HIGHESTMODSEQ with CONDSTORE) without selecting the mailbox."""
+    items = "UIDVALIDITY UIDNEXT"
+    if "CONDSTORE" in imap.capabilities:
+        items += " HIGHESTMODSEQ"
+    _, data = imap.status(mailbox, f"({items})")
+    found = dict(_STATUS_RE.findall(data[0] if data and isinstance(data[0], bytes) else b""))
+    return {
+        "uid_validity": int(found.get(b"UIDVALIDITY", 0)),
+        "uid_next": int(found.get(b"UIDNEXT", 0)),
+        "highest_modseq": int(found[b"HIGHESTMODSEQ"]) if b"HIGHESTMODSEQ" in found else None,
+    }
+
+
+def read_new_emails(
+    creds: Dict[str, str],
+    since: Optional[Dict[str, int]] = None,
+    max_count: int = 10,
+    mailbox: str = "INBOX",
+) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+    """
+    Messages that arrived after the watermark since = {"uid_validity", "last_uid"}
+    (header + preview, oldest first, at most max_count), and the watermark to
+    store once they've been handled. Flags are never touched, so mail read on
+    another device is still seen here.
+    A quiet mailbox costs one STATUS command. Without a usable watermark (first
+    run, or the server renumbered UIDs) it falls back to the newest unread
+    messages and starts the watermark at the current end of the mailbox.
+    """
+    with imap_session(creds) as imap:
+        status = mailbox_status(imap, mailbox)
+        watermark: Dict[str, Any] = {
+            "uid_validity": status["uid_validity"],
+            "last_uid": status["uid_next"] - 1,
+            "highest_modseq": status["highest_modseq"],
+        }
+        if since and since.get("uid_validity") == status["uid_validity"]:
+            last_uid = int(since["last_uid"])
+            if status["uid_next"] - 1 <= last_uid:
+                return [], {**watermark, "last_uid": last_uid}
+            imap.select(mailbox, readonly=True)
+            _, data = imap.uid("SEARCH", None, f"UID {last_uid + 1}:*")
+            # "n:*" always matches the highest UID, even when it's below n
+            uids = sorted((u for u in (data[0].split() if data and data[0] else []) if int(u) > last_uid), key=int)
+            if len(uids) > max_count:
+                uids = uids[:max_count]
+                watermark["last_uid"] = int(uids[-1])  # the rest are picked up next run
         else:
-            body = msg.get_payload(decode=True).decode("utf-8", errors="replace")
-        results.append({
-            "uid": uid.decode(),
-            "from": msg["From"],
-            "subject": msg["Subject"],
-            "snippet": body[:200],
-            "body": body,
-        })
-        # Mark as read
-        imap.store(uid, "+FLAGS", "\\Seen")
-    imap.logout()
-    return results
+            imap.select(mailbox, readonly=True)
+            _, data = imap.uid("SEARCH", None, "UNSEEN")
+            uids = sorted(data[0].split() if data and data[0] else [], key=int)[-max_count:]
+        if not uids:
+            return [], watermark
+        return _fetch_messages(imap, uids, full=False), watermark
+
+
+def read_email_body(creds: Dict[str, str], uid: str, max_bytes: int = BODY_MAX_BYTES) -> Optional[Dict[str, Any]]:
+    """Decoded text of one INBOX message by UID, reading at most max_bytes of its body. None if not found."""
+    uid = uid.strip()
+    if not uid.isdigit():
+        raise ValueError(f"Invalid message uid: {uid!r}")
+    with imap_session(creds) as imap:
+        imap.select("INBOX", readonly=True)
+        sections = _fetch_sections(imap, [uid.encode()], f"(UID BODY.PEEK[HEADER] BODY.PEEK[TEXT]<0.{max_bytes}>)").get(uid)
+    if not sections:
+        return None
+    message = _parse_message(uid, _raw_message(sections), full=True)
+    message["truncated"] = len(sections.get("TEXT", b"")) >= max_bytes
+    return message
+
+
+def _smtp_connect(creds: Dict[str, str]) -> smtplib.SMTP_SSL:
+    smtp = smtplib.SMTP_SSL(SMTP_HOST, SMTP_PORT, timeout=30)
+    smtp.login(creds["email"], creds["app_password"])
+    return smtp
+
+
+def _smtp_discard(smtp: smtplib.SMTP_SSL) -> None:
+    try:
+        smtp.quit()
+    except Exception:
+        try:
+            smtp.close()
+        except Exception:
+            pass
+
+
+@contextmanager
+def smtp_session(creds: Dict[str, str]) -> Iterator[smtplib.SMTP_SSL]:
+    """Borrow an authenticated SMTP connection for the account (one idle connection kept per account)."""
+    key = _account_key(creds)
+    smtp = None
+    with _idle_lock:
+        entry = _smtp_idle.pop(key, None)
+    if entry is not None:
+        smtp, last_used = entry
+        age = time.monotonic() - last_used
+        try:
+            if age > SMTP_MAX_IDLE_SECONDS or smtp.noop()[0] != 250:
+                raise smtplib.SMTPServerDisconnected("stale")
+        except Exception:
+            _smtp_discard(smtp)
+            smtp = None
+    if smtp is None:
+        log.info("Opening SMTP session for %s", creds["email"])
+        smtp = _smtp_connect(creds)
+    try:
+        yield smtp
+    except (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused):
+        # The server rejected this message; the connection itself is still good
+        _smtp_checkin(key, smtp)
+        raise
+    except BaseException:
+        _smtp_discard(smtp)
+        raise
+    _smtp_checkin(key, smtp)
+
+
+def _smtp_checkin(key: str, smtp: smtplib.SMTP_SSL) -> None:
+    with _idle_lock:
+        previous = _smtp_idle.pop(key, None)
+        _smtp_idle[key] = (smtp, time.monotonic())
+    if previous is not None:
+        _smtp_discard(previous[0])
 
 
 def send_email_smtp(
@@ -65,6 +423,5 @@ def send_email_smtp(
     msg["From"] = creds["email"]
     msg["To"] = to
     msg["Subject"] = subject
-    with smtplib.SMTP_SSL("smtp.gmail.com", 465) as smtp:
-        smtp.login(creds["email"], creds["app_password"])
+    with smtp_session(creds) as smtp:
         smtp.sendmail(creds["email"], [to], msg.as_string())
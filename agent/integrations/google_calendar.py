@@ -2,69 +2,203 @@
 agent/integrations/google_calendar.py — Google Calendar API helpers.
 Credentials: {"client_id", "client_secret", "refresh_token"}
 User obtains refresh_token via Google OAuth Playground with Calendar scope.
+
+Clients are cached per account: the access token is reused until
+TOKEN_REFRESH_MARGIN_SECONDS before it expires (refresh happens under a lock,
+so concurrent calls share one token round-trip) and the service object is built
+once from the discovery document bundled with google-api-python-client. The
+service is shared but httplib2 is not thread-safe, so requests execute on a
+per-thread authorized HTTP connection.
+list_event_changes feeds the local event store (agent/calendar_sync.py): a full
+listing of a bounded window the first time, then only what changed since the
+previous syncToken.
+All functions here are blocking — call them through run_blocking("google_calendar", ...).
 """
 
 from __future__ import annotations
 
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime, timedelta, timezone
 from typing import Any, Dict, List
 
 from google.oauth2.credentials import Credentials
 from googleapiclient.discovery import build
 
+from agent.integrations.blocking import run_blocking
+
+log = logging.getLogger(__name__)
+
+SCOPES = ["https://www.googleapis.com/auth/calendar.events", "https://www.googleapis.com/auth/calendar.readonly"]
+TOKEN_URI = "https://oauth2.googleapis.com/token"
+TOKEN_REFRESH_MARGIN_SECONDS = 300
+CLIENT_CACHE_SIZE = 16
+HTTP_TIMEOUT_SECONDS = 30
+# How far back a full sync reaches; later changes to older events still arrive incrementally
+SYNC_PAST_DAYS = 30
+SYNC_PAGE_SIZE = 250
+
+_clients: "OrderedDict[str, _CalendarClient]" = OrderedDict()
+_clients_lock = threading.Lock()
+_thread_http = threading.local()
+
+
+class _CalendarClient:
+    def __init__(self, key: str, creds_dict: Dict[str, str]) -> None:
+        self.key = key
+        self.credentials = Credentials(
+            token=None,
+            refresh_token=creds_dict.get("refresh_token"),
+            token_uri=TOKEN_URI,
+            client_id=creds_dict.get("client_id"),
+            client_secret=creds_dict.get("client_secret"),
+            scopes=SCOPES,
+        )
+        self._refresh_lock = threading.Lock()
+        self.service = build(
+            "calendar", "v3", credentials=self.credentials, static_discovery=True, cache_discovery=False
+        )
+
+    def _token_fresh(self) -> bool:
+        expiry = self.credentials.expiry  # naive UTC
+        if not self.credentials.token or expiry is None:
+            return False
+        now = datetime.now(timezone.utc).replace(tzinfo=None)
+        return expiry - now > timedelta(seconds=TOKEN_REFRESH_MARGIN_SECONDS)
+
+    def ensure_token(self) -> None:
+        if self._token_fresh():
+            return
+        with self._refresh_lock:
+            if self._token_fresh():
+                return  # another thread refreshed while we waited
+            from google.auth.transport.requests import Request
+            self.credentials.refresh(Request())
+            log.info("Refreshed Google Calendar access token (expires %s).", self.credentials.expiry)
+
+    def execute(self, request: Any) -> Any:
+        self.ensure_token()
+        return request.execute(http=self._http())
+
+    def _http(self) -> Any:
+        cache = getattr(_thread_http, "by_client", None)
+        if cache is None:
+            cache = _thread_http.by_client = {}
+        http = cache.get(self.key)
+        if http is None or http[0] is not self:
+            import google_auth_httplib2
+            import httplib2
+            http = cache[self.key] = (self, google_auth_httplib2.AuthorizedHttp(
+                self.credentials, http=httplib2.Http(timeout=HTTP_TIMEOUT_SECONDS)
+            ))
+        return http[1]
+
+
+class SyncTokenExpired(Exception):
+    """Google invalidated the syncToken (HTTP 410); a full sync is required."""
+
 
-def _get_service(creds_dict: Dict[str, str]):
-    from google.auth.transport.requests import Request
-    creds = Credentials(
-        token=None,
-        refresh_token=creds_dict.get("refresh_token"),
-        token_uri="https://oauth2.googleapis.com/token",
-        client_id=creds_dict.get("client_id"),
-        client_secret=creds_dict.get("client_secret"),
-        scopes=["https://www.googleapis.com/auth/calendar.events", "https://www.googleapis.com/auth/calendar.readonly"],
-    )
-    creds.refresh(Request())
-    return build("calendar", "v3", credentials=creds)
+def _client_key(creds_dict: Dict[str, str]) -> str:
+    raw = "|".join(creds_dict.get(k) or "" for k in ("client_id", "client_secret", "refresh_token"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()[:24]
+
+
+def _get_client(creds_dict: Dict[str, str]) -> _CalendarClient:
+    key = _client_key(creds_dict)
+    with _clients_lock:
+        client = _clients.get(key)
+        if client is not None:
+            _clients.move_to_end(key)
+            return client
+    client = _CalendarClient(key, creds_dict)
+    with _clients_lock:
+        client = _clients.setdefault(key, client)
+        _clients.move_to_end(key)
+        while len(_clients) > CLIENT_CACHE_SIZE:
+            _clients.popitem(last=False)
+    return client
 
 
 async def test_connection(creds: Dict[str, str]) -> str:
+    def _probe() -> None:
+        client = _get_client(creds)
+        client.execute(client.service.events().list(calendarId="primary", maxResults=1))
+
     try:
-        service = _get_service(creds)
-        service.events().list(calendarId="primary", maxResults=1).execute()
+        await run_blocking("google_calendar", _probe)
         return "Google Calendar connected."
     except Exception as exc:
         raise RuntimeError(f"Calendar connection failed: {exc}") from exc
 
 
-def list_upcoming_events(creds: Dict[str, str], max_results: int = 10, days_ahead: int = 7) -> List[Dict[str, Any]]:
-    service = _get_service(creds)
-    now = datetime.now(timezone.utc)
-    time_min = now.isoformat()
-    time_max = (now + timedelta(days=days_ahead)).isoformat()
-    events_result = (
-        service.events()
-        .list(
-            calendarId="primary",
-            timeMin=time_min,
-            timeMax=time_max,
-            maxResults=max_results,
-            singleEvents=True,
-            orderBy="startTime",
-        )
-        .execute()
-    )
-    events = events_result.get("items", [])
-    out: List[Dict[str, Any]] = []
-    for e in events:
-        start = e.get("start", {})
-        start_str = start.get("dateTime", start.get("date", "?"))
-        out.append({
-            "id": e.get("id"),
-            "summary": e.get("summary", "(No title)"),
-            "start": start_str,
-            "organizer": e.get("organizer", {}).get("email", ""),
-        })
-    return out
+def account_key(creds_dict: Dict[str, str]) -> str:
+    """Stable id for the connected Google account (changes when credentials do)."""
+    return _client_key(creds_dict)
+
+
+def _parse_time(value: Dict[str, str]) -> tuple[datetime | None, bool]:
+    # All-day events carry a bare date; they are kept as UTC midnight
+    if value.get("dateTime"):
+        return datetime.fromisoformat(value["dateTime"].replace("Z", "+00:00")), False
+    if value.get("date"):
+        return datetime.fromisoformat(value["date"]).replace(tzinfo=timezone.utc), True
+    return None, False
+
+
+def _normalize(e: Dict[str, Any]) -> Dict[str, Any]:
+    start_at, all_day = _parse_time(e.get("start", {}))
+    end_at, _ = _parse_time(e.get("end", {}))
+    return {
+        "event_id": e.get("id"),
+        "status": e.get("status", "confirmed"),
+        "summary": e.get("summary", "(No title)"),
+        "start_at": start_at,
+        "end_at": end_at or start_at,
+        "all_day": all_day,
+        "organizer": e.get("organizer", {}).get("email", ""),
+        "availability": "free" if e.get("transparency") == "transparent" else "busy",
+        "html_link": e.get("htmlLink"),
+    }
+
+
+def list_event_changes(
+    creds: Dict[str, str],
+    sync_token: str | None = None,
+    calendar_id: str = "primary",
+    time_max: datetime | None = None,
+) -> tuple[List[Dict[str, Any]], str]:
+    """
+    Events changed since sync_token (all events from SYNC_PAST_DAYS ago up to
+    time_max when None; Google rejects timeMax alongside a syncToken).
+    Returns (normalized events, next sync token); cancelled events have status "cancelled".
+    Raises SyncTokenExpired when Google asks for a full resync.
+    """
+    from googleapiclient.errors import HttpError
+
+    client = _get_client(creds)
+    params: Dict[str, Any] = {"calendarId": calendar_id, "singleEvents": True, "maxResults": SYNC_PAGE_SIZE}
+    if sync_token:
+        params["syncToken"] = sync_token
+    else:
+        params["timeMin"] = (datetime.now(timezone.utc) - timedelta(days=SYNC_PAST_DAYS)).isoformat()
+        if time_max is not None:
+            params["timeMax"] = time_max.isoformat()
+
+    items: List[Dict[str, Any]] = []
+    page_token = None
+    while True:
+        try:
+            page = client.execute(client.service.events().list(pageToken=page_token, **params))
+        except HttpError as exc:
+            if exc.resp.status == 410:
+                raise SyncTokenExpired() from exc
+            raise
+        items.extend(_normalize(e) for e in page.get("items", []))
+        page_token = page.get("nextPageToken")
+        if not page_token:
+            return items, page["nextSyncToken"]
 
 
 def create_event(
@@ -74,8 +208,7 @@ def create_event(
     end_datetime: str | None = None,
     description: str = "",
 ) -> Dict[str, Any]:
-    from datetime import datetime, timedelta
-    service = _get_service(creds)
+    client = _get_client(creds)
     end = (end_datetime or "").strip() or None
     if not end:
         try:
@@ -90,5 +223,5 @@ def create_event(
         "start": {"dateTime": start_datetime, "timeZone": "UTC"},
         "end": {"dateTime": end, "timeZone": "UTC"},
     }
-    event = service.events().insert(calendarId="primary", body=body).execute()
-    return {"id": event.get("id"), "htmlLink": event.get("htmlLink")}
+    event = client.execute(client.service.events().insert(calendarId="primary", body=body))
+    return {"id": event.get("id"), "htmlLink": event.get("htmlLink"), "event": _normalize(event)}
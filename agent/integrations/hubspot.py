@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from typing import Any, Dict, Optional
 
-import httpx
+from core import http_client
 
 _BASE = "https://api.hubapi.com"
 
@@ -20,60 +20,69 @@ def _headers(creds: Dict[str, str]) -> Dict[str, str]:
 
 
 async def test_connection(creds: Dict[str, str]) -> str:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(
-            f"{_BASE}/crm/v3/objects/contacts",
-            headers=_headers(creds),
-            params={"limit": 1},
-        )
-        r.raise_for_status()
-        return "HubSpot connection successful."
+    r = await http_client.request(
+        "GET",
+        f"{_BASE}/crm/v3/objects/contacts",
+        headers=_headers(creds),
+        params={"limit": 1},
+        timeout=10,
+    )
+    r.raise_for_status()
+    return "HubSpot connection successful."
 
 
 async def upsert_contact(
     creds: Dict[str, str], email: str, properties: Dict[str, str]
 ) -> Dict[str, Any]:
     """Create or update a contact by email."""
-    async with httpx.AsyncClient(timeout=15) as client:
-        search_r = await client.post(
-            f"{_BASE}/crm/v3/objects/contacts/search",
+    search_r = await http_client.request(
+        "POST",
+        f"{_BASE}/crm/v3/objects/contacts/search",
+        headers=_headers(creds),
+        json={"filterGroups": [{"filters": [{"propertyName": "email", "operator": "EQ", "value": email}]}]},
+        timeout=15,
+    )
+    search_r.raise_for_status()
+    results = search_r.json().get("results", [])
+    payload = {"properties": {"email": email, **properties}}
+    if results:
+        contact_id = results[0]["id"]
+        r = await http_client.request(
+            "PATCH",
+            f"{_BASE}/crm/v3/objects/contacts/{contact_id}",
+            headers=_headers(creds),
+            json=payload,
+            timeout=15,
+        )
+    else:
+        r = await http_client.request(
+            "POST",
+            f"{_BASE}/crm/v3/objects/contacts",
             headers=_headers(creds),
-            json={"filterGroups": [{"filters": [{"propertyName": "email", "operator": "EQ", "value": email}]}]},
+            json=payload,
+            timeout=15,
         )
-        search_r.raise_for_status()
-        results = search_r.json().get("results", [])
-        payload = {"properties": {"email": email, **properties}}
-        if results:
-            contact_id = results[0]["id"]
-            r = await client.patch(
-                f"{_BASE}/crm/v3/objects/contacts/{contact_id}",
-                headers=_headers(creds),
-                json=payload,
-            )
-        else:
-            r = await client.post(
-                f"{_BASE}/crm/v3/objects/contacts",
-                headers=_headers(creds),
-                json=payload,
-            )
-        r.raise_for_status()
-        return r.json()
+    r.raise_for_status()
+    return r.json()
 
 
 async def log_note(
     creds: Dict[str, str], contact_id: str, note: str
 ) -> Dict[str, Any]:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(
-            f"{_BASE}/crm/v3/objects/notes",
-            headers=_headers(creds),
-            json={"properties": {"hs_note_body": note, "hs_timestamp": "now"}},
-        )
-        r.raise_for_status()
-        note_obj = r.json()
-        # Associate note with contact
-        await client.put(
-            f"{_BASE}/crm/v3/objects/notes/{note_obj['id']}/associations/contacts/{contact_id}/note_to_contact",
-            headers=_headers(creds),
-        )
-        return note_obj
+    r = await http_client.request(
+        "POST",
+        f"{_BASE}/crm/v3/objects/notes",
+        headers=_headers(creds),
+        json={"properties": {"hs_note_body": note, "hs_timestamp": "now"}},
+        timeout=10,
+    )
+    r.raise_for_status()
+    note_obj = r.json()
+    # Associate note with contact
+    await http_client.request(
+        "PUT",
+        f"{_BASE}/crm/v3/objects/notes/{note_obj['id']}/associations/contacts/{contact_id}/note_to_contact",
+        headers=_headers(creds),
+        timeout=10,
+    )
+    return note_obj
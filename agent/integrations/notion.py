@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from typing import Any, Dict
 
-import httpx
+from core import http_client
 
 _BASE = "https://api.notion.com/v1"
 _NOTION_VERSION = "2022-06-28"
@@ -22,15 +22,16 @@ def _headers(creds: Dict[str, str]) -> Dict[str, str]:
 
 
 async def test_connection(creds: Dict[str, str]) -> str:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(
-            f"{_BASE}/databases/{creds['database_id']}",
-            headers=_headers(creds),
-        )
-        r.raise_for_status()
-        data = r.json()
-        title = data.get("title", [{}])[0].get("plain_text", "Untitled")
-        return f"Notion connected — database: {title}"
+    r = await http_client.request(
+        "GET",
+        f"{_BASE}/databases/{creds['database_id']}",
+        headers=_headers(creds),
+        timeout=10,
+    )
+    r.raise_for_status()
+    data = r.json()
+    title = data.get("title", [{}])[0].get("plain_text", "Untitled")
+    return f"Notion connected — database: {title}"
 
 
 async def create_task(
@@ -50,7 +51,6 @@ async def create_task(
                 "paragraph": {"rich_text": [{"type": "text", "text": {"content": content}}]},
             }
         ]
-    async with httpx.AsyncClient(timeout=15) as client:
-        r = await client.post(f"{_BASE}/pages", headers=_headers(creds), json=payload)
-        r.raise_for_status()
-        return r.json()
+    r = await http_client.request("POST", f"{_BASE}/pages", headers=_headers(creds), json=payload, timeout=15)
+    r.raise_for_status()
+    return r.json()
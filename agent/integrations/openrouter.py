@@ -7,7 +7,7 @@ from __future__ import annotations
 
 from typing import Dict
 
-import httpx
+from core import http_client
 
 
 async def test_connection(creds: Dict[str, str]) -> str:
@@ -15,11 +15,12 @@ async def test_connection(creds: Dict[str, str]) -> str:
     api_key = creds.get("api_key", "").strip()
     if not api_key:
         raise RuntimeError("OpenRouter API key is required.")
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(
-            "https://openrouter.ai/api/v1/models",
-            headers={"Authorization": f"Bearer {api_key}"},
-        )
+    r = await http_client.request(
+        "GET",
+        "https://openrouter.ai/api/v1/models",
+        headers={"Authorization": f"Bearer {api_key}"},
+        timeout=10,
+    )
     if r.status_code == 401:
         raise RuntimeError("Invalid API key. Get one at openrouter.ai/keys.")
     if not r.is_success:
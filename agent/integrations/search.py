@@ -1,11 +1,35 @@
 """
 agent/integrations/search.py — Web search using DuckDuckGo and page reading via trafilatura.
 No credentials required.
+read_webpages fetches several pages concurrently (bounded per host, with a
+per-page byte cap) and extracts each independently in the extraction process
+pool (agent/extraction.py); one deadline covers both the downloads and the
+extraction.
 """
 
 from __future__ import annotations
 
-from typing import Any, Dict, List, Optional
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+
+from agent.extraction import ExtractionTimeout, extract_text
+
+# Limits for read_webpages
+MAX_PAGES_PER_CALL = 10
+PER_HOST_CONCURRENCY = 2
+FETCH_TIMEOUT_SECONDS = 20.0
+MAX_PAGE_BYTES = 2 * 1024 * 1024
+_USER_AGENT = "Mozilla/5.0 (compatible; TooraBot/2.0; +https://github.com/Mizokuiam/Toora)"
+_HTML_TYPES = ("text/", "application/xhtml", "application/xml")
+
+# Process-wide, so concurrent runs don't hammer the same site either. Only hosts
+# with a fetch in progress have an entry: host → (semaphore, fetches using it)
+_host_slots: Dict[str, Tuple[asyncio.Semaphore, int]] = {}
 
 
 def search_web(query: str, max_results: int = 5) -> List[Dict[str, str]]:
@@ -22,10 +46,89 @@ def search_web(query: str, max_results: int = 5) -> List[Dict[str, str]]:
     return results
 
 
-def read_webpage(url: str) -> Optional[str]:
+async def read_webpage(url: str) -> Optional[str]:
     """Fetch and extract clean article text from a URL using trafilatura."""
-    import trafilatura
-    downloaded = trafilatura.fetch_url(url)
-    if not downloaded:
-        return None
-    return trafilatura.extract(downloaded)
+    page = (await read_webpages([url]))[0] if url.strip() else {}
+    return page.get("content")
+
+
+@asynccontextmanager
+async def _host_slot(host: str) -> AsyncIterator[None]:
+    semaphore, users = _host_slots.get(host, (None, 0))
+    if semaphore is None:
+        semaphore = asyncio.Semaphore(PER_HOST_CONCURRENCY)
+    _host_slots[host] = (semaphore, users + 1)
+    try:
+        async with semaphore:
+            yield
+    finally:
+        semaphore, users = _host_slots[host]
+        if users <= 1:
+            del _host_slots[host]  # idle: don't keep one per host ever fetched
+        else:
+            _host_slots[host] = (semaphore, users - 1)
+
+
+async def _fetch_capped(client: httpx.AsyncClient, url: str, max_bytes: int) -> bytes:
+    """GET url, reading at most max_bytes of body (the rest is never downloaded)."""
+    host = urlsplit(url).hostname or ""
+    async with _host_slot(host):
+        async with client.stream("GET", url) as response:
+            response.raise_for_status()
+            content_type = response.headers.get("content-type", "text/html").lower()
+            if not content_type.startswith(_HTML_TYPES):
+                raise ValueError(f"unsupported content type {content_type.split(';')[0]}")
+            chunks: List[bytes] = []
+            size = 0
+            async for chunk in response.aiter_bytes():
+                chunks.append(chunk)
+                size += len(chunk)
+                if size >= max_bytes:
+                    break  # closing the stream aborts the download
+            return b"".join(chunks)[:max_bytes]
+
+
+async def read_webpages(
+    urls: List[str],
+    timeout: float = FETCH_TIMEOUT_SECONDS,
+    max_bytes: int = MAX_PAGE_BYTES,
+) -> List[Dict[str, Any]]:
+    """
+    Fetch and extract several URLs concurrently. One entry per URL, in input
+    order: {"url", "content"} or {"url", "error"} — a failing page never fails
+    the others. timeout bounds the whole call: pages still downloading when it
+    expires are reported as timed out, and extraction gets only what is left.
+    """
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))[:MAX_PAGES_PER_CALL]
+    if not urls:
+        return []
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient(
+        timeout=httpx.Timeout(timeout, connect=min(timeout, 10.0)),
+        follow_redirects=True,
+        headers={"User-Agent": _USER_AGENT},
+    ) as client:
+        tasks = {url: asyncio.create_task(_fetch_capped(client, url, max_bytes)) for url in urls}
+        await asyncio.wait(tasks.values(), timeout=max(0.0, deadline - time.monotonic()))
+        for task in tasks.values():
+            task.cancel()  # no-op for finished downloads
+        await asyncio.gather(*tasks.values(), return_exceptions=True)
+    # Extract in parallel across the pool's processes
+    return list(await asyncio.gather(*(_page_result(url, task, timeout, deadline) for url, task in tasks.items())))
+
+
+async def _page_result(url: str, fetch: "asyncio.Task[bytes]", timeout: float, deadline: float) -> Dict[str, Any]:
+    if fetch.cancelled():
+        return {"url": url, "error": f"timed out after {timeout:.0f}s"}
+    exc = fetch.exception()
+    if exc is not None:
+        return {"url": url, "error": str(exc) or type(exc).__name__}
+    try:
+        content = await extract_text(fetch.result(), deadline=deadline)
+    except ExtractionTimeout:
+        return {"url": url, "error": "extraction timed out"}
+    except Exception as extract_exc:
+        return {"url": url, "error": f"extraction failed: {extract_exc}"}
+    if not content:
+        return {"url": url, "error": "no content extracted"}
+    return {"url": url, "content": content}
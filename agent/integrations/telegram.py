@@ -8,7 +8,7 @@ from __future__ import annotations
 import json
 from typing import Any, Dict, List, Optional
 
-import httpx
+from core import http_client
 
 API_BASE = "https://api.telegram.org/bot{token}/{method}"
 
@@ -18,11 +18,10 @@ def _url(token: str, method: str) -> str:
 
 
 async def test_connection(creds: Dict[str, str]) -> str:
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.get(_url(creds["bot_token"], "getMe"))
-        r.raise_for_status()
-        data = r.json()
-        return f"Telegram bot connected: @{data['result']['username']}"
+    r = await http_client.request("GET", _url(creds["bot_token"], "getMe"), timeout=10)
+    r.raise_for_status()
+    data = r.json()
+    return f"Telegram bot connected: @{data['result']['username']}"
 
 
 async def send_message(
@@ -38,10 +37,9 @@ async def send_message(
     if inline_keyboard:
         payload["reply_markup"] = {"inline_keyboard": inline_keyboard}
 
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(_url(creds["bot_token"], "sendMessage"), json=payload)
-        r.raise_for_status()
-        return r.json()
+    r = await http_client.request("POST", _url(creds["bot_token"], "sendMessage"), json=payload, timeout=10)
+    r.raise_for_status()
+    return r.json()
 
 
 BOT_COMMANDS = [
@@ -54,11 +52,12 @@ BOT_COMMANDS = [
 
 async def set_bot_commands(bot_token: str) -> None:
     """Set the bot command menu (BotFather style)."""
-    async with httpx.AsyncClient(timeout=10) as client:
-        await client.post(
-            _url(bot_token, "setMyCommands"),
-            json={"commands": BOT_COMMANDS},
-        )
+    await http_client.request(
+        "POST",
+        _url(bot_token, "setMyCommands"),
+        json={"commands": BOT_COMMANDS},
+        timeout=10,
+    )
 
 
 async def register_webhook(bot_token: str, webhook_url: str, secret_token: Optional[str] = None) -> str:
@@ -66,14 +65,13 @@ async def register_webhook(bot_token: str, webhook_url: str, secret_token: Optio
     params: Dict[str, str] = {"url": webhook_url}
     if secret_token:
         params["secret_token"] = secret_token
-    async with httpx.AsyncClient(timeout=10) as client:
-        r = await client.post(_url(bot_token, "setWebhook"), params=params)
-        r.raise_for_status()
-        data = r.json()
-        if data.get("ok"):
-            await set_bot_commands(bot_token)
-            return "Webhook registered successfully."
-        return data.get("description", "Unknown error")
+    r = await http_client.request("POST", _url(bot_token, "setWebhook"), params=params, timeout=10)
+    r.raise_for_status()
+    data = r.json()
+    if data.get("ok"):
+        await set_bot_commands(bot_token)
+        return "Webhook registered successfully."
+    return data.get("description", "Unknown error")
 
 
 def build_briefing_keyboard(frontend_url: str) -> List[List[Dict[str, Any]]]:
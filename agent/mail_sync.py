@@ -0,0 +1,109 @@
+"""
+agent/mail_sync.py — Persistence for IMAP UID watermarks (mail_sync_state).
+read_gmail reads from the committed watermark and stages the new one under the
+run's id (pending maps run id → watermark, so concurrent runs on one account
+never overwrite each other's); commit_run promotes only that run's entry when
+it completes. A failed run therefore leaves the watermark where it was, and the
+next run sees the same messages again. Within one run — including across
+approval suspend/resume — later reads continue from the staged watermark.
+"""
+
+from __future__ import annotations
+
+import logging
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from db.base import session_context
+from db.models import MailSyncState
+
+log = logging.getLogger(__name__)
+
+_FIELDS = ("uid_validity", "last_uid", "highest_modseq")
+# Staged entries kept per mailbox; the oldest are dropped first (runs that
+# crashed without reaching commit_run or discard_run)
+MAX_PENDING_RUNS = 20
+
+
+async def _get_state(
+    db: Any, user_id: int, account: str, mailbox: str, for_update: bool = False
+) -> Optional[MailSyncState]:
+    query = select(MailSyncState).where(
+        MailSyncState.user_id == user_id,
+        MailSyncState.account == account.lower(),
+        MailSyncState.mailbox == mailbox,
+    )
+    if for_update:
+        query = query.with_for_update()
+    result = await db.execute(query)
+    return result.scalar_one_or_none()
+
+
+async def load_watermark(user_id: int, account: str, run_id: int, mailbox: str = "INBOX") -> Optional[Dict[str, Any]]:
+    """Where this run should continue from: its own staged watermark, else the committed one."""
+    async with session_context() as db:
+        state = await _get_state(db, user_id, account, mailbox)
+    if state is None:
+        return None
+    staged = (state.pending or {}).get(str(run_id))
+    if staged is not None:
+        return {k: staged.get(k) for k in _FIELDS}
+    return {k: getattr(state, k) for k in _FIELDS}
+
+
+async def stage_watermark(
+    user_id: int, account: str, run_id: int, watermark: Dict[str, Any], mailbox: str = "INBOX"
+) -> None:
+    staged = {k: watermark.get(k) for k in _FIELDS}
+    async with session_context() as db:
+        # First sync: nothing committed yet. UIDVALIDITY 0 never matches a
+        # server's, so until this run completes others bootstrap as before
+        await db.execute(
+            insert(MailSyncState)
+            .values(user_id=user_id, account=account.lower(), mailbox=mailbox, uid_validity=0, last_uid=0)
+            .on_conflict_do_nothing(index_elements=["user_id", "account", "mailbox"])
+        )
+        # Row lock: concurrent runs each add their own entry without losing the other's
+        state = await _get_state(db, user_id, account, mailbox, for_update=True)
+        pending = dict(state.pending or {})
+        if pending.get(str(run_id)) == staged:
+            return
+        pending[str(run_id)] = staged
+        for stale in sorted(pending, key=int)[:-MAX_PENDING_RUNS]:
+            del pending[stale]
+        state.pending = pending  # reassigned so the JSONB change is flushed
+
+
+async def commit_run(run_id: int) -> None:
+    """Promote every watermark staged by run_id (call when the run completes)."""
+    try:
+        async with session_context() as db:
+            for state in await _staged_by(db, run_id):
+                pending = dict(state.pending)
+                staged = pending.pop(str(run_id))
+                for key in _FIELDS:
+                    setattr(state, key, staged.get(key))
+                state.pending = pending or None
+    except Exception as exc:
+        log.error("Failed to commit mail watermarks for run %d: %s", run_id, exc)
+
+
+async def discard_run(run_id: int) -> None:
+    """Drop every watermark staged by run_id (call when the run fails)."""
+    try:
+        async with session_context() as db:
+            for state in await _staged_by(db, run_id):
+                pending = dict(state.pending)
+                pending.pop(str(run_id), None)
+                state.pending = pending or None
+    except Exception as exc:
+        log.error("Failed to discard mail watermarks for run %d: %s", run_id, exc)
+
+
+async def _staged_by(db: Any, run_id: int) -> List[MailSyncState]:
+    result = await db.execute(
+        select(MailSyncState).where(MailSyncState.pending.has_key(str(run_id))).with_for_update()
+    )
+    return list(result.scalars())
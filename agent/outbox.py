@@ -0,0 +1,254 @@
+"""
+agent/outbox.py — Durable outbox for approved emails.
+send_email only inserts an outbox_messages row (and rings a Redis doorbell);
+the sender task in each worker claims due rows with FOR UPDATE SKIP LOCKED,
+delivers them over the per-account persistent SMTP connection
+(gmail.smtp_session) and records every attempt in action_log under the run
+that queued the message. Transient failures (disconnects, timeouts, 4xx) are
+retried with exponential backoff up to OUTBOX_MAX_ATTEMPTS; 5xx rejections fail
+immediately. A claimed row carries a lease (next_attempt_at), so a message held
+by a worker that died is picked up again once the lease runs out. The lease is
+renewed (guarded by the attempt number) right before each send, and a row whose
+lease was taken over by another sender is skipped. A send that times out after
+it started may still have been delivered; it is failed for manual review rather
+than retried. Delivery is otherwise at-least-once: if a worker dies (or cannot
+record the result) after the server accepted a message, the row is sent again
+when its lease runs out. A row claimed more than OUTBOX_MAX_ATTEMPTS times that
+way is failed without sending.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import random
+import smtplib
+import threading
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Optional
+
+import redis.asyncio as aioredis
+from sqlalchemy import text
+
+from agent.action_log import action_log_writer
+from agent.integrations.blocking import IntegrationTimeout, run_blocking
+from core.credentials import get_credentials
+from db.base import session_context
+from db.models import OutboxMessage
+
+log = logging.getLogger(__name__)
+
+REDIS_OUTBOX_DOORBELL = "toora:outbox:wake"
+OUTBOX_POLL_SECONDS = 30
+OUTBOX_BATCH = 20
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_MAX_ATTEMPTS = int(os.environ.get("OUTBOX_MAX_ATTEMPTS", "6"))
+OUTBOX_BACKOFF_BASE_SECONDS = 30
+OUTBOX_BACKOFF_MAX_SECONDS = 3600
+
+_CLAIM = text("""
+UPDATE outbox_messages
+SET status = 'sending', attempts = attempts + 1, next_attempt_at = now() + make_interval(secs => :lease)
+WHERE id IN (
+    SELECT id FROM outbox_messages
+    WHERE status IN ('queued', 'sending') AND next_attempt_at <= now()
+    ORDER BY next_attempt_at
+    LIMIT :batch
+    FOR UPDATE SKIP LOCKED
+)
+RETURNING id, user_id, run_id, to_address, subject, body, attempts
+""")
+
+
+_RENEW = text("""
+UPDATE outbox_messages
+SET next_attempt_at = now() + make_interval(secs => :lease)
+WHERE id = :id AND status = 'sending' AND attempts = :attempts
+RETURNING id
+""")
+
+
+class _Permanent(Exception):
+    pass
+
+
+class _Unknown(Exception):
+    """The send started but its outcome was never observed."""
+
+
+class _Attempt:
+    """Lets a timed-out caller tell "never started" from "may have been sent"."""
+
+    def __init__(self) -> None:
+        self.lock = threading.Lock()
+        self.started = False
+        self.abandoned = False
+
+
+async def enqueue_email(redis_url: str, user_id: int, run_id: int, to: str, subject: str, body: str) -> int:
+    """Persist an approved email for delivery; returns the outbox id."""
+    async with session_context() as db:
+        message = OutboxMessage(user_id=user_id, run_id=run_id, to_address=to, subject=subject, body=body)
+        db.add(message)
+        await db.flush()
+        outbox_id = message.id
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await r.lpush(REDIS_OUTBOX_DOORBELL, outbox_id)
+        await r.ltrim(REDIS_OUTBOX_DOORBELL, 0, 99)
+        await r.aclose()
+    except Exception as exc:
+        log.warning("Outbox doorbell failed (message %d will go out on the next poll): %s", outbox_id, exc)
+    return outbox_id
+
+
+def _backoff(attempts: int) -> float:
+    delay = min(OUTBOX_BACKOFF_MAX_SECONDS, OUTBOX_BACKOFF_BASE_SECONDS * 2 ** (attempts - 1))
+    return delay * random.uniform(0.8, 1.2)
+
+
+async def _deliver(row: Dict) -> None:
+    creds = await get_credentials(row["user_id"], "gmail")
+    if not creds:
+        raise _Permanent("Gmail not configured.")
+    from agent.integrations.gmail import send_email_smtp
+    attempt = _Attempt()
+
+    def _send() -> None:
+        with attempt.lock:
+            if attempt.abandoned:
+                return  # timed out while queued; the caller already gave up
+            attempt.started = True
+        send_email_smtp(creds, row["to_address"], row["subject"], row["body"])
+
+    try:
+        await run_blocking("smtp", _send)
+    except IntegrationTimeout as exc:
+        # run_blocking only abandons the thread; a running send may still deliver
+        with attempt.lock:
+            attempt.abandoned = True
+            started = attempt.started
+        if started:
+            raise _Unknown(f"timed out after the send started ({exc}); it may have been delivered") from exc
+        raise
+    except smtplib.SMTPRecipientsRefused as exc:
+        raise _Permanent(f"recipient refused: {exc.recipients}") from exc
+    except smtplib.SMTPResponseException as exc:
+        if 500 <= exc.smtp_code < 600:
+            raise _Permanent(f"{exc.smtp_code} {exc.smtp_error!r}") from exc
+        raise
+
+
+async def _record(row: Dict, status: str, error: Optional[str] = None, retry_in: Optional[float] = None) -> None:
+    now = datetime.now(tz=timezone.utc)
+    async with session_context() as db:
+        message = await db.get(OutboxMessage, row["id"])
+        if message is not None:
+            message.status = status
+            message.last_error = error
+            if status == "sent":
+                message.sent_at = now
+            elif retry_in is not None:
+                message.next_attempt_at = now + timedelta(seconds=retry_in)
+    output = {"outbox_id": row["id"], "status": status, "attempt": row["attempts"]}
+    if error:
+        output["error"] = error[:500]
+    action_log_writer.add(
+        row["run_id"],
+        "send_email_delivery",
+        {"to": row["to_address"], "subject": row["subject"]},
+        output,
+    )
+
+
+async def _renew(row: Dict) -> bool:
+    """Extend our lease just before sending; False if another sender has taken the row over."""
+    async with session_context() as db:
+        result = await db.execute(
+            _RENEW, {"id": row["id"], "attempts": row["attempts"], "lease": OUTBOX_LEASE_SECONDS}
+        )
+        return result.first() is not None
+
+
+async def _retry_or_fail(row: Dict, exc: BaseException) -> None:
+    if row["attempts"] >= OUTBOX_MAX_ATTEMPTS:
+        log.error("Outbox message %d failed after %d attempts: %s", row["id"], row["attempts"], exc)
+        await _record(row, "failed", str(exc) or type(exc).__name__)
+    else:
+        delay = _backoff(row["attempts"])
+        log.warning("Outbox message %d attempt %d failed (%s); retrying in %.0fs", row["id"], row["attempts"], exc, delay)
+        await _record(row, "queued", str(exc) or type(exc).__name__, retry_in=delay)
+
+
+async def _send_one(row: Dict) -> None:
+    try:
+        if not await _renew(row):
+            log.warning("Outbox message %d lease lost before sending; leaving it to its new owner.", row["id"])
+            return
+        if row["attempts"] > OUTBOX_MAX_ATTEMPTS:
+            # Reclaimed after its last allowed attempt never recorded an outcome
+            log.error("Outbox message %d exceeded %d attempts; not sending again.", row["id"], OUTBOX_MAX_ATTEMPTS)
+            await _record(row, "failed", f"gave up after {OUTBOX_MAX_ATTEMPTS} attempts — check Sent before resending")
+            return
+        try:
+            await _deliver(row)
+        except _Permanent as exc:
+            log.error("Outbox message %d failed permanently: %s", row["id"], exc)
+            await _record(row, "failed", str(exc))
+        except _Unknown as exc:
+            log.error("Outbox message %d delivery state unknown, not retrying: %s", row["id"], exc)
+            await _record(row, "failed", f"delivery unknown — check Sent before resending: {exc}")
+        except (smtplib.SMTPException, OSError, IntegrationTimeout) as exc:
+            await _retry_or_fail(row, exc)
+        except Exception as exc:
+            log.exception("Outbox message %d attempt %d raised unexpectedly", row["id"], row["attempts"])
+            await _retry_or_fail(row, exc)
+        else:
+            log.info("Outbox message %d sent to %s.", row["id"], row["to_address"])
+            await _record(row, "sent")
+    except Exception as exc:
+        # Left 'sending': retried (possibly re-sent) once its lease runs out
+        log.error("Outbox message %d attempt %d could not be recorded: %s", row["id"], row["attempts"], exc)
+
+
+async def _send_batch(rows: List[Dict]) -> None:
+    # One account's messages go out in order over its connection; accounts in
+    # parallel. Rows late in a long queue are protected by _renew, not the claim lease
+    by_user: Dict[int, List[Dict]] = defaultdict(list)
+    for row in rows:
+        by_user[row["user_id"]].append(row)
+
+    async def _drain(user_rows: List[Dict]) -> None:
+        for row in user_rows:
+            await _send_one(row)
+
+    await asyncio.gather(*(_drain(user_rows) for user_rows in by_user.values()))
+
+
+async def _claim() -> List[Dict]:
+    async with session_context() as db:
+        result = await db.execute(_CLAIM, {"lease": OUTBOX_LEASE_SECONDS, "batch": OUTBOX_BATCH})
+        return [dict(row) for row in result.mappings().all()]
+
+
+async def run_sender(redis_url: str) -> None:
+    """Long-running task: deliver due outbox messages, woken by the doorbell or every OUTBOX_POLL_SECONDS."""
+    r = aioredis.from_url(redis_url, decode_responses=True)
+    try:
+        while True:
+            try:
+                rows = await _claim()
+                if rows:
+                    await _send_batch(rows)
+                    if len(rows) == OUTBOX_BATCH:
+                        continue  # more may be due
+                await r.blpop(REDIS_OUTBOX_DOORBELL, timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.CancelledError:
+                raise
+            except Exception as exc:
+                log.error("Outbox sender error: %s — retrying in 5s", exc)
+                await asyncio.sleep(5)
+    finally:
+        await r.aclose()
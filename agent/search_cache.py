@@ -0,0 +1,119 @@
+"""
+agent/search_cache.py — Redis-backed result cache for search_web / read_webpage.
+Shared by every worker process, so a query or URL fetched by one run is reused
+by the next (or by the same run's later turns) until its kind's TTL expires.
+Keys are normalised (whitespace/case-folded queries, canonical URLs without
+fragments or tracking parameters). A ZSET of last-access times caps the cache
+at SEARCH_CACHE_MAX_ENTRIES, evicting least-recently-used entries; hit/miss
+counts per kind live in the toora:search_cache:stats hash.
+Redis errors never fail a tool — they just count as a miss.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+from typing import Any, Dict, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import redis.asyncio as aioredis
+
+log = logging.getLogger(__name__)
+
+REDIS_SEARCH_CACHE_PREFIX = "toora:search_cache:"
+REDIS_SEARCH_CACHE_LRU = "toora:search_cache:lru"
+REDIS_SEARCH_CACHE_STATS = "toora:search_cache:stats"
+SEARCH_CACHE_TTLS = {
+    "search": int(os.environ.get("SEARCH_CACHE_TTL_SECONDS", "3600")),
+    "page": int(os.environ.get("PAGE_CACHE_TTL_SECONDS", "86400")),
+}
+SEARCH_CACHE_MAX_ENTRIES = int(os.environ.get("SEARCH_CACHE_MAX_ENTRIES", "5000"))
+
+_TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src", "igshid"}
+_DEFAULT_PORTS = {"http": 80, "https": 443}
+
+_redis: Optional[aioredis.Redis] = None
+
+
+def _client() -> aioredis.Redis:
+    global _redis
+    if _redis is None:
+        from core.config import get_settings
+        _redis = aioredis.from_url(get_settings(required=["REDIS_URL"]).redis_url, decode_responses=True)
+    return _redis
+
+
+def normalize_query(query: str, max_results: int) -> str:
+    return f"{' '.join(query.split()).lower()}|{max_results}"
+
+
+def canonical_url(url: str) -> str:
+    """Lower-case scheme/host, drop default port, fragment and tracking params, sort the query."""
+    parts = urlsplit(url.strip())
+    scheme = parts.scheme.lower() or "http"
+    host = (parts.hostname or "").lower()
+    if parts.port and parts.port != _DEFAULT_PORTS.get(scheme):
+        host = f"{host}:{parts.port}"
+    path = parts.path or "/"
+    if len(path) > 1:
+        path = path.rstrip("/")
+    params = sorted(
+        (k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+        if not k.lower().startswith("utm_") and k.lower() not in _TRACKING_PARAMS
+    )
+    return urlunsplit((scheme, host, path, urlencode(params), ""))
+
+
+def _key(kind: str, normalized: str) -> str:
+    digest = hashlib.sha256(normalized.encode("utf-8")).hexdigest()[:32]
+    return f"{REDIS_SEARCH_CACHE_PREFIX}{kind}:{digest}"
+
+
+async def get(kind: str, normalized: str) -> Optional[Any]:
+    """Cached value for (kind, normalised key), or None on miss."""
+    key = _key(kind, normalized)
+    try:
+        r = _client()
+        raw = await r.get(key)
+        async with r.pipeline(transaction=False) as pipe:
+            if raw is not None:
+                pipe.zadd(REDIS_SEARCH_CACHE_LRU, {key: time.time()})
+            pipe.hincrby(REDIS_SEARCH_CACHE_STATS, f"{kind}:{'hit' if raw is not None else 'miss'}", 1)
+            await pipe.execute()
+    except Exception as exc:
+        log.warning("Search cache read failed: %s", exc)
+        return None
+    return json.loads(raw) if raw is not None else None
+
+
+async def put(kind: str, normalized: str, value: Any) -> None:
+    key = _key(kind, normalized)
+    try:
+        r = _client()
+        async with r.pipeline(transaction=False) as pipe:
+            pipe.set(key, json.dumps(value, default=str), ex=SEARCH_CACHE_TTLS[kind])
+            pipe.zadd(REDIS_SEARCH_CACHE_LRU, {key: time.time()})
+            pipe.zcard(REDIS_SEARCH_CACHE_LRU)
+            size = (await pipe.execute())[-1]
+        overflow = size - SEARCH_CACHE_MAX_ENTRIES
+        if overflow > 0:
+            evicted = [member for member, _ in await r.zpopmin(REDIS_SEARCH_CACHE_LRU, overflow)]
+            if evicted:
+                await r.delete(*evicted)
+    except Exception as exc:
+        log.warning("Search cache write failed: %s", exc)
+
+
+async def stats() -> Dict[str, int]:
+    """Hit/miss counters, e.g. {"search:hit": 12, "search:miss": 30, ...}."""
+    return {k: int(v) for k, v in (await _client().hgetall(REDIS_SEARCH_CACHE_STATS)).items()}
+
+
+async def close() -> None:
+    global _redis
+    if _redis is not None:
+        await _redis.aclose()
+        _redis = None
@@ -0,0 +1,113 @@
+"""
+agent/stream.py — Live step/token streaming from a run to the dashboard.
+Consumes LangGraph's astream_events and forwards LLM token deltas and tool
+start/end events over the existing Redis → WebSocketManager path (toora:ws).
+Events are coalesced: one "agent_stream" frame per STREAM_FLUSH_INTERVAL (or
+sooner once STREAM_MAX_BUFFER_CHARS of text is pending), with consecutive token
+deltas merged into a single text event.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, Dict, List, Optional
+
+import redis.asyncio as aioredis
+
+log = logging.getLogger(__name__)
+
+REDIS_WS_CHANNEL = "toora:ws"
+AGENT_STREAMING = os.environ.get("AGENT_STREAMING", "1").strip().lower() not in ("0", "false", "no")
+STREAM_FLUSH_INTERVAL = 0.25
+STREAM_MAX_BUFFER_CHARS = 2048
+PREVIEW_CHARS = 300
+
+
+def _preview(value: Any) -> str:
+    value = getattr(value, "content", value)
+    if not isinstance(value, str):
+        try:
+            value = json.dumps(value, default=str)
+        except Exception:
+            value = str(value)
+    return value[:PREVIEW_CHARS]
+
+
+class StreamPublisher:
+    """Buffers run events and publishes them as batched frames on one Redis connection."""
+
+    def __init__(self, redis_url: str, run_id: int) -> None:
+        self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._run_id = run_id
+        self._events: List[Dict[str, Any]] = []
+        self._pending_chars = 0
+        self._flush_task: Optional[asyncio.Task] = None
+        self._wake = asyncio.Event()
+
+    async def __aenter__(self) -> "StreamPublisher":
+        self._flush_task = asyncio.create_task(self._flush_loop())
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        if self._flush_task:
+            self._flush_task.cancel()
+        await self.flush()
+        await self._redis.aclose()
+
+    def token(self, text: str) -> None:
+        last = self._events[-1] if self._events else None
+        if last is not None and last["kind"] == "token":
+            last["text"] += text
+        else:
+            self._events.append({"kind": "token", "text": text})
+        self._pending_chars += len(text)
+        if self._pending_chars >= STREAM_MAX_BUFFER_CHARS:
+            self._wake.set()
+
+    def event(self, kind: str, data: Dict[str, Any]) -> None:
+        self._events.append({"kind": kind, **data})
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=STREAM_FLUSH_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            await self.flush()
+
+    async def flush(self) -> None:
+        if not self._events:
+            return
+        events, self._events, self._pending_chars = self._events, [], 0
+        frame = {"type": "agent_stream", "data": {"run_id": self._run_id, "events": events}}
+        try:
+            await self._redis.publish(REDIS_WS_CHANNEL, json.dumps(frame, default=str))
+        except Exception as exc:
+            log.warning("Failed to publish stream frame for run %d: %s", self._run_id, exc)
+
+
+async def stream_run(agent: Any, graph_input: Any, config: Dict[str, Any], redis_url: str, run_id: int) -> Any:
+    """
+    Execute the agent via astream_events, forwarding progress as it happens.
+    Returns the final graph output (same shape as ainvoke), or None if the
+    graph stopped without one (e.g. interrupted for approval).
+    """
+    result: Any = None
+    async with StreamPublisher(redis_url, run_id) as stream:
+        async for ev in agent.astream_events(graph_input, config=config, version="v2"):
+            kind = ev["event"]
+            if kind == "on_chat_model_stream":
+                content = getattr(ev["data"].get("chunk"), "content", "")
+                if isinstance(content, str) and content:
+                    stream.token(content)
+            elif kind == "on_tool_start":
+                stream.event("tool_call", {"tool": ev["name"], "input": _preview(ev["data"].get("input"))})
+            elif kind == "on_tool_end":
+                stream.event("tool_result", {"tool": ev["name"], "output": _preview(ev["data"].get("output"))})
+            elif kind == "on_chain_end" and not ev.get("parent_ids"):
+                result = ev["data"].get("output")
+    return result
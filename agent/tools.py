@@ -1,68 +1,36 @@
 """
-agent/tools.py — LangGraph tool implementations for all 7 agent tools.
-Each tool: decrypts credentials, executes the integration, logs to action_log,
-checks approval rules before consequential actions.
+agent/tools.py — LangGraph tool implementations for all agent tools.
+Each tool: reads run-scoped credentials, executes the integration, logs to action_log,
+checks approval rules before consequential actions. Blocking SDK calls go through
+run_blocking (agent/integrations/blocking.py), never straight onto the event loop.
 """
 
 from __future__ import annotations
 
-import asyncio
 import json
 import logging
-from datetime import datetime, timezone
-from typing import Any, Dict, Optional
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 
 from langchain_core.tools import tool
 
-from core.encryption import decrypt_dict
-from db.base import session_context
-from db.models import ActionLog, AgentConfig, Integration
+from agent.action_log import action_log_writer
+from agent.context import current_run
+from agent.integrations.blocking import run_blocking
 
 log = logging.getLogger(__name__)
 
-DEFAULT_USER_ID = 1
-
-# Shared run_id set by the worker before running the agent
-_current_run_id: int = 0
-# Main event loop — set by run_agent so _run can schedule coros on it (avoids
-# "Future attached to a different loop" when LangGraph runs sync tools in executor)
-_main_loop: asyncio.AbstractEventLoop | None = None
-
-
-def set_run_id(run_id: int) -> None:
-    global _current_run_id
-    _current_run_id = run_id
-
-
-def set_main_loop(loop: asyncio.AbstractEventLoop | None) -> None:
-    global _main_loop
-    _main_loop = loop
+# Per-page text returned to the LLM by read_webpages (keeps one tool result bounded)
+READ_WEBPAGES_MAX_CHARS = 8000
 
 
 async def _get_creds(platform: str) -> Optional[Dict[str, str]]:
-    async with session_context() as db:
-        from sqlalchemy import select
-        result = await db.execute(
-            select(Integration).where(
-                Integration.user_id == DEFAULT_USER_ID,
-                Integration.platform == platform,
-                Integration.status == "connected",
-            )
-        )
-        row = result.scalar_one_or_none()
-        if not row:
-            return None
-        return decrypt_dict(row.encrypted_credentials)
+    """Decrypted credentials loaded at run start (see RunContext)."""
+    return current_run().creds(platform)
 
 
 async def _get_approval_rules() -> Dict[str, bool]:
-    async with session_context() as db:
-        from sqlalchemy import select
-        result = await db.execute(
-            select(AgentConfig).where(AgentConfig.user_id == DEFAULT_USER_ID)
-        )
-        cfg = result.scalar_one_or_none()
-        return cfg.approval_rules if cfg else {}
+    return dict(current_run().approval_rules)
 
 
 async def _log_action(
@@ -72,224 +40,329 @@ async def _log_action(
     requires_approval: bool = False,
     approval_status: Optional[str] = None,
 ) -> None:
-    async with session_context() as db:
-        entry = ActionLog(
-            run_id=_current_run_id,
-            tool_used=tool_name,
-            input_data=input_data,
-            output_data=output_data,
-            requires_approval=requires_approval,
-            approval_status=approval_status,
-            timestamp=datetime.now(tz=timezone.utc),
-        )
-        db.add(entry)
+    # Buffered; written in bulk by agent/action_log.py and flushed at run end
+    action_log_writer.add(
+        current_run().run_id,
+        tool_name,
+        input_data,
+        output_data,
+        requires_approval,
+        approval_status,
+    )
 
 
-def _run(coro):
-    """Run coroutine from a sync context (LangChain tool interface).
-    Tools are invoked by LangGraph in a thread pool. We must run our coro on
-    the main event loop (where DB engine lives), not create a new loop."""
-    loop = _main_loop
-    if loop is not None:
-        return asyncio.run_coroutine_threadsafe(coro, loop).result()
-    try:
-        return asyncio.run(coro)
-    except RuntimeError:
-        return asyncio.run(coro)
+# ── Tools ─────────────────────────────────────────────────────────────────────
 
+@tool
+async def read_gmail(max_count: int = 10) -> str:
+    """Read new emails from Gmail — those that arrived since the last completed run.
+    Returns a JSON list of emails with uid, sender, subject, date and a short snippet.
+    Use read_email_body(uid) for the full text of the ones that need it."""
+    creds = await _get_creds("gmail")
+    if not creds:
+        return json.dumps({"error": "Gmail not configured."})
+    from agent import mail_sync
+    from agent.integrations.gmail import read_new_emails
+    run = current_run()
+    since = await mail_sync.load_watermark(run.user_id, creds["email"], run.run_id)
+    emails, watermark = await run_blocking("gmail", read_new_emails, creds, since, max_count)
+    if watermark != since:
+        await mail_sync.stage_watermark(run.user_id, creds["email"], run.run_id, watermark)
+    await _log_action(
+        "read_gmail",
+        {"max_count": max_count, "since_uid": (since or {}).get("last_uid")},
+        {"count": len(emails), "emails": emails},
+    )
+    return json.dumps(emails)
 
-# ── Tools ─────────────────────────────────────────────────────────────────────
 
 @tool
-def read_gmail(max_count: int = 10) -> str:
-    """Read unread emails from Gmail. Returns a JSON list of emails."""
-    async def _impl():
-        creds = await _get_creds("gmail")
-        if not creds:
-            return json.dumps({"error": "Gmail not configured."})
-        from agent.integrations.gmail import read_unread_emails
-        emails = read_unread_emails(creds, max_count)
-        await _log_action("read_gmail", {"max_count": max_count}, {"count": len(emails), "emails": emails})
-        return json.dumps(emails)
-    return _run(_impl())
+async def read_email_body(uid: str, max_bytes: int = 65536) -> str:
+    """Fetch the full text of one email by the uid returned from read_gmail.
+    max_bytes caps how much of the message is downloaded (default 64 KB)."""
+    creds = await _get_creds("gmail")
+    if not creds:
+        return json.dumps({"error": "Gmail not configured."})
+    from agent.integrations.gmail import read_email_body as _read_body
+    max_bytes = max(1024, min(max_bytes, 1024 * 1024))
+    message = await run_blocking("gmail", _read_body, creds, uid, max_bytes)
+    if message is None:
+        await _log_action("read_email_body", {"uid": uid}, {"error": "not found"})
+        return json.dumps({"error": f"No message with uid {uid}."})
+    await _log_action(
+        "read_email_body",
+        {"uid": uid, "max_bytes": max_bytes},
+        {"subject": message["subject"], "length": len(message["body"]), "truncated": message["truncated"]},
+    )
+    return json.dumps(message)
 
 
 @tool
-def send_email(to: str, subject: str, body: str) -> str:
+async def send_email(to: str, subject: str, body: str) -> str:
     """Send an email via Gmail SMTP. ALWAYS requires Telegram approval first."""
-    async def _impl():
-        from agent.approval import require_approval
-        decision = await require_approval(
-            run_id=_current_run_id,
-            action_description=f"Send email to {to}: {subject}",
-            full_context={"to": to, "subject": subject, "body_preview": body[:300]},
+    from agent.approval import request_approval
+    decision = await request_approval(
+        action_description=f"Send email to {to}: {subject}",
+        full_context={"to": to, "subject": subject, "body_preview": body[:300]},
+    )
+    status = "approved" if decision is True else "rejected" if decision is False else "expired"
+    if decision:
+        creds = await _get_creds("gmail")
+        if not creds:
+            await _log_action("send_email", {"to": to, "subject": subject}, {"error": "Gmail not configured."}, True, status)
+            return "Gmail not configured."
+        # Delivered by the outbox sender (agent/outbox.py); the turn doesn't wait on SMTP
+        from agent.outbox import enqueue_email
+        from core.config import get_settings
+        run = current_run()
+        outbox_id = await enqueue_email(
+            get_settings(required=["REDIS_URL"]).redis_url, run.user_id, run.run_id, to, subject, body
         )
-        status = "approved" if decision is True else "rejected" if decision is False else "expired"
-        if decision:
-            creds = await _get_creds("gmail")
-            if not creds:
-                await _log_action("send_email", {"to": to, "subject": subject}, {"error": "Gmail not configured."}, True, status)
-                return "Gmail not configured."
-            from agent.integrations.gmail import send_email_smtp
-            send_email_smtp(creds, to, subject, body)
-            await _log_action("send_email", {"to": to, "subject": subject}, {"sent": True}, True, status)
-            return f"Email sent to {to}."
-        await _log_action("send_email", {"to": to, "subject": subject}, {"sent": False}, True, status)
-        return f"Email not sent — decision: {status}."
-    return _run(_impl())
+        await _log_action("send_email", {"to": to, "subject": subject}, {"queued": True, "outbox_id": outbox_id}, True, status)
+        return f"Email to {to} approved and queued for delivery."
+    await _log_action("send_email", {"to": to, "subject": subject}, {"sent": False}, True, status)
+    return f"Email not sent — decision: {status}."
 
 
 @tool
-def search_web(query: str, max_results: int = 5) -> str:
+async def search_web(query: str, max_results: int = 5) -> str:
     """Search the web using DuckDuckGo. Returns top results as JSON."""
-    async def _impl():
-        from agent.integrations.search import search_web as _search
-        results = _search(query, max_results)
-        await _log_action("search_web", {"query": query}, {"results": results})
-        return json.dumps(results)
-    return _run(_impl())
+    from agent import search_cache
+    from agent.integrations.search import search_web as _search
+    key = search_cache.normalize_query(query, max_results)
+    results = await search_cache.get("search", key)
+    cached = results is not None
+    if not cached:
+        results = await run_blocking("search", _search, query, max_results)
+        if results:
+            await search_cache.put("search", key, results)
+    await _log_action("search_web", {"query": query}, {"results": results, "cached": cached})
+    return json.dumps(results)
 
 
 @tool
-def read_webpage(url: str) -> str:
+async def read_webpage(url: str) -> str:
     """Fetch and extract clean article text from a URL."""
-    async def _impl():
-        from agent.integrations.search import read_webpage as _read
-        content = _read(url)
-        await _log_action("read_webpage", {"url": url}, {"length": len(content or ""), "preview": (content or "")[:300]})
-        return content or "No content extracted."
-    return _run(_impl())
+    from agent import search_cache
+    from agent.integrations.search import read_webpage as _read
+    key = search_cache.canonical_url(url)
+    content = await search_cache.get("page", key)
+    cached = content is not None
+    if not cached:
+        content = await _read(url)
+        if content:
+            await search_cache.put("page", key, content)
+    await _log_action(
+        "read_webpage",
+        {"url": url},
+        {"length": len(content or ""), "preview": (content or "")[:300], "cached": cached},
+    )
+    return content or "No content extracted."
 
 
 @tool
-def read_calendar(max_results: int = 10, days_ahead: int = 7) -> str:
+async def read_webpages(urls: List[str]) -> str:
+    """Fetch and extract clean article text from several URLs at once (up to 10).
+    Prefer this over repeated read_webpage calls when reading multiple search results.
+    Returns a JSON list of {url, content} or {url, error}, one per URL."""
+    from agent import search_cache
+    from agent.integrations.search import MAX_PAGES_PER_CALL, read_webpages as _read_many
+    urls = list(dict.fromkeys(u.strip() for u in urls if u and u.strip()))[:MAX_PAGES_PER_CALL]
+    pages: Dict[str, Dict[str, Any]] = {}
+    for url in urls:
+        content = await search_cache.get("page", search_cache.canonical_url(url))
+        if content is not None:
+            pages[url] = {"url": url, "content": content, "cached": True}
+    for page in await _read_many([u for u in urls if u not in pages]):
+        pages[page["url"]] = page
+        if page.get("content"):
+            await search_cache.put("page", search_cache.canonical_url(page["url"]), page["content"])
+    results = [pages[u] for u in urls if u in pages]
+    await _log_action(
+        "read_webpages",
+        {"urls": urls},
+        {"pages": [
+            {"url": p["url"], "length": len(p.get("content") or ""), "error": p.get("error"), "cached": p.get("cached", False)}
+            for p in results
+        ]},
+    )
+    return json.dumps([
+        {"url": p["url"], "error": p["error"]} if "error" in p
+        else {"url": p["url"], "content": p["content"][:READ_WEBPAGES_MAX_CHARS]}
+        for p in results
+    ])
+
+
+async def _sync_calendar(creds: Dict[str, str], until: Optional[datetime] = None) -> Optional[str]:
+    """Bring the local calendar store up to date (through until); an error only if there is nothing usable to read."""
+    from agent import calendar_sync
+    user_id = current_run().user_id
+    try:
+        await calendar_sync.sync(user_id, creds, until=until)
+        return None
+    except Exception as exc:
+        if await calendar_sync.is_synced(user_id):
+            log.warning("Calendar sync failed, answering from the local store: %s", exc)
+            return None
+        return f"Calendar sync failed: {exc}"
+
+
+def _parse_iso(value: str) -> Optional[datetime]:
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+@tool
+async def read_calendar(max_results: int = 10, days_ahead: int = 7) -> str:
     """Read upcoming events from Google Calendar. Returns a JSON list of events."""
-    async def _impl():
-        creds = await _get_creds("google_calendar")
-        if not creds:
-            return json.dumps({"error": "Google Calendar not configured."})
-        from agent.integrations.google_calendar import list_upcoming_events
-        events = list_upcoming_events(creds, max_results, days_ahead)
-        await _log_action("read_calendar", {"max_results": max_results, "days_ahead": days_ahead}, {"count": len(events), "events": events})
-        return json.dumps(events)
-    return _run(_impl())
+    creds = await _get_creds("google_calendar")
+    if not creds:
+        return json.dumps({"error": "Google Calendar not configured."})
+    error = await _sync_calendar(creds, until=datetime.now(tz=timezone.utc) + timedelta(days=days_ahead))
+    if error:
+        await _log_action("read_calendar", {"max_results": max_results, "days_ahead": days_ahead}, {"error": error})
+        return json.dumps({"error": error})
+    from agent import calendar_sync
+    events = await calendar_sync.upcoming_events(current_run().user_id, max_results, days_ahead)
+    await _log_action("read_calendar", {"max_results": max_results, "days_ahead": days_ahead}, {"count": len(events), "events": events})
+    return json.dumps(events)
 
 
 @tool
-def create_calendar_event(summary: str, start_datetime: str, end_datetime: str = "", description: str = "") -> str:
+async def create_calendar_event(summary: str, start_datetime: str, end_datetime: str = "", description: str = "") -> str:
     """Create an event in Google Calendar. start_datetime and end_datetime must be ISO 8601 (e.g. 2026-02-20T14:00:00Z).
-    If end_datetime is empty, defaults to 1 hour after start. May require approval."""
-    async def _impl():
-        rules = await _get_approval_rules()
-        requires = rules.get("create_calendar_event", False)
-        decision = True
-        if requires:
-            from agent.approval import require_approval
-            decision = await require_approval(
-                run_id=_current_run_id,
-                action_description=f"Create calendar event: {summary}",
-                full_context={"summary": summary, "start": start_datetime, "end": end_datetime},
-            )
-        status = "approved" if decision else ("rejected" if decision is False else "expired")
-        if decision:
-            creds = await _get_creds("google_calendar")
-            if not creds:
-                await _log_action("create_calendar_event", {"summary": summary}, {"error": "Google Calendar not configured."}, requires, status if requires else None)
-                return "Google Calendar not configured."
-            from agent.integrations.google_calendar import create_event
-            end = end_datetime.strip() or None
-            result = create_event(creds, summary, start_datetime, end, description)
-            await _log_action("create_calendar_event", {"summary": summary}, {"id": result.get("id")}, requires, status if requires else None)
-            return f"Calendar event created: {result.get('htmlLink', result.get('id'))}"
-        await _log_action("create_calendar_event", {"summary": summary}, {"created": False}, requires, status)
-        return f"Event not created — decision: {status}."
-    return _run(_impl())
+    If end_datetime is empty, defaults to 1 hour after start. Reports events it overlaps. May require approval."""
+    from agent import calendar_sync
+    user_id = current_run().user_id
+    creds = await _get_creds("google_calendar")
+    conflicts: List[Dict[str, Any]] = []
+    start_at = _parse_iso(start_datetime)
+    if creds and start_at is not None:
+        end_at = _parse_iso(end_datetime) if end_datetime.strip() else start_at + timedelta(hours=1)
+        if end_at is not None and not await _sync_calendar(creds, until=end_at):
+            conflicts = await calendar_sync.find_conflicts(user_id, start_at, end_at)
+
+    rules = await _get_approval_rules()
+    requires = rules.get("create_calendar_event", False)
+    decision = True
+    if requires:
+        from agent.approval import request_approval
+        context = {"summary": summary, "start": start_datetime, "end": end_datetime}
+        if conflicts:
+            context["conflicts"] = conflicts
+        decision = await request_approval(
+            action_description=f"Create calendar event: {summary}"
+            + (f" (overlaps {len(conflicts)} event(s))" if conflicts else ""),
+            full_context=context,
+        )
+    status = "approved" if decision else ("rejected" if decision is False else "expired")
+    if decision:
+        if not creds:
+            await _log_action("create_calendar_event", {"summary": summary}, {"error": "Google Calendar not configured."}, requires, status if requires else None)
+            return "Google Calendar not configured."
+        from agent.integrations.google_calendar import create_event
+        end = end_datetime.strip() or None
+        result = await run_blocking("google_calendar", create_event, creds, summary, start_datetime, end, description)
+        try:
+            await calendar_sync.record_created(user_id, result["event"])
+        except Exception as exc:
+            log.warning("Could not store created event %s locally (next sync will): %s", result.get("id"), exc)
+        await _log_action(
+            "create_calendar_event",
+            {"summary": summary},
+            {"id": result.get("id"), "conflicts": [c["id"] for c in conflicts]},
+            requires,
+            status if requires else None,
+        )
+        message = f"Calendar event created: {result.get('htmlLink', result.get('id'))}"
+        if conflicts:
+            message += f"\nNote: it overlaps {json.dumps(conflicts)}"
+        return message
+    await _log_action("create_calendar_event", {"summary": summary}, {"created": False}, requires, status)
+    return f"Event not created — decision: {status}."
 
 
 @tool
-def create_notion_task(title: str, content: str = "") -> str:
+async def create_notion_task(title: str, content: str = "") -> str:
     """Create a task in the user's Notion database. May require approval."""
-    async def _impl():
-        rules = await _get_approval_rules()
-        requires = rules.get("create_notion_task", False)
-        decision = True
-        if requires:
-            from agent.approval import require_approval
-            decision = await require_approval(
-                run_id=_current_run_id,
-                action_description=f"Create Notion task: {title}",
-                full_context={"title": title, "content": content},
-            )
-        status = "approved" if decision else ("rejected" if decision is False else "expired")
-        if decision:
-            creds = await _get_creds("notion")
-            if not creds:
-                await _log_action("create_notion_task", {"title": title}, {"error": "Notion not configured."}, requires, status if requires else None)
-                return "Notion not configured."
-            from agent.integrations.notion import create_task
-            result = await create_task(creds, title, content)
-            await _log_action("create_notion_task", {"title": title}, {"page_id": result.get("id")}, requires, status if requires else None)
-            return f"Notion task created: {result.get('id')}"
-        await _log_action("create_notion_task", {"title": title}, {"created": False}, requires, status)
-        return f"Task not created — decision: {status}."
-    return _run(_impl())
+    rules = await _get_approval_rules()
+    requires = rules.get("create_notion_task", False)
+    decision = True
+    if requires:
+        from agent.approval import request_approval
+        decision = await request_approval(
+            action_description=f"Create Notion task: {title}",
+            full_context={"title": title, "content": content},
+        )
+    status = "approved" if decision else ("rejected" if decision is False else "expired")
+    if decision:
+        creds = await _get_creds("notion")
+        if not creds:
+            await _log_action("create_notion_task", {"title": title}, {"error": "Notion not configured."}, requires, status if requires else None)
+            return "Notion not configured."
+        from agent.integrations.notion import create_task
+        result = await create_task(creds, title, content)
+        await _log_action("create_notion_task", {"title": title}, {"page_id": result.get("id")}, requires, status if requires else None)
+        return f"Notion task created: {result.get('id')}"
+    await _log_action("create_notion_task", {"title": title}, {"created": False}, requires, status)
+    return f"Task not created — decision: {status}."
 
 
 @tool
-def log_to_hubspot(email: str, note: str, properties: str = "{}") -> str:
+async def log_to_hubspot(email: str, note: str, properties: str = "{}") -> str:
     """Create/update a HubSpot contact and log an activity note. May require approval."""
-    async def _impl():
-        rules = await _get_approval_rules()
-        requires = rules.get("log_to_hubspot", False)
-        decision = True
-        if requires:
-            from agent.approval import require_approval
-            decision = await require_approval(
-                run_id=_current_run_id,
-                action_description=f"Log to HubSpot: contact {email}",
-                full_context={"email": email, "note": note},
-            )
-        status = "approved" if decision else ("rejected" if decision is False else "expired")
-        if decision:
-            creds = await _get_creds("hubspot")
-            if not creds:
-                await _log_action("log_to_hubspot", {"email": email}, {"error": "HubSpot not configured."}, requires, status if requires else None)
-                return "HubSpot not configured."
-            props = json.loads(properties)
-            from agent.integrations.hubspot import log_note, upsert_contact
-            contact = await upsert_contact(creds, email, props)
-            contact_id = contact.get("id", "")
-            if contact_id:
-                await log_note(creds, contact_id, note)
-            await _log_action("log_to_hubspot", {"email": email, "note": note}, {"contact_id": contact_id}, requires, status if requires else None)
-            return f"HubSpot contact {email} updated, note logged."
-        await _log_action("log_to_hubspot", {"email": email}, {"logged": False}, requires, status)
-        return f"HubSpot not updated — decision: {status}."
-    return _run(_impl())
+    rules = await _get_approval_rules()
+    requires = rules.get("log_to_hubspot", False)
+    decision = True
+    if requires:
+        from agent.approval import request_approval
+        decision = await request_approval(
+            action_description=f"Log to HubSpot: contact {email}",
+            full_context={"email": email, "note": note},
+        )
+    status = "approved" if decision else ("rejected" if decision is False else "expired")
+    if decision:
+        creds = await _get_creds("hubspot")
+        if not creds:
+            await _log_action("log_to_hubspot", {"email": email}, {"error": "HubSpot not configured."}, requires, status if requires else None)
+            return "HubSpot not configured."
+        props = json.loads(properties)
+        from agent.integrations.hubspot import log_note, upsert_contact
+        contact = await upsert_contact(creds, email, props)
+        contact_id = contact.get("id", "")
+        if contact_id:
+            await log_note(creds, contact_id, note)
+        await _log_action("log_to_hubspot", {"email": email, "note": note}, {"contact_id": contact_id}, requires, status if requires else None)
+        return f"HubSpot contact {email} updated, note logged."
+    await _log_action("log_to_hubspot", {"email": email}, {"logged": False}, requires, status)
+    return f"HubSpot not updated — decision: {status}."
 
 
 @tool
-def send_telegram_message(text: str) -> str:
+async def send_telegram_message(text: str) -> str:
     """Send a message to the user's Telegram chat. No approval required."""
-    async def _impl():
-        creds = await _get_creds("telegram")
-        if not creds:
-            await _log_action("send_telegram_message", {"text": text[:100]}, {"error": "Telegram not configured."})
-            return "Telegram not configured."
-        from agent.integrations.telegram import send_message
-        await send_message(creds, text)
-        await _log_action("send_telegram_message", {"text": text[:100]}, {"sent": True})
-        return "Telegram message sent."
-    return _run(_impl())
+    creds = await _get_creds("telegram")
+    if not creds:
+        await _log_action("send_telegram_message", {"text": text[:100]}, {"error": "Telegram not configured."})
+        return "Telegram not configured."
+    from agent.integrations.telegram import send_message
+    await send_message(creds, text)
+    await _log_action("send_telegram_message", {"text": text[:100]}, {"sent": True})
+    return "Telegram message sent."
 
 
 ALL_TOOLS = [
     read_gmail,
+    read_email_body,
     send_email,
     read_calendar,
     create_calendar_event,
     search_web,
     read_webpage,
+    read_webpages,
     create_notion_task,
     log_to_hubspot,
     send_telegram_message,
@@ -18,6 +18,7 @@ from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
 
+from core import http_client
 from core.config import get_settings
 from backend.routers import agent, approvals, integrations, logs, stats
 from backend.ws.manager import ws_manager
@@ -37,6 +38,7 @@ async def lifespan(app: FastAPI):
     log.info("Toora backend started.")
     yield
     await ws_manager.stop()
+    await http_client.aclose()
     log.info("Toora backend stopped.")
 
 
@@ -7,19 +7,24 @@ from __future__ import annotations
 from fastapi import APIRouter, Body, Depends, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from backend.schemas import AgentConfigOut, AgentConfigUpdate, AgentRunRequest, AgentStatusOut
+from backend.schemas import (
+    AgentConfigOut,
+    AgentConfigUpdate,
+    AgentRunQueuedOut,
+    AgentRunRequest,
+    AgentStatusOut,
+)
 from backend.services import agent_svc
 from db.base import get_session
 
 router = APIRouter(prefix="/api/agent", tags=["agent"])
 
 
-@router.post("/run")
+@router.post("/run", response_model=AgentRunQueuedOut)
 async def run_agent(request: Request, body: AgentRunRequest | None = Body(default=None)):
     redis_url: str = request.app.state.redis_url
     user_input = body.input if body and body.input else None
-    await agent_svc.push_run_job(redis_url, user_input)
-    return {"message": "Agent job queued."}
+    return await agent_svc.push_run_job(redis_url, user_input)
 
 
 @router.get("/status", response_model=AgentStatusOut)
@@ -34,6 +39,6 @@ async def get_config(db: AsyncSession = Depends(get_session)):
 
 @router.put("/config", response_model=AgentConfigOut)
 async def update_config(
-    body: AgentConfigUpdate, db: AsyncSession = Depends(get_session)
+    request: Request, body: AgentConfigUpdate, db: AsyncSession = Depends(get_session)
 ):
-    return await agent_svc.update_config(db, body)
+    return await agent_svc.update_config(db, body, request.app.state.redis_url)
@@ -6,7 +6,7 @@ from __future__ import annotations
 
 from typing import List
 
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.schemas import CredentialSaveRequest, IntegrationOut, TestConnectionResult
@@ -25,14 +25,17 @@ async def list_integrations(db: AsyncSession = Depends(get_session)):
 async def save_credentials(
     platform: str,
     body: CredentialSaveRequest,
+    request: Request,
     db: AsyncSession = Depends(get_session),
 ):
-    return await integration_svc.save_credentials(db, platform, body.credentials)
+    return await integration_svc.save_credentials(
+        db, platform, body.credentials, request.app.state.redis_url
+    )
 
 
 @router.delete("/{platform}")
-async def disconnect(platform: str, db: AsyncSession = Depends(get_session)):
-    ok = await integration_svc.disconnect_platform(db, platform)
+async def disconnect(platform: str, request: Request, db: AsyncSession = Depends(get_session)):
+    ok = await integration_svc.disconnect_platform(db, platform, redis_url=request.app.state.redis_url)
     if not ok:
         raise HTTPException(status_code=404, detail="Integration not found.")
     return {"message": f"{platform} disconnected."}
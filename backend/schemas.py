@@ -72,6 +72,12 @@ class AgentRunRequest(BaseModel):
     input: Optional[str] = None
 
 
+class AgentRunQueuedOut(BaseModel):
+    message: str
+    run_id: int
+    deduplicated: bool = False  # True when attached to an equivalent in-flight run
+
+
 # ── Logs ──────────────────────────────────────────────────────────────────────
 
 class ActionLogOut(BaseModel):
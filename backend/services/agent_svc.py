@@ -4,35 +4,123 @@ backend/services/agent_svc.py — Business logic for agent control and configura
 
 from __future__ import annotations
 
+import asyncio
 import json
 import logging
-from typing import Optional
+from datetime import datetime, timezone
+from typing import Optional, Tuple
 
 import redis.asyncio as aioredis
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core import singleflight
+from core.queue import enqueue_job
+from core.schedule import set_user_schedule
+from db.base import session_context
 from db.models import AgentConfig, AgentRun
-from backend.schemas import AgentConfigOut, AgentConfigUpdate, AgentStatusOut
+from backend.schemas import AgentConfigOut, AgentConfigUpdate, AgentRunQueuedOut, AgentStatusOut
 
 log = logging.getLogger(__name__)
 
 DEFAULT_USER_ID = 1
-REDIS_JOB_QUEUE = "toora:agent_jobs"
 REDIS_STATUS_KEY = "toora:agent_status"
+# Workers drop cached compiled agents / LLM clients on this channel (agent/cache.py)
+REDIS_AGENT_CACHE_CHANNEL = "toora:agent_cache:invalidate"
+DEFAULT_RUN_INPUT = "Process my inbox and provide a daily briefing."
+
+
+async def _fail_unqueued_run(run_id: int) -> None:
+    try:
+        async with session_context() as db:
+            run = await db.get(AgentRun, run_id)
+            if run is not None and run.status == "queued":
+                run.status = "failed"
+                run.completed_at = datetime.now(tz=timezone.utc)
+                run.summary = "Could not be queued."
+    except Exception as exc:
+        log.error("Failed to mark unqueued run %d failed: %s", run_id, exc)
+
+
+async def enqueue_run(
+    r: aioredis.Redis,
+    user_id: int = DEFAULT_USER_ID,
+    triggered_by: str = "manual",
+    user_input: str | None = None,
+) -> Tuple[int, bool]:
+    """
+    Queue an agent run with per-user single-flight semantics.
+    If an equivalent run (same user + input) is already queued or running, attach
+    to it instead. Returns (run_id, deduplicated).
+    """
+    text = user_input or DEFAULT_RUN_INPUT
+    key = singleflight.inflight_key(user_id, text)
+
+    while not await singleflight.claim(r, key):
+        existing = await singleflight.current_run_id(r, key)
+        if existing is not None:
+            log.info("Run request attached to in-flight run %d.", existing)
+            return existing, True
+        # Another request holds the claim and is creating the run row
+        await asyncio.sleep(0.05)
+
+    run_id = None
+    try:
+        # Commit before enqueueing so the worker always finds the row
+        async with session_context() as db:
+            run = AgentRun(
+                user_id=user_id,
+                triggered_by=triggered_by,
+                triggered_at=datetime.now(tz=timezone.utc),
+                status="queued",
+            )
+            db.add(run)
+            await db.flush()
+            run_id = run.id
+        await singleflight.bind(r, key, run_id)
+        await enqueue_job(r, {
+            "run_id": run_id,
+            "user_id": user_id,
+            "triggered_by": triggered_by,
+            "input": text,
+        })
+    except Exception:
+        if run_id is not None:
+            # The job never reached the queue: don't leave a run (and a bound
+            # single-flight key) that duplicates would attach to
+            await _fail_unqueued_run(run_id)
+        try:
+            if run_id is not None:
+                await singleflight.release(r, run_id)
+            # Still holding the claim placeholder if bind didn't get that far
+            await r.delete(key)
+        except Exception as exc:
+            log.error("Failed to free in-flight key %s: %s", key, exc)
+        raise
+
+    log.info("Agent job for run %d pushed to Redis queue.", run_id)
+    return run_id, False
 
 
-async def push_run_job(redis_url: str, user_input: str | None = None) -> None:
-    """Push a manual agent run job onto the Redis queue."""
+async def push_run_job(redis_url: str, user_input: str | None = None) -> AgentRunQueuedOut:
+    """Queue a manual agent run (or attach to an identical one already in flight)."""
     r = aioredis.from_url(redis_url, decode_responses=True)
-    payload = json.dumps({
-        "user_id": DEFAULT_USER_ID,
-        "triggered_by": "manual",
-        "input": user_input or "Process my inbox and provide a daily briefing.",
-    })
-    await r.rpush(REDIS_JOB_QUEUE, payload)
-    await r.aclose()
-    log.info("Agent job pushed to Redis queue.")
+    try:
+        run_id, deduplicated = await enqueue_run(r, DEFAULT_USER_ID, "manual", user_input)
+    finally:
+        await r.aclose()
+    message = "Agent run already in progress." if deduplicated else "Agent job queued."
+    return AgentRunQueuedOut(message=message, run_id=run_id, deduplicated=deduplicated)
+
+
+async def notify_agent_cache(redis_url: str, reason: str) -> None:
+    """Tell workers their cached agents for this user may be stale."""
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await r.publish(REDIS_AGENT_CACHE_CHANNEL, json.dumps({"user_id": DEFAULT_USER_ID, "reason": reason}))
+        await r.aclose()
+    except Exception as exc:
+        log.error("Failed to publish agent cache invalidation: %s", exc)
 
 
 async def get_status(redis_url: str, db: AsyncSession) -> AgentStatusOut:
@@ -77,7 +165,9 @@ async def get_config(db: AsyncSession) -> AgentConfigOut:
     return AgentConfigOut.model_validate(cfg)
 
 
-async def update_config(db: AsyncSession, data: AgentConfigUpdate) -> AgentConfigOut:
+async def update_config(
+    db: AsyncSession, data: AgentConfigUpdate, redis_url: Optional[str] = None
+) -> AgentConfigOut:
     result = await db.execute(
         select(AgentConfig).where(AgentConfig.user_id == DEFAULT_USER_ID)
     )
@@ -88,6 +178,7 @@ async def update_config(db: AsyncSession, data: AgentConfigUpdate) -> AgentConfi
 
     if data.enabled_tools is not None:
         cfg.enabled_tools = data.enabled_tools
+    schedule_changed = data.schedule is not None and data.schedule != cfg.schedule
     if data.schedule is not None:
         cfg.schedule = data.schedule
     if data.system_prompt is not None:
@@ -99,4 +190,18 @@ async def update_config(db: AsyncSession, data: AgentConfigUpdate) -> AgentConfi
 
     await db.flush()
     await db.refresh(cfg)
+
+    if redis_url:
+        await notify_agent_cache(redis_url, "agent_config")
+
+    # Keep the scheduler's due-time zset in sync (only when the schedule changed,
+    # so editing the prompt doesn't push back the next run)
+    if redis_url and schedule_changed:
+        try:
+            r = aioredis.from_url(redis_url, decode_responses=True)
+            await set_user_schedule(r, DEFAULT_USER_ID, cfg.schedule)
+            await r.aclose()
+        except Exception as exc:
+            log.error("Failed to update schedule in Redis: %s", exc)
+
     return AgentConfigOut.model_validate(cfg)
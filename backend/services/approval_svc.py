@@ -1,6 +1,8 @@
 """
 backend/services/approval_svc.py — Approval resolution logic.
 Called by both the dashboard API and the Telegram bot handler.
+Runs blocked on the approval hear about it via Redis pub/sub; runs suspended on
+it (checkpointed, see agent/graph.py) get a resume job on the agent queue.
 """
 
 from __future__ import annotations
@@ -15,11 +17,13 @@ from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from backend.schemas import ApprovalOut
-from db.models import PendingApproval
+from core.queue import enqueue_job
+from db.models import AgentRun, PendingApproval
 
 log = logging.getLogger(__name__)
 
 REDIS_APPROVAL_CHANNEL_PREFIX = "toora:approvals:"
+REDIS_APPROVAL_EXPIRY_KEY = "toora:approval_expiry"
 
 
 async def list_approvals(
@@ -57,6 +61,17 @@ async def resolve(
             r = aioredis.from_url(redis_url, decode_responses=True)
             channel = f"{REDIS_APPROVAL_CHANNEL_PREFIX}{approval_id}"
             await r.publish(channel, json.dumps({"approved": approved}))
+            # Suspended run: claim the approval from the expiry sweep and resume it
+            if await r.zrem(REDIS_APPROVAL_EXPIRY_KEY, str(approval_id)) == 1:
+                run = await db.get(AgentRun, approval.run_id)
+                await enqueue_job(r, {
+                    "type": "resume",
+                    "run_id": approval.run_id,
+                    "user_id": run.user_id if run else 1,
+                    "approval_id": approval_id,
+                    "approved": approved,
+                })
+                log.info("Resume job queued for run %d.", approval.run_id)
             await r.aclose()
         except Exception as exc:
             log.error("Failed to publish approval decision to Redis: %s", exc)
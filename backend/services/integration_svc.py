@@ -10,12 +10,13 @@ import importlib
 import logging
 import os
 from datetime import datetime, timezone
-from typing import Dict, List
+from typing import Dict, List, Optional
 
 from fastapi import HTTPException
 from sqlalchemy import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.credentials import notify_invalidation
 from core.encryption import decrypt_dict, encrypt_dict
 from db.models import Integration
 
@@ -32,7 +33,7 @@ async def list_integrations(db: AsyncSession) -> List[Integration]:
 
 
 async def save_credentials(
-    db: AsyncSession, platform: str, credentials: Dict[str, str]
+    db: AsyncSession, platform: str, credentials: Dict[str, str], redis_url: Optional[str] = None
 ) -> Integration:
     """Encrypt and upsert credentials for a platform."""
     result = await db.execute(
@@ -76,6 +77,16 @@ async def save_credentials(
     await db.flush()
     await db.refresh(integration)
 
+    if redis_url:
+        # Commit first so other processes can't re-cache the old row in between
+        await db.commit()
+        await notify_invalidation(redis_url, DEFAULT_USER_ID, platform)
+
+    # New OpenRouter key → workers must rebuild their LLM clients
+    if platform == "openrouter" and redis_url:
+        from backend.services.agent_svc import notify_agent_cache
+        await notify_agent_cache(redis_url, "openrouter_credentials")
+
     # Auto-register Telegram webhook when connecting
     if platform == "telegram":
         webhook_url = os.environ.get("TELEGRAM_BOT_WEBHOOK_URL", "").strip()
@@ -93,7 +104,7 @@ async def save_credentials(
     return integration
 
 
-async def disconnect_platform(db: AsyncSession, platform: str) -> bool:
+async def disconnect_platform(db: AsyncSession, platform: str, redis_url: Optional[str] = None) -> bool:
     result = await db.execute(
         select(Integration).where(
             Integration.user_id == DEFAULT_USER_ID,
@@ -104,6 +115,9 @@ async def disconnect_platform(db: AsyncSession, platform: str) -> bool:
     if not integration:
         return False
     integration.status = "disconnected"
+    if redis_url:
+        await db.commit()
+        await notify_invalidation(redis_url, DEFAULT_USER_ID, platform)
     return True
 
 
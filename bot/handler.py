@@ -7,10 +7,9 @@ from __future__ import annotations
 
 import logging
 import os
-from typing import Any, Dict
-
-import httpx
+from typing import Any, Dict, Optional
 
+from core import http_client
 from core.config import get_settings
 from db.base import session_context
 from backend.services.approval_svc import resolve
@@ -19,6 +18,8 @@ log = logging.getLogger(__name__)
 
 BACKEND_URL = os.environ.get("BACKEND_URL", "https://toora-production.up.railway.app")
 
+DEFAULT_USER_ID = 1
+
 
 async def handle_message(message: Dict[str, Any]) -> None:
     """Process Telegram message updates (e.g. /start, /brief, /status)."""
@@ -41,8 +42,13 @@ async def handle_message(message: Dict[str, Any]) -> None:
         return
 
     if text == "/brief":
-        ok = await _trigger_agent_run()
-        reply = "🚀 Agent started! You'll get your briefing shortly." if ok else "⚠️ Could not start agent. Check the dashboard."
+        queued = await _trigger_agent_run()
+        if queued is None:
+            reply = "⚠️ Could not start agent. Check the dashboard."
+        elif queued.get("deduplicated"):
+            reply = f"⏳ A briefing is already on its way (run #{queued.get('run_id')})."
+        else:
+            reply = "🚀 Agent started! You'll get your briefing shortly."
         await _send_message(chat_id, reply)
         return
 
@@ -53,25 +59,25 @@ async def handle_message(message: Dict[str, Any]) -> None:
         return
 
 
-async def _trigger_agent_run() -> bool:
-    """POST to backend to queue an agent run."""
+async def _trigger_agent_run() -> Optional[Dict[str, Any]]:
+    """POST to backend to queue an agent run. Returns {run_id, deduplicated, ...} or None.
+    The backend attaches duplicate requests to the run already in flight."""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.post(f"{BACKEND_URL.rstrip('/')}/api/agent/run", json={})
-            return r.status_code == 200
+        r = await http_client.request("POST", f"{BACKEND_URL.rstrip('/')}/api/agent/run", json={}, timeout=10)
+        if r.status_code == 200:
+            return r.json()
     except Exception as exc:
         log.error("Failed to trigger agent run: %s", exc)
-        return False
+    return None
 
 
 async def _get_agent_status() -> str:
     """GET agent status from backend."""
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            r = await client.get(f"{BACKEND_URL.rstrip('/')}/api/agent/status")
-            if r.status_code == 200:
-                data = r.json()
-                return data.get("status", "unknown")
+        r = await http_client.request("GET", f"{BACKEND_URL.rstrip('/')}/api/agent/status", timeout=10)
+        if r.status_code == 200:
+            data = r.json()
+            return data.get("status", "unknown")
     except Exception as exc:
         log.error("Failed to get agent status: %s", exc)
     return "unknown"
@@ -79,11 +85,16 @@ async def _get_agent_status() -> str:
 
 async def handle_run_agent_callback(chat_id: int, callback_id: str) -> None:
     """Handle 'run_agent' callback - trigger job and answer."""
-    ok = await _trigger_agent_run()
-    text = "🚀 Started! Briefing on its way 📬" if ok else "⚠️ Could not start. Try the dashboard."
-    await _answer_callback(callback_id, text)
-    if ok:
-        await _send_message(chat_id, "Agent is running. You'll get your briefing in a moment.")
+    queued = await _trigger_agent_run()
+    if queued is None:
+        await _answer_callback(callback_id, "⚠️ Could not start. Try the dashboard.")
+        return
+    if queued.get("deduplicated"):
+        # Same run already queued/running — don't announce a second one
+        await _answer_callback(callback_id, "⏳ Already running — briefing on its way 📬")
+        return
+    await _answer_callback(callback_id, "🚀 Started! Briefing on its way 📬")
+    await _send_message(chat_id, "Agent is running. You'll get your briefing in a moment.")
 
 
 def _parse_callback_data(data: str) -> tuple[int, bool] | None:
@@ -141,22 +152,12 @@ async def handle_callback_query(callback_query: Dict[str, Any]) -> None:
 
 
 async def _get_telegram_bot_token() -> str:
-    """Read the Telegram bot token from the encrypted integrations DB row."""
+    """Telegram bot token from the shared credential cache (DB + decrypt only on a miss)."""
     try:
-        from sqlalchemy import select
-        from db.models import Integration
-        from core.encryption import decrypt_dict
-        async with session_context() as db:
-            result = await db.execute(
-                select(Integration).where(
-                    Integration.platform == "telegram",
-                    Integration.status == "connected",
-                )
-            )
-            row = result.scalar_one_or_none()
-            if row:
-                creds = decrypt_dict(row.encrypted_credentials)
-                return creds.get("bot_token", "")
+        from core.credentials import get_credentials
+        creds = await get_credentials(DEFAULT_USER_ID, "telegram")
+        if creds:
+            return creds.get("bot_token", "")
     except Exception as exc:
         log.error("Failed to load Telegram token from DB: %s", exc)
     return ""
@@ -169,8 +170,7 @@ async def _answer_callback(callback_query_id: str, text: str) -> None:
         return
     url = f"https://api.telegram.org/bot{tg_token}/answerCallbackQuery"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.post(url, json={"callback_query_id": callback_query_id, "text": text})
+        await http_client.request("POST", url, json={"callback_query_id": callback_query_id, "text": text}, timeout=10)
     except Exception as exc:
         log.error("Failed to answer Telegram callback: %s", exc)
 
@@ -182,7 +182,6 @@ async def _send_message(chat_id: int, text: str) -> None:
         return
     url = f"https://api.telegram.org/bot{tg_token}/sendMessage"
     try:
-        async with httpx.AsyncClient(timeout=10) as client:
-            await client.post(url, json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"})
+        await http_client.request("POST", url, json={"chat_id": chat_id, "text": text, "parse_mode": "Markdown"}, timeout=10)
     except Exception as exc:
         log.error("Failed to send Telegram message: %s", exc)
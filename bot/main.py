@@ -1,24 +1,43 @@
 """
 bot/main.py — FastAPI Telegram webhook listener.
 Receives updates from Telegram and dispatches callback_query and message events.
+Keeps the shared credential cache (core/credentials.py) in sync via Redis.
 """
 
 from __future__ import annotations
 
+import asyncio
 import logging
 import os
 import sys
+from contextlib import asynccontextmanager
 
 sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 from fastapi import FastAPI, Header, HTTPException, Request
 
 from bot.handler import handle_callback_query, handle_message
+from core import credentials, http_client
+from core.config import get_settings
 
 logging.basicConfig(level=logging.INFO)
 log = logging.getLogger(__name__)
 
-app = FastAPI(title="Toora Bot", version="2.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    settings = get_settings(required=["DATABASE_URL", "REDIS_URL", "ENCRYPTION_KEY"])
+    listener = asyncio.create_task(
+        credentials.listen_for_invalidation(settings.redis_url), name="credential-cache-invalidation"
+    )
+    log.info("Toora bot started.")
+    yield
+    listener.cancel()
+    await http_client.aclose()
+    log.info("Toora bot stopped.")
+
+
+app = FastAPI(title="Toora Bot", version="2.0.0", lifespan=lifespan)
 
 _WEBHOOK_SECRET = os.environ.get("TELEGRAM_WEBHOOK_SECRET", "")
 
@@ -0,0 +1,116 @@
+"""
+core/credentials.py — In-process cache of decrypted integration credentials.
+Keyed by (user_id, platform) with a TTL; memory only, never written anywhere.
+Hot paths (Telegram button presses, approval messages) skip both the DB query
+and the Fernet decrypt. integration_svc publishes on REDIS_CREDENTIALS_CHANNEL
+whenever a row changes, and every process running listen_for_invalidation drops
+the entry immediately; the TTL is only a safety net for missed messages.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+log = logging.getLogger(__name__)
+
+REDIS_CREDENTIALS_CHANNEL = "toora:credentials:invalidate"
+CREDENTIALS_CACHE_TTL_SECONDS = float(os.environ.get("CREDENTIALS_CACHE_TTL_SECONDS", "300"))
+
+# (user_id, platform) → (expires_at, creds or None when not connected)
+_cache: Dict[Tuple[int, str], Tuple[float, Optional[Dict[str, str]]]] = {}
+# Bumped by invalidate() (per key, or _epoch for wildcard invalidations). A load
+# only caches its result if neither changed while it ran, so a read that started
+# before a credential change can't re-cache the old value for a full TTL
+_generations: Dict[Tuple[int, str], int] = {}
+_epoch = 0
+
+
+async def _load(user_id: int, platform: str) -> Optional[Dict[str, str]]:
+    from sqlalchemy import select
+
+    from core.encryption import decrypt_dict
+    from db.base import session_context
+    from db.models import Integration
+
+    async with session_context() as db:
+        result = await db.execute(
+            select(Integration.encrypted_credentials).where(
+                Integration.user_id == user_id,
+                Integration.platform == platform,
+                Integration.status == "connected",
+            )
+        )
+        encrypted = result.scalar_one_or_none()
+    if encrypted is None:
+        return None
+    return decrypt_dict(encrypted)
+
+
+async def get_credentials(user_id: int, platform: str) -> Optional[Dict[str, str]]:
+    """Decrypted credentials for a connected platform (a copy), or None."""
+    key = (user_id, platform)
+    hit = _cache.get(key)
+    if hit is not None and hit[0] > time.monotonic():
+        return dict(hit[1]) if hit[1] is not None else None
+    generation = (_epoch, _generations.get(key, 0))
+    creds = await _load(user_id, platform)
+    if generation == (_epoch, _generations.get(key, 0)):
+        _cache[key] = (time.monotonic() + CREDENTIALS_CACHE_TTL_SECONDS, creds)
+    return dict(creds) if creds is not None else None
+
+
+def invalidate(user_id: Optional[int] = None, platform: Optional[str] = None) -> None:
+    """Drop matching entries; no arguments clears everything."""
+    global _epoch
+    if user_id is not None and platform is not None:
+        key = (user_id, platform)
+        _generations[key] = _generations.get(key, 0) + 1
+    else:
+        _epoch += 1
+    for key in list(_cache):
+        if (user_id is None or key[0] == user_id) and (platform is None or key[1] == platform):
+            _cache.pop(key, None)
+
+
+async def notify_invalidation(redis_url: str, user_id: int, platform: str) -> None:
+    """Tell every process (worker, bot, backend) that this row changed."""
+    import redis.asyncio as aioredis
+    invalidate(user_id, platform)
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await r.publish(REDIS_CREDENTIALS_CHANNEL, json.dumps({"user_id": user_id, "platform": platform}))
+        await r.aclose()
+    except Exception as exc:
+        log.warning("Failed to publish credential invalidation: %s", exc)
+
+
+async def listen_for_invalidation(redis_url: str) -> None:
+    """Long-running task: evict cached credentials when another process changes them."""
+    import redis.asyncio as aioredis
+    while True:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        pubsub = r.pubsub()
+        try:
+            await pubsub.subscribe(REDIS_CREDENTIALS_CHANNEL)
+            # Anything cached before we were subscribed may have missed a message
+            invalidate()
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    data = json.loads(message["data"])
+                    invalidate(data.get("user_id"), data.get("platform"))
+                except (TypeError, ValueError):
+                    invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            log.error("Credential cache listener error: %s — resubscribing in 5s", exc)
+            await asyncio.sleep(5)
+        finally:
+            await r.aclose()
@@ -0,0 +1,139 @@
+"""
+core/http_client.py — Process-wide httpx clients for integration APIs.
+One AsyncClient per origin (scheme://host:port), created on first use after the
+process starts (never before a worker fork) and kept for its lifetime, so calls
+to the same API reuse keep-alive connections instead of paying DNS + TLS each
+time. HTTP/2 is used when HTTP2_ENABLED=1 and the h2 package is installed.
+request() retries 429/503 and connection failures for any method, and other
+5xx responses or broken connections only for idempotent methods — a POST the
+server may already have acted on is never repeated. Waits honor Retry-After,
+otherwise back off exponentially with jitter. Call aclose() on shutdown.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Optional
+
+import httpx
+
+log = logging.getLogger(__name__)
+
+HTTP_TIMEOUT_SECONDS = float(os.environ.get("HTTP_TIMEOUT_SECONDS", "15"))
+HTTP_CONNECT_TIMEOUT_SECONDS = float(os.environ.get("HTTP_CONNECT_TIMEOUT_SECONDS", "5"))
+HTTP_MAX_CONNECTIONS_PER_HOST = int(os.environ.get("HTTP_MAX_CONNECTIONS_PER_HOST", "20"))
+HTTP_KEEPALIVE_SECONDS = float(os.environ.get("HTTP_KEEPALIVE_SECONDS", "60"))
+HTTP2_ENABLED = os.environ.get("HTTP2_ENABLED", "0") == "1"
+HTTP_MAX_RETRIES = int(os.environ.get("HTTP_MAX_RETRIES", "3"))
+HTTP_BACKOFF_BASE_SECONDS = 0.5
+# A Retry-After longer than this is returned to the caller instead of waited out
+HTTP_MAX_RETRY_DELAY_SECONDS = 30.0
+
+_ALWAYS_RETRY_STATUS = {429, 503}
+_IDEMPOTENT_RETRY_STATUS = {500, 502, 504}
+_IDEMPOTENT_METHODS = {"GET", "HEAD", "OPTIONS", "PUT", "DELETE"}
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+_http2: Optional[bool] = None
+
+
+def _use_http2() -> bool:
+    global _http2
+    if _http2 is None:
+        _http2 = HTTP2_ENABLED and importlib.util.find_spec("h2") is not None
+        if HTTP2_ENABLED and not _http2:
+            log.warning("HTTP2_ENABLED=1 but the h2 package is not installed; using HTTP/1.1.")
+    return _http2
+
+
+def get_client(url: str) -> httpx.AsyncClient:
+    """The shared client for url's origin."""
+    parsed = httpx.URL(url)
+    origin = f"{parsed.scheme}://{parsed.netloc.decode('ascii')}"
+    client = _clients.get(origin)
+    if client is None or client.is_closed:
+        client = _clients[origin] = httpx.AsyncClient(
+            timeout=httpx.Timeout(HTTP_TIMEOUT_SECONDS, connect=HTTP_CONNECT_TIMEOUT_SECONDS),
+            limits=httpx.Limits(
+                max_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+                max_keepalive_connections=HTTP_MAX_CONNECTIONS_PER_HOST,
+                keepalive_expiry=HTTP_KEEPALIVE_SECONDS,
+            ),
+            http2=_use_http2(),
+        )
+    return client
+
+
+def _retry_after(response: httpx.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if when.tzinfo is None:
+        when = when.replace(tzinfo=timezone.utc)
+    return max(0.0, (when - datetime.now(tz=timezone.utc)).total_seconds())
+
+
+def _backoff(attempt: int) -> float:
+    return min(HTTP_MAX_RETRY_DELAY_SECONDS, HTTP_BACKOFF_BASE_SECONDS * 2 ** attempt) * random.uniform(0.5, 1.5)
+
+
+async def request(method: str, url: str, *, retries: int = HTTP_MAX_RETRIES, **kwargs: Any) -> httpx.Response:
+    """
+    Send a request on the shared client for url's host, retrying transient failures.
+    kwargs go to httpx (headers, params, json, timeout, ...). Returns the final
+    response without raising for its status; transport errors propagate once
+    retries are exhausted.
+    """
+    method = method.upper()
+    idempotent = method in _IDEMPOTENT_METHODS
+    client = get_client(url)
+    attempt = 0
+    while True:
+        try:
+            response = await client.request(method, url, **kwargs)
+        except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as exc:
+            # Never reached the server
+            if attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            reason = str(exc) or type(exc).__name__
+        except httpx.TransportError as exc:
+            if not idempotent or attempt >= retries:
+                raise
+            delay = _backoff(attempt)
+            reason = str(exc) or type(exc).__name__
+        else:
+            status = response.status_code
+            retryable = status in _ALWAYS_RETRY_STATUS or (idempotent and status in _IDEMPOTENT_RETRY_STATUS)
+            if not retryable or attempt >= retries:
+                return response
+            wait = _retry_after(response)
+            if wait is not None and wait > HTTP_MAX_RETRY_DELAY_SECONDS:
+                return response
+            delay = wait if wait is not None else _backoff(attempt)
+            reason = f"HTTP {status}"
+            await response.aclose()
+        attempt += 1
+        log.warning("%s %s failed (%s); retry %d/%d in %.1fs", method, httpx.URL(url).host, reason, attempt, retries, delay)
+        await asyncio.sleep(delay)
+
+
+async def aclose() -> None:
+    """Close every shared client (service shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    await asyncio.gather(*(c.aclose() for c in clients), return_exceptions=True)
@@ -0,0 +1,240 @@
+"""
+core/queue.py — Agent job queue shared by the backend (producer) and workers (consumers).
+
+Two backends, selected with JOB_QUEUE_BACKEND:
+  • streams (default) — Redis Stream + consumer group. Jobs stay pending until a
+    worker acks them; entries idle longer than JOB_VISIBILITY_TIMEOUT_SECONDS
+    (i.e. their worker died) are reclaimed by another worker, and after
+    JOB_MAX_DELIVERIES attempts they are moved to a dead-letter stream.
+  • list — the original plain Redis list (RPUSH / BRPOP), no delivery guarantees.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import socket
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Optional
+
+import redis.asyncio as aioredis
+
+log = logging.getLogger(__name__)
+
+REDIS_JOB_QUEUE = "toora:agent_jobs"
+REDIS_JOB_STREAM = "toora:agent_jobs:stream"
+REDIS_JOB_DEAD_LETTER = "toora:agent_jobs:dead"
+REDIS_JOB_GROUP = "toora:workers"
+
+JOB_QUEUE_BACKEND = os.environ.get("JOB_QUEUE_BACKEND", "streams").strip().lower() or "streams"
+JOB_VISIBILITY_TIMEOUT_SECONDS = int(os.environ.get("JOB_VISIBILITY_TIMEOUT_SECONDS", "120"))
+JOB_MAX_DELIVERIES = int(os.environ.get("JOB_MAX_DELIVERIES", "3"))
+# Approximate cap on retained stream entries (acked entries are deleted anyway)
+STREAM_MAXLEN = 10_000
+
+# (job payload, reason) → None
+DeadLetterHandler = Callable[[Dict[str, Any], str], Awaitable[None]]
+
+
+@dataclass
+class Job:
+    payload: Dict[str, Any]
+    # Stream entry id; None for the list backend
+    entry_id: Optional[str] = None
+    deliveries: int = 1
+
+
+async def enqueue_job(r: aioredis.Redis, job: Dict[str, Any]) -> None:
+    """Push a job onto the configured queue backend."""
+    payload = json.dumps(job)
+    if JOB_QUEUE_BACKEND == "list":
+        await r.rpush(REDIS_JOB_QUEUE, payload)
+    else:
+        await r.xadd(REDIS_JOB_STREAM, {"job": payload}, maxlen=STREAM_MAXLEN, approximate=True)
+
+
+async def _notify_dead_letter(handler: Optional[DeadLetterHandler], payload: Dict[str, Any], reason: str) -> None:
+    if handler is None:
+        return
+    try:
+        await handler(payload, reason)
+    except Exception as exc:
+        log.error("Dead-letter handler failed for job %s: %s", payload, exc)
+
+
+def consumer_name() -> str:
+    """Unique, stable-for-process consumer name (host + pid)."""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class ListConsumer:
+    """BRPOP consumer for the legacy list backend. Ack is a no-op; a job that
+    raises is gone (nothing redelivers it), so it is reported as dead."""
+
+    def __init__(self, r: aioredis.Redis, on_dead_letter: Optional[DeadLetterHandler] = None) -> None:
+        self._r = r
+        self._on_dead_letter = on_dead_letter
+
+    async def setup(self) -> None:
+        return None
+
+    async def fetch(self, timeout: int = 30) -> Optional[Job]:
+        result = await self._r.brpop(REDIS_JOB_QUEUE, timeout=timeout)
+        if result is None:
+            return None
+        _, raw = result
+        return Job(payload=json.loads(raw))
+
+    @asynccontextmanager
+    async def lease(self, job: Job) -> AsyncIterator[Job]:
+        try:
+            yield job
+        except Exception as exc:
+            log.error("Job failed under the list backend and will not be retried: %s", exc)
+            await _notify_dead_letter(self._on_dead_letter, job.payload, f"job failed: {exc}")
+            raise
+
+    async def ack(self, job: Job) -> None:
+        return None
+
+
+class StreamConsumer:
+    """Consumer-group reader with ack, idle-entry reclaim and dead-lettering."""
+
+    def __init__(
+        self, r: aioredis.Redis, name: Optional[str] = None, on_dead_letter: Optional[DeadLetterHandler] = None
+    ) -> None:
+        self._r = r
+        self.name = name or consumer_name()
+        self._on_dead_letter = on_dead_letter
+        self._visibility_ms = JOB_VISIBILITY_TIMEOUT_SECONDS * 1000
+
+    async def setup(self) -> None:
+        try:
+            await self._r.xgroup_create(REDIS_JOB_STREAM, REDIS_JOB_GROUP, id="0", mkstream=True)
+            log.info("Created consumer group %s on %s", REDIS_JOB_GROUP, REDIS_JOB_STREAM)
+        except aioredis.ResponseError as exc:
+            if "BUSYGROUP" not in str(exc):
+                raise
+
+    async def fetch(self, timeout: int = 30) -> Optional[Job]:
+        """Return a reclaimed stale job if any, otherwise block for a new one."""
+        job = await self._reclaim()
+        if job is not None:
+            return job
+        resp = await self._r.xreadgroup(
+            REDIS_JOB_GROUP,
+            self.name,
+            streams={REDIS_JOB_STREAM: ">"},
+            count=1,
+            block=timeout * 1000,
+        )
+        if not resp:
+            return None
+        _, entries = resp[0]
+        if not entries:
+            return None
+        entry_id, fields = entries[0]
+        return await self._to_job(entry_id, fields, deliveries=1)
+
+    async def _reclaim(self) -> Optional[Job]:
+        """Claim one entry whose consumer stopped heart-beating; dead-letter it past the retry limit."""
+        while True:
+            resp = await self._r.xautoclaim(
+                REDIS_JOB_STREAM,
+                REDIS_JOB_GROUP,
+                self.name,
+                min_idle_time=self._visibility_ms,
+                start_id="0-0",
+                count=1,
+            )
+            claimed = resp[1] if resp and len(resp) > 1 else []
+            if not claimed:
+                return None
+            entry_id, fields = claimed[0]
+            if fields is None:
+                # Entry was deleted from the stream while pending
+                await self._r.xack(REDIS_JOB_STREAM, REDIS_JOB_GROUP, entry_id)
+                continue
+            pending = await self._r.xpending_range(
+                REDIS_JOB_STREAM, REDIS_JOB_GROUP, min=entry_id, max=entry_id, count=1
+            )
+            deliveries = pending[0]["times_delivered"] if pending else 1
+            if deliveries > JOB_MAX_DELIVERIES:
+                await self._dead_letter(entry_id, fields, deliveries)
+                continue
+            log.warning("Reclaimed stale job %s (delivery %d/%d)", entry_id, deliveries, JOB_MAX_DELIVERIES)
+            return await self._to_job(entry_id, fields, deliveries)
+
+    async def _to_job(self, entry_id: str, fields: Dict[str, str], deliveries: int) -> Optional[Job]:
+        try:
+            payload = json.loads(fields["job"])
+        except Exception as exc:
+            await self._dead_letter(entry_id, fields, deliveries, f"malformed job: {exc}")
+            return None
+        return Job(payload=payload, entry_id=entry_id, deliveries=deliveries)
+
+    async def _dead_letter(
+        self, entry_id: str, fields: Dict[str, str], deliveries: int, reason: str = "max deliveries exceeded"
+    ) -> None:
+        log.error("Dead-lettering job %s after %d deliveries: %s", entry_id, deliveries, reason)
+        await self._r.xadd(
+            REDIS_JOB_DEAD_LETTER,
+            {"job": fields.get("job", ""), "entry_id": entry_id, "deliveries": deliveries, "reason": reason},
+            maxlen=STREAM_MAXLEN,
+            approximate=True,
+        )
+        await self._r.xack(REDIS_JOB_STREAM, REDIS_JOB_GROUP, entry_id)
+        await self._r.xdel(REDIS_JOB_STREAM, entry_id)
+        try:
+            payload = json.loads(fields.get("job", ""))
+        except Exception:
+            return
+        if isinstance(payload, dict):
+            await _notify_dead_letter(self._on_dead_letter, payload, reason)
+
+    @asynccontextmanager
+    async def lease(self, job: Job) -> AsyncIterator[Job]:
+        """Keep the entry's idle time low while the job runs so it isn't reclaimed."""
+        if job.entry_id is None:
+            yield job
+            return
+
+        async def _heartbeat() -> None:
+            interval = max(1.0, JOB_VISIBILITY_TIMEOUT_SECONDS / 3)
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    await self._r.xclaim(
+                        REDIS_JOB_STREAM,
+                        REDIS_JOB_GROUP,
+                        self.name,
+                        min_idle_time=0,
+                        message_ids=[job.entry_id],
+                        justid=True,
+                    )
+                except Exception as exc:
+                    log.warning("Heartbeat for job %s failed: %s", job.entry_id, exc)
+
+        task = asyncio.create_task(_heartbeat())
+        try:
+            yield job
+        finally:
+            task.cancel()
+
+    async def ack(self, job: Job) -> None:
+        if job.entry_id is None:
+            return
+        await self._r.xack(REDIS_JOB_STREAM, REDIS_JOB_GROUP, job.entry_id)
+        await self._r.xdel(REDIS_JOB_STREAM, job.entry_id)
+
+
+def make_consumer(
+    r: aioredis.Redis, on_dead_letter: Optional[DeadLetterHandler] = None
+) -> ListConsumer | StreamConsumer:
+    if JOB_QUEUE_BACKEND == "list":
+        return ListConsumer(r, on_dead_letter=on_dead_letter)
+    return StreamConsumer(r, on_dead_letter=on_dead_letter)
@@ -0,0 +1,42 @@
+"""
+core/schedule.py — Redis sorted set of scheduled agent runs (AgentConfig.schedule).
+Member = user_id, score = unix time the next run is due. The backend updates it
+when a schedule changes; worker/scheduler.py pops due members and enqueues jobs.
+"""
+
+from __future__ import annotations
+
+import random
+import time
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+REDIS_SCHEDULE_KEY = "toora:schedule"
+
+# AgentConfig.schedule → interval in seconds ("manual" is absent = not scheduled)
+SCHEDULE_INTERVALS = {
+    "30min": 30 * 60,
+    "1hour": 60 * 60,
+    "4hours": 4 * 60 * 60,
+}
+# Spread due times by ±5% of the interval so users don't fire in lockstep
+JITTER_FRACTION = 0.05
+
+
+def next_due(schedule: str, now: Optional[float] = None) -> Optional[float]:
+    """Unix time of the next run for schedule, with jitter; None for manual/unknown."""
+    interval = SCHEDULE_INTERVALS.get(schedule)
+    if interval is None:
+        return None
+    now = time.time() if now is None else now
+    return now + interval + random.uniform(-JITTER_FRACTION, JITTER_FRACTION) * interval
+
+
+async def set_user_schedule(r: aioredis.Redis, user_id: int, schedule: str, keep_existing: bool = False) -> None:
+    """Add, move or remove a user's entry. keep_existing=True leaves a pending due time untouched."""
+    due = next_due(schedule)
+    if due is None:
+        await r.zrem(REDIS_SCHEDULE_KEY, str(user_id))
+        return
+    await r.zadd(REDIS_SCHEDULE_KEY, {str(user_id): due}, nx=keep_existing)
@@ -0,0 +1,62 @@
+"""
+core/singleflight.py — Per-user single-flight bookkeeping for agent runs.
+toora:inflight:<user>:<hash(input)> holds the run_id of the queued/running run for
+that request, so duplicate requests (double taps, /brief spam, scheduled ticks)
+attach to it instead of enqueueing another identical run. The worker releases
+the key when the run completes or fails.
+"""
+
+from __future__ import annotations
+
+import hashlib
+from typing import Optional
+
+import redis.asyncio as aioredis
+
+REDIS_INFLIGHT_PREFIX = "toora:inflight:"
+# Reverse index run_id → inflight key, so the worker can release by run id alone
+REDIS_INFLIGHT_RUN_PREFIX = "toora:inflight_run:"
+# Placeholder value while the claimer creates the AgentRun row
+CLAIM_PLACEHOLDER = "0"
+CLAIM_TTL_SECONDS = 30
+# Safety net if a worker dies without releasing (covers long runs + approval waits)
+INFLIGHT_TTL_SECONDS = 2 * 60 * 60
+
+# KEYS[1] = reverse index key; ARGV[1] = run_id
+_RELEASE = """
+local key = redis.call('GET', KEYS[1])
+if key then
+  if redis.call('GET', key) == ARGV[1] then redis.call('DEL', key) end
+  redis.call('DEL', KEYS[1])
+end
+return key
+"""
+
+
+def inflight_key(user_id: int, user_input: str) -> str:
+    """Equivalent requests = same user + same (whitespace/case-normalised) input."""
+    normalised = " ".join(user_input.split()).lower()
+    digest = hashlib.sha1(normalised.encode("utf-8")).hexdigest()[:16]
+    return f"{REDIS_INFLIGHT_PREFIX}{user_id}:{digest}"
+
+
+async def current_run_id(r: aioredis.Redis, key: str) -> Optional[int]:
+    """run_id attached to key, or None if free or still being claimed."""
+    value = await r.get(key)
+    if value is None or value == CLAIM_PLACEHOLDER:
+        return None
+    return int(value)
+
+
+async def claim(r: aioredis.Redis, key: str) -> bool:
+    return bool(await r.set(key, CLAIM_PLACEHOLDER, nx=True, ex=CLAIM_TTL_SECONDS))
+
+
+async def bind(r: aioredis.Redis, key: str, run_id: int) -> None:
+    await r.set(key, str(run_id), ex=INFLIGHT_TTL_SECONDS)
+    await r.set(f"{REDIS_INFLIGHT_RUN_PREFIX}{run_id}", key, ex=INFLIGHT_TTL_SECONDS)
+
+
+async def release(r: aioredis.Redis, run_id: int) -> None:
+    """Free the run's inflight key (only if it still points at this run)."""
+    await r.eval(_RELEASE, 1, f"{REDIS_INFLIGHT_RUN_PREFIX}{run_id}", str(run_id))
@@ -0,0 +1,45 @@
+"""add mail_sync_state (IMAP UID watermarks)
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17
+
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+from sqlalchemy.dialects import postgresql
+
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "mail_sync_state",
+        sa.Column("id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("account", sa.String(255), nullable=False),
+        sa.Column("mailbox", sa.String(255), nullable=False, server_default="INBOX"),
+        sa.Column("uid_validity", sa.BigInteger(), nullable=False),
+        sa.Column("last_uid", sa.BigInteger(), nullable=False),
+        sa.Column("highest_modseq", sa.BigInteger(), nullable=True),
+        sa.Column("pending", postgresql.JSONB(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.UniqueConstraint("user_id", "account", "mailbox"),
+    )
+    op.create_index("ix_mail_sync_state_id", "mail_sync_state", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("mail_sync_state")
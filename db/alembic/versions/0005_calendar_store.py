@@ -0,0 +1,61 @@
+"""add calendar_events and calendar_sync_state (local calendar store)
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17
+
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0005"
+down_revision: Union[str, None] = "0004"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "calendar_events",
+        sa.Column("id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("calendar_id", sa.String(255), nullable=False, server_default="primary"),
+        sa.Column("event_id", sa.String(255), nullable=False),
+        sa.Column("summary", sa.Text(), nullable=False, server_default=""),
+        sa.Column("start_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("end_at", sa.DateTime(timezone=True), nullable=False),
+        sa.Column("all_day", sa.Boolean(), nullable=False, server_default="false"),
+        sa.Column("organizer", sa.String(320), nullable=True),
+        sa.Column("availability", sa.String(10), nullable=False, server_default="busy"),
+        sa.Column("html_link", sa.Text(), nullable=True),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.UniqueConstraint("user_id", "calendar_id", "event_id"),
+    )
+    op.create_index("ix_calendar_events_id", "calendar_events", ["id"])
+    op.create_index("ix_calendar_events_user_start", "calendar_events", ["user_id", "start_at"])
+
+    op.create_table(
+        "calendar_sync_state",
+        sa.Column("id", sa.Integer(), primary_key=True, nullable=False),
+        sa.Column("user_id", sa.Integer(), sa.ForeignKey("users.id"), nullable=False),
+        sa.Column("calendar_id", sa.String(255), nullable=False, server_default="primary"),
+        sa.Column("account", sa.String(64), nullable=False),
+        sa.Column("sync_token", sa.Text(), nullable=True),
+        sa.Column("synced_at", sa.DateTime(timezone=True), nullable=True),
+        sa.UniqueConstraint("user_id", "calendar_id"),
+    )
+    op.create_index("ix_calendar_sync_state_id", "calendar_sync_state", ["id"])
+
+
+def downgrade() -> None:
+    op.drop_table("calendar_sync_state")
+    op.drop_table("calendar_events")
@@ -0,0 +1,38 @@
+"""key mail_sync_state.pending by run id
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17
+
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+from alembic import op
+
+revision: str = "0006"
+down_revision: Union[str, None] = "0005"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # {"run_id": 7, ...watermark} → {"7": {...watermark}}
+    op.execute(
+        "UPDATE mail_sync_state "
+        "SET pending = jsonb_build_object(pending->>'run_id', pending - 'run_id') "
+        "WHERE pending ? 'run_id'"
+    )
+
+
+def downgrade() -> None:
+    # Keeps only the newest staged run per mailbox (the old single slot)
+    op.execute(
+        "UPDATE mail_sync_state s "
+        "SET pending = ("
+        "  SELECT p.value || jsonb_build_object('run_id', p.key::int) "
+        "  FROM jsonb_each(s.pending) p ORDER BY p.key::int DESC LIMIT 1"
+        ") "
+        "WHERE pending IS NOT NULL"
+    )
@@ -0,0 +1,27 @@
+"""add calendar_sync_state.synced_until (full-sync horizon)
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-17
+
+"""
+from __future__ import annotations
+
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+revision: str = "0007"
+down_revision: Union[str, None] = "0006"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # NULL: existing stores re-run a full (bounded) sync on next use
+    op.add_column("calendar_sync_state", sa.Column("synced_until", sa.DateTime(timezone=True), nullable=True))
+
+
+def downgrade() -> None:
+    op.drop_column("calendar_sync_state", "synced_until")
@@ -1,5 +1,5 @@
 """
-db/models.py — SQLAlchemy ORM models for all six Toora tables.
+db/models.py — SQLAlchemy ORM models for all Toora tables.
 All credential data is stored encrypted (bytes) in the integrations table.
 """
 
@@ -9,12 +9,16 @@ from datetime import datetime
 from typing import Any, Dict, Optional
 
 from sqlalchemy import (
+    BigInteger,
+    Boolean,
     DateTime,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
     Text,
+    UniqueConstraint,
     func,
 )
 from sqlalchemy.dialects.postgresql import JSONB
@@ -73,7 +77,7 @@ class AgentRun(Base):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
     triggered_by: Mapped[str] = mapped_column(
         String(50), nullable=False, default="manual"
-    )  # manual | schedule | telegram
+    )  # manual | schedule | telegram | gmail_push
     triggered_at: Mapped[datetime] = mapped_column(
         DateTime(timezone=True), server_default=func.now(), nullable=False
     )
@@ -82,7 +86,7 @@ class AgentRun(Base):
     )
     status: Mapped[str] = mapped_column(
         String(20), nullable=False, default="running"
-    )  # running | completed | failed | cancelled
+    )  # queued | running | waiting_for_approval | completed | failed | cancelled
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
     user: Mapped["User"] = relationship("User", back_populates="agent_runs")
@@ -167,3 +171,101 @@ class AgentConfig(Base):
     )
 
     user: Mapped["User"] = relationship("User", back_populates="agent_config")
+
+
+# ── Mail Sync State ───────────────────────────────────────────────────────────
+
+class MailSyncState(Base):
+    """Per-account IMAP watermark: runs only fetch messages above last_uid."""
+
+    __tablename__ = "mail_sync_state"
+    __table_args__ = (UniqueConstraint("user_id", "account", "mailbox"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    account: Mapped[str] = mapped_column(String(255), nullable=False)
+    mailbox: Mapped[str] = mapped_column(String(255), nullable=False, default="INBOX")
+    uid_validity: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    last_uid: Mapped[int] = mapped_column(BigInteger, nullable=False)
+    highest_modseq: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    # Watermarks read by unfinished runs: {"<run_id>": {"uid_validity", "last_uid", "highest_modseq"}}
+    # — each promoted to the columns above only when its run completes
+    pending: Mapped[Optional[Dict[str, Any]]] = mapped_column(JSONB, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+# ── Outbox ────────────────────────────────────────────────────────────────────
+
+class OutboxMessage(Base):
+    """Approved outgoing email, delivered asynchronously by agent/outbox.py."""
+
+    __tablename__ = "outbox_messages"
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    run_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("agent_runs.id"), nullable=False, index=True
+    )
+    to_address: Mapped[str] = mapped_column(String(320), nullable=False)
+    subject: Mapped[str] = mapped_column(Text, nullable=False)
+    body: Mapped[str] = mapped_column(Text, nullable=False)
+    status: Mapped[str] = mapped_column(
+        String(20), nullable=False, default="queued"
+    )  # queued | sending | sent | failed
+    attempts: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    next_attempt_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    created_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), nullable=False
+    )
+    sent_at: Mapped[Optional[datetime]] = mapped_column(
+        DateTime(timezone=True), nullable=True
+    )
+
+
+# ── Calendar Store ────────────────────────────────────────────────────────────
+
+class CalendarEvent(Base):
+    """Local copy of a Google Calendar event, kept current by agent/calendar_sync.py."""
+
+    __tablename__ = "calendar_events"
+    __table_args__ = (
+        UniqueConstraint("user_id", "calendar_id", "event_id"),
+        Index("ix_calendar_events_user_start", "user_id", "start_at"),
+    )
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    calendar_id: Mapped[str] = mapped_column(String(255), nullable=False, default="primary")
+    event_id: Mapped[str] = mapped_column(String(255), nullable=False)
+    summary: Mapped[str] = mapped_column(Text, nullable=False, default="")
+    start_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    end_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False)
+    all_day: Mapped[bool] = mapped_column(Boolean, nullable=False, default=False)
+    organizer: Mapped[Optional[str]] = mapped_column(String(320), nullable=True)
+    # busy | free (Google "transparency")
+    availability: Mapped[str] = mapped_column(String(10), nullable=False, default="busy")
+    html_link: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    updated_at: Mapped[datetime] = mapped_column(
+        DateTime(timezone=True), server_default=func.now(), onupdate=func.now(), nullable=False
+    )
+
+
+class CalendarSyncState(Base):
+    """Google syncToken per calendar; None means the next sync is a full one."""
+
+    __tablename__ = "calendar_sync_state"
+    __table_args__ = (UniqueConstraint("user_id", "calendar_id"),)
+
+    id: Mapped[int] = mapped_column(Integer, primary_key=True, index=True)
+    user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id"), nullable=False)
+    calendar_id: Mapped[str] = mapped_column(String(255), nullable=False, default="primary")
+    account: Mapped[str] = mapped_column(String(64), nullable=False)
+    sync_token: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    synced_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    # timeMax of the last full sync: events starting later were never listed
+    synced_until: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
@@ -9,12 +9,14 @@ import {
 import { Loader2, Save } from "lucide-react";
 
 const TOOLS: { key: string; label: string; description: string }[] = [
-  { key: "read_gmail", label: "Read Gmail", description: "Read unread emails from inbox" },
+  { key: "read_gmail", label: "Read Gmail", description: "Read new emails from inbox" },
+  { key: "read_email_body", label: "Read Email Body", description: "Open the full text of a single email" },
   { key: "send_email", label: "Send Email", description: "Draft and send emails (always requires approval)" },
   { key: "read_calendar", label: "Read Calendar", description: "Fetch upcoming Google Calendar events" },
   { key: "create_calendar_event", label: "Create Calendar Event", description: "Add events to Google Calendar" },
   { key: "search_web", label: "Search Web", description: "DuckDuckGo search queries" },
   { key: "read_webpage", label: "Read Webpage", description: "Extract clean text from a URL" },
+  { key: "read_webpages", label: "Read Webpages", description: "Extract text from several URLs at once" },
   { key: "create_notion_task", label: "Create Notion Task", description: "Create tasks in Notion database" },
   { key: "log_to_hubspot", label: "Log to HubSpot", description: "Create contacts and log activity notes" },
   { key: "send_telegram_message", label: "Send Telegram Message", description: "Send messages to your Telegram" },
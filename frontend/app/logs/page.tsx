@@ -18,9 +18,12 @@ import {
 
 const TOOLS = [
   "read_gmail",
+  "read_email_body",
   "send_email",
+  "send_email_delivery",
   "search_web",
   "read_webpage",
+  "read_webpages",
   "create_notion_task",
   "log_to_hubspot",
   "send_telegram_message",
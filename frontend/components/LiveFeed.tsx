@@ -11,6 +11,12 @@ interface FeedItem {
   time: Date;
 }
 
+type StreamEvent = {
+  kind: "token" | "tool_call" | "tool_result";
+  text?: string;
+  tool?: string;
+};
+
 let _id = 0;
 
 export function LiveFeed() {
@@ -18,6 +24,11 @@ export function LiveFeed() {
   const bottomRef = useRef<HTMLDivElement>(null);
 
   useAgentWebSocket((msg: WsMessage) => {
+    if (msg.type === "agent_stream") {
+      const d = msg.data as { events?: StreamEvent[] } | undefined;
+      setItems((prev) => applyStreamEvents(prev, d?.events ?? []));
+      return;
+    }
     const text = summariseMessage(msg);
     if (!text) return;
     setItems((prev) => [
@@ -56,6 +67,28 @@ export function LiveFeed() {
   );
 }
 
+/** Fold a batched stream frame into the feed; consecutive tokens grow one "thinking" line. */
+function applyStreamEvents(prev: FeedItem[], events: StreamEvent[]): FeedItem[] {
+  let items = prev;
+  for (const ev of events) {
+    if (ev.kind === "token") {
+      const [head, ...rest] = items;
+      if (head?.type === "thinking") {
+        items = [{ ...head, text: (head.text + (ev.text ?? "")).slice(-500), time: new Date() }, ...rest];
+      } else {
+        items = [
+          { id: _id++, type: "thinking", text: ev.text ?? "", time: new Date() },
+          ...items.slice(0, 49),
+        ];
+      }
+      continue;
+    }
+    const text = summariseMessage({ type: ev.kind, data: ev });
+    items = [{ id: _id++, type: ev.kind, text, time: new Date() }, ...items.slice(0, 49)];
+  }
+  return items;
+}
+
 function summariseMessage(msg: WsMessage): string {
   const d = msg.data as Record<string, unknown> | undefined;
   switch (msg.type) {
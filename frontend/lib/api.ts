@@ -113,7 +113,7 @@ export const registerTelegramWebhook = () =>
 // ── Agent ─────────────────────────────────────────────────────────────────────
 
 export const runAgent = (input?: string) =>
-  apiFetch<{ message: string }>("/api/agent/run", {
+  apiFetch<{ message: string; run_id: number; deduplicated: boolean }>("/api/agent/run", {
     method: "POST",
     body: JSON.stringify(input ? { input } : {}),
   });
@@ -0,0 +1,59 @@
+"""
+tests/test_watcher_idle.py — IDLE loop against a scripted server on a socketpair.
+"""
+
+from __future__ import annotations
+
+import socket
+import threading
+import time
+
+import pytest
+
+from watcher import idle
+
+
+class _FakeIMAP:
+    """The parts of imaplib.IMAP4 that idle_once uses, over a plain socket."""
+
+    def __init__(self, sock: socket.socket) -> None:
+        self.sock = sock
+        self.file = sock.makefile("rb")
+
+    def _new_tag(self) -> bytes:
+        return b"A001"
+
+    def send(self, data: bytes) -> None:
+        self.sock.sendall(data)
+
+    def readline(self) -> bytes:
+        return self.file.readline()
+
+
+def _serve(server: socket.socket) -> None:
+    reader = server.makefile("rb")
+    assert reader.readline() == b"A001 IDLE\r\n"
+    # Continuation and the new-mail response in one chunk
+    server.sendall(b"+ idling\r\n* 3 EXISTS\r\n")
+    assert reader.readline() == b"DONE\r\n"
+    server.sendall(b"A001 OK IDLE terminated\r\n")
+
+
+def test_exists_in_same_chunk_as_continuation(monkeypatch: pytest.MonkeyPatch) -> None:
+    # Without the buffer check the EXISTS sits unread until the IDLE renews
+    monkeypatch.setattr(idle, "IDLE_RENEW_SECONDS", 3)
+    monkeypatch.setattr(idle, "IDLE_POLL_SECONDS", 0.1)
+    client, server = socket.socketpair()
+    client.settimeout(5)
+    server.settimeout(5)
+    thread = threading.Thread(target=_serve, args=(server,), daemon=True)
+    thread.start()
+    try:
+        started = time.monotonic()
+        assert idle.idle_once(_FakeIMAP(client), threading.Event()) is True
+        assert time.monotonic() - started < 1
+        thread.join(timeout=5)
+        assert not thread.is_alive()
+    finally:
+        client.close()
+        server.close()
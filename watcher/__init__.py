@@ -0,0 +1 @@
+# watcher package
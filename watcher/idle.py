@@ -0,0 +1,128 @@
+"""
+watcher/idle.py — Blocking IMAP IDLE loop for one Gmail account (runs in a thread).
+imaplib on Python 3.12 has no IDLE support, so the command is driven by hand
+with the connection's own tag counter. The socket is polled with select() so the
+thread notices stop requests within IDLE_POLL_SECONDS — after checking
+imaplib's read buffer, which may already hold a response that arrived in the
+same packet as the IDLE continuation. Any untagged response ends the IDLE
+(DONE + tagged OK). IDLE is re-issued every IDLE_RENEW_SECONDS, well inside Gmail's
+timeout, and the session reconnects with backoff when the server drops it.
+The socket times out after IDLE_REPLY_TIMEOUT_SECONDS, so a reply that never
+comes (a half-open connection after DONE) counts as a dropped session and the
+thread keeps honouring stop.
+"""
+
+from __future__ import annotations
+
+import imaplib
+import logging
+import select
+import socket
+import ssl
+import threading
+import time
+from typing import Callable, Dict
+
+from agent.integrations.gmail import _imap_connect
+
+log = logging.getLogger(__name__)
+
+IDLE_RENEW_SECONDS = 9 * 60
+IDLE_POLL_SECONDS = 5
+# Socket timeout for the session; longer than IDLE_POLL_SECONDS so the IDLE wait
+# (which polls with select) never trips it
+IDLE_REPLY_TIMEOUT_SECONDS = 20
+RECONNECT_BACKOFF_SECONDS = (5, 15, 60, 300)
+
+
+def _buffered(imap: imaplib.IMAP4_SSL) -> bool:
+    """True if a readline() can start without touching the network."""
+    sock = imap.sock
+    timeout = sock.gettimeout()
+    # Non-blocking, so peek() returns what imaplib's reader (or the SSL layer)
+    # already holds instead of waiting for more
+    sock.settimeout(0)
+    try:
+        return bool(imap.file.peek(1))
+    except (BlockingIOError, ssl.SSLWantReadError):
+        return False
+    finally:
+        sock.settimeout(timeout)
+
+
+def _readable(imap: imaplib.IMAP4_SSL, timeout: float) -> bool:
+    if _buffered(imap):
+        return True
+    ready, _, _ = select.select([imap.sock], [], [], timeout)
+    return bool(ready)
+
+
+def _reply_line(imap: imaplib.IMAP4_SSL, context: str) -> bytes:
+    # Bounded by the socket timeout, not select(): the reply may already sit in imaplib's read buffer
+    try:
+        line = imap.readline()
+    except socket.timeout as exc:
+        raise imaplib.IMAP4.abort(f"no reply {context} within {IDLE_REPLY_TIMEOUT_SECONDS}s") from exc
+    if not line:
+        raise imaplib.IMAP4.abort(f"connection closed {context}")
+    return line
+
+
+def idle_once(imap: imaplib.IMAP4_SSL, stop: threading.Event) -> bool:
+    """One IDLE cycle; True if the server announced new messages (EXISTS)."""
+    tag = imap._new_tag()
+    imap.send(tag + b" IDLE\r\n")
+    line = _reply_line(imap, "to IDLE")
+    if not line.startswith(b"+"):
+        raise imaplib.IMAP4.error(f"IDLE rejected: {line!r}")
+
+    arrived = False
+    deadline = time.monotonic() + IDLE_RENEW_SECONDS
+    while not stop.is_set() and time.monotonic() < deadline:
+        if not _readable(imap, IDLE_POLL_SECONDS):
+            continue
+        line = imap.readline()
+        if not line:
+            raise imaplib.IMAP4.abort("connection closed during IDLE")
+        arrived = line.rstrip().upper().endswith(b"EXISTS")
+        break
+
+    imap.send(b"DONE\r\n")
+    while True:
+        line = _reply_line(imap, "after DONE")
+        if line.startswith(tag):
+            if b" OK" not in line[len(tag):len(tag) + 4]:
+                raise imaplib.IMAP4.error(f"IDLE failed: {line!r}")
+            return arrived
+        arrived = arrived or line.rstrip().upper().endswith(b"EXISTS")
+
+
+def watch_account(account: str, creds: Dict[str, str], on_new_mail: Callable[[], None], stop: threading.Event) -> None:
+    """Thread body: keep an IDLE session on INBOX until stop is set."""
+    failures = 0
+    while not stop.is_set():
+        imap = None
+        try:
+            imap = _imap_connect(creds)
+            imap.sock.settimeout(IDLE_REPLY_TIMEOUT_SECONDS)
+            imap.select("INBOX", readonly=True)
+            if "IDLE" not in imap.capabilities:
+                log.error("%s: server does not support IDLE; watcher disabled for it.", account)
+                return
+            log.info("%s: IDLE session open.", account)
+            failures = 0
+            while not stop.is_set():
+                if idle_once(imap, stop):
+                    on_new_mail()
+        except Exception as exc:
+            # includes socket timeouts: a half-open connection is a dropped session
+            delay = RECONNECT_BACKOFF_SECONDS[min(failures, len(RECONNECT_BACKOFF_SECONDS) - 1)]
+            failures += 1
+            log.warning("%s: IDLE session lost (%s) — reconnecting in %ds.", account, exc, delay)
+            stop.wait(delay)
+        finally:
+            if imap is not None:
+                try:
+                    imap.logout()
+                except Exception:
+                    pass
@@ -0,0 +1,206 @@
+"""
+watcher/main.py — Gmail push trigger service.
+Holds an IMAP IDLE session (watcher/idle.py, one thread each) for every
+connected Gmail integration. EXISTS notifications are debounced per user: the
+first one starts a WATCHER_DEBOUNCE_SECONDS quiet timer, later ones restart it,
+and WATCHER_MAX_DELAY_SECONDS caps the total wait. When it fires, the mailbox
+is compared with the committed UID watermark (agent/mail_sync.py) and one
+triggered_by="gmail_push" run is enqueued through the normal single-flight path
+only if there is unprocessed mail. If an equivalent run is already in flight the
+check is retried after it has had time to finish.
+The account list is reloaded every WATCHER_REFRESH_SECONDS, so connecting,
+disconnecting or changing Gmail credentials takes effect without a restart.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import signal
+import sys
+import threading
+from typing import Dict, Optional, Tuple
+
+# Ensure repo root is importable
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import redis.asyncio as aioredis
+from sqlalchemy import select
+
+from agent import mail_sync
+from agent.integrations import gmail
+from agent.integrations.blocking import run_blocking
+from backend.services.agent_svc import DEFAULT_RUN_INPUT, enqueue_run
+from core.config import get_settings
+from core.encryption import decrypt_dict
+from db.base import session_context
+from db.models import Integration
+from watcher.idle import watch_account
+
+logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s — %(message)s")
+log = logging.getLogger("watcher")
+
+WATCHER_DEBOUNCE_SECONDS = float(os.environ.get("WATCHER_DEBOUNCE_SECONDS", "20"))
+WATCHER_MAX_DELAY_SECONDS = float(os.environ.get("WATCHER_MAX_DELAY_SECONDS", "120"))
+WATCHER_REFRESH_SECONDS = 60
+# Re-check after a push was absorbed by an in-flight run (mail may have landed after it read the inbox)
+WATCHER_INFLIGHT_RETRY_SECONDS = 300
+
+
+class _Session:
+    def __init__(self, account: str, fingerprint: str, stop: threading.Event, thread: threading.Thread) -> None:
+        self.account = account
+        self.fingerprint = fingerprint
+        self.stop = stop
+        self.thread = thread
+
+
+class Watcher:
+    def __init__(self, redis_url: str) -> None:
+        self._redis = aioredis.from_url(redis_url, decode_responses=True)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._sessions: Dict[int, _Session] = {}
+        self._creds: Dict[int, Dict[str, str]] = {}
+        # user_id → (timer, first notification time)
+        self._pending: Dict[int, Tuple[asyncio.TimerHandle, float]] = {}
+        self._triggers: set[asyncio.Task] = set()
+
+    async def _load_accounts(self) -> Dict[int, Dict[str, str]]:
+        async with session_context() as db:
+            result = await db.execute(
+                select(Integration.user_id, Integration.encrypted_credentials).where(
+                    Integration.platform == "gmail",
+                    Integration.status == "connected",
+                )
+            )
+            rows = result.all()
+        accounts: Dict[int, Dict[str, str]] = {}
+        for user_id, encrypted in rows:
+            try:
+                creds = decrypt_dict(encrypted)
+            except Exception as exc:
+                log.error("Failed to decrypt Gmail credentials for user %d: %s", user_id, exc)
+                continue
+            if creds.get("email") and creds.get("app_password"):
+                accounts[user_id] = creds
+        return accounts
+
+    async def refresh(self) -> None:
+        """Start, restart or stop IDLE threads to match the connected accounts."""
+        accounts = await self._load_accounts()
+        for user_id in list(self._sessions):
+            session = self._sessions[user_id]
+            creds = accounts.get(user_id)
+            if creds is None or _fingerprint(creds) != session.fingerprint:
+                log.info("Stopping watcher for user %d (%s).", user_id, session.account)
+                session.stop.set()
+                del self._sessions[user_id]
+        for user_id, creds in accounts.items():
+            self._creds[user_id] = creds
+            if user_id not in self._sessions:
+                self._start(user_id, creds)
+        for user_id in list(self._creds):
+            if user_id not in accounts:
+                self._creds.pop(user_id, None)
+
+    def _start(self, user_id: int, creds: Dict[str, str]) -> None:
+        stop = threading.Event()
+        thread = threading.Thread(
+            target=watch_account,
+            args=(creds["email"], creds, lambda: self._notify(user_id), stop),
+            name=f"idle-{user_id}",
+            daemon=True,
+        )
+        self._sessions[user_id] = _Session(creds["email"], _fingerprint(creds), stop, thread)
+        thread.start()
+
+    def _notify(self, user_id: int) -> None:
+        """Called from an IDLE thread."""
+        self._loop.call_soon_threadsafe(self._debounce, user_id)
+
+    def _debounce(self, user_id: int, delay: float = WATCHER_DEBOUNCE_SECONDS) -> None:
+        now = self._loop.time()
+        timer, first = self._pending.get(user_id, (None, now))
+        if timer is not None:
+            timer.cancel()
+        fire_at = min(now + delay, first + max(delay, WATCHER_MAX_DELAY_SECONDS))
+        handle = self._loop.call_at(fire_at, self._fire, user_id)
+        self._pending[user_id] = (handle, first)
+
+    def _fire(self, user_id: int) -> None:
+        self._pending.pop(user_id, None)
+        task = self._loop.create_task(self._trigger(user_id))
+        self._triggers.add(task)
+        task.add_done_callback(self._triggers.discard)
+
+    async def _has_new_mail(self, user_id: int, creds: Dict[str, str]) -> bool:
+        since = await mail_sync.load_watermark(user_id, creds["email"], run_id=0)
+        if since is None:
+            return True
+
+        def _check() -> bool:
+            with gmail.imap_session(creds) as imap:
+                status = gmail.mailbox_status(imap, "INBOX")
+            return status["uid_validity"] != since["uid_validity"] or status["uid_next"] - 1 > since["last_uid"]
+
+        return await run_blocking("gmail", _check)
+
+    async def _trigger(self, user_id: int) -> None:
+        creds = self._creds.get(user_id)
+        if creds is None:
+            return
+        try:
+            if not await self._has_new_mail(user_id, creds):
+                log.info("Push for user %d: nothing beyond the watermark, no run.", user_id)
+                return
+            run_id, deduplicated = await enqueue_run(self._redis, user_id, "gmail_push", DEFAULT_RUN_INPUT)
+            if deduplicated:
+                log.info("Push for user %d absorbed by in-flight run %d; re-checking later.", user_id, run_id)
+                self._debounce(user_id, WATCHER_INFLIGHT_RETRY_SECONDS)
+            else:
+                log.info("Push for user %d queued run %d.", user_id, run_id)
+        except Exception as exc:
+            log.error("Push trigger for user %d failed: %s", user_id, exc)
+
+    async def run(self) -> None:
+        self._loop = asyncio.get_running_loop()
+        try:
+            while True:
+                try:
+                    await self.refresh()
+                except Exception as exc:
+                    log.error("Failed to refresh watched accounts: %s", exc)
+                await asyncio.sleep(WATCHER_REFRESH_SECONDS)
+        finally:
+            for session in self._sessions.values():
+                session.stop.set()
+            for timer, _ in self._pending.values():
+                timer.cancel()
+            if self._triggers:
+                await asyncio.gather(*self._triggers, return_exceptions=True)
+            gmail.close_sessions()
+            await self._redis.aclose()
+
+
+def _fingerprint(creds: Dict[str, str]) -> str:
+    return hashlib.sha256(f"{creds.get('email')}:{creds.get('app_password')}".encode("utf-8")).hexdigest()
+
+
+async def main() -> None:
+    settings = get_settings(required=["DATABASE_URL", "REDIS_URL", "ENCRYPTION_KEY"])
+    log.info("Gmail watcher starting.")
+    task = asyncio.create_task(Watcher(settings.redis_url).run())
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, task.cancel)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+    log.info("Gmail watcher stopped.")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
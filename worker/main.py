@@ -1,17 +1,30 @@
 """
 worker/main.py — Redis queue consumer and LangGraph agent dispatcher.
-Single async loop: BLPOP toora:agent_jobs → create AgentRun → run agent.
+Single async loop: fetch from the job queue (core/queue.py) → create AgentRun → run agent.
 Uses redis.asyncio to avoid asyncio.run() per job (which caused SQLAlchemy
 "another operation is in progress" with shared async engine).
+
+Up to WORKER_CONCURRENCY jobs run at once as supervised asyncio tasks. The loop
+only fetches a new job when a slot is free, so excess jobs stay in Redis where
+other worker replicas can pick them up. With the Streams backend a job is acked
+only after process_job returns; if the worker dies mid-run the job is reclaimed
+by another replica.
+
+With WORKER_PROCESSES > 1, main() runs as a prefork supervisor: it imports the
+heavy agent stack once, then forks that many consumer processes that share the
+warm (copy-on-write) module pages, and restarts any child that exits.
 """
 
 from __future__ import annotations
 
 import asyncio
-import json
+import gc
+import importlib
 import logging
 import os
+import signal
 import sys
+import time
 from datetime import datetime, timezone
 
 # Ensure repo root is importable
@@ -19,15 +32,36 @@ sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
 
 import redis.asyncio as aioredis
 
+from core import credentials, http_client, singleflight
 from core.config import get_settings
+from core.queue import JOB_QUEUE_BACKEND, Job, ListConsumer, StreamConsumer, make_consumer
 from db.base import session_context
 from db.models import AgentRun
 from worker.publisher import publish_status
+from worker.scheduler import run_scheduler, schedule_resume_retry
 
 logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s — %(message)s")
 log = logging.getLogger("worker")
 
-REDIS_JOB_QUEUE = "toora:agent_jobs"
+# Max agent runs in flight per worker process (1 = previous sequential behaviour)
+WORKER_CONCURRENCY = max(1, int(os.environ.get("WORKER_CONCURRENCY", "4")))
+# Consumer processes forked by the supervisor (1 = run in this process, no fork)
+WORKER_PROCESSES = max(1, int(os.environ.get("WORKER_PROCESSES", "1")))
+CHILD_RESTART_DELAY_SECONDS = 1
+
+# Imported before the first job (and before forking) so no run pays for them
+PRELOAD_MODULES = (
+    "langchain_openai",
+    "langgraph.prebuilt",
+    "agent.graph",
+    "agent.integrations.gmail",
+    "agent.integrations.google_calendar",
+    "agent.integrations.search",
+    "googleapiclient.discovery",
+    "duckduckgo_search",
+)
+
+_process_started = time.perf_counter()
 
 
 async def _create_run(user_id: int, triggered_by: str) -> int:
@@ -45,49 +79,289 @@ async def _create_run(user_id: int, triggered_by: str) -> int:
     return run_id
 
 
+async def _mark_running(run_id: int) -> None:
+    """Flip a run queued by the backend (status "queued") to running."""
+    async with session_context() as db:
+        run = await db.get(AgentRun, run_id)
+        if run:
+            run.status = "running"
+
+
+async def _release_inflight(redis_url: str, run_id: int) -> None:
+    try:
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        await singleflight.release(r, run_id)
+        await r.aclose()
+    except Exception as exc:
+        log.error("Failed to release in-flight key for run %d: %s", run_id, exc)
+
+
+async def _fail_dead_job(redis_url: str, job: dict, reason: str) -> None:
+    """A job that will never run again: fail its run and free the single-flight key,
+    otherwise duplicates keep attaching to it until INFLIGHT_TTL_SECONDS."""
+    run_id = job.get("run_id")
+    if run_id is None:
+        return
+    async with session_context() as db:
+        run = await db.get(AgentRun, run_id)
+        if run and run.status not in ("completed", "failed", "cancelled"):
+            run.status = "failed"
+            run.completed_at = datetime.now(tz=timezone.utc)
+            run.summary = f"Job abandoned: {reason}"[:2000]
+    log.error("Run %d marked failed: %s", run_id, reason)
+    from agent import mail_sync
+    await mail_sync.discard_run(run_id)
+    await publish_status(redis_url, run_id, "idle", {"error": reason})
+    await _release_inflight(redis_url, run_id)
+
+
+async def _process_resume(job: dict, redis_url: str) -> None:
+    """Continue a run that was suspended waiting for approval."""
+    from agent.graph import resume_agent
+    run_id = job["run_id"]
+    user_id = job.get("user_id", 1)
+    log.info("Resuming run %d after approval decision.", run_id)
+    resumed = await resume_agent(run_id, user_id, job.get("approval_id"), job.get("approved"))
+    if not resumed:
+        # Another worker holds the run. It re-checks for new decisions when it
+        # releases; the delayed retry only covers a holder that crashed
+        r = aioredis.from_url(redis_url, decode_responses=True)
+        try:
+            if not await schedule_resume_retry(r, job):
+                log.warning("Run %d still locked after %d resume retries; giving up on this job.", run_id, job.get("retry", 0))
+        finally:
+            await r.aclose()
+
+
 async def process_job(job: dict, redis_url: str) -> None:
+    if job.get("type") == "resume":
+        await _process_resume(job, redis_url)
+        return
+
     user_id = job.get("user_id", 1)
     triggered_by = job.get("triggered_by", "manual")
     user_input = job.get("input", "Process my inbox and provide a daily briefing.")
 
     log.info("Processing job: user_id=%s, triggered_by=%s", user_id, triggered_by)
-    run_id = await _create_run(user_id, triggered_by)
+    # Jobs queued through agent_svc.enqueue_run already have a run row
+    run_id = job.get("run_id")
+    if run_id is None:
+        run_id = await _create_run(user_id, triggered_by)
+    else:
+        await _mark_running(run_id)
     await publish_status(redis_url, run_id, "running")
 
     try:
         from agent.graph import run_agent
-        summary = await run_agent(run_id, user_input)
+        summary = await run_agent(run_id, user_input, user_id=user_id)
         log.info("Run %d completed: %s", run_id, summary[:100])
     except Exception as exc:
         log.error("Run %d failed: %s", run_id, exc)
         await publish_status(redis_url, run_id, "idle", {"error": str(exc)})
+        await _release_inflight(redis_url, run_id)
+
+
+async def _run_job(consumer: ListConsumer | StreamConsumer, job: Job, redis_url: str) -> None:
+    """Run one job under a lease and ack it on completion. An exception leaves it
+    unacked so the Streams backend redelivers it (up to JOB_MAX_DELIVERIES)."""
+    async with consumer.lease(job):
+        await process_job(job.payload, redis_url)
+    await consumer.ack(job)
+
+
+def _on_job_done(task: asyncio.Task, slots: asyncio.Semaphore, in_flight: set[asyncio.Task]) -> None:
+    """Release the slot and surface any error that escaped process_job."""
+    in_flight.discard(task)
+    slots.release()
+    if task.cancelled():
+        return
+    exc = task.exception()
+    if exc is not None:
+        log.error("Job task %s crashed: %s", task.get_name(), exc, exc_info=exc)
 
 
 async def run_loop() -> None:
     settings = get_settings(
         required=["DATABASE_URL", "REDIS_URL", "ENCRYPTION_KEY"]
     )
-    log.info("Toora worker started. Listening on queue: %s", REDIS_JOB_QUEUE)
+    log.info(
+        "Toora worker started. Queue backend: %s (concurrency=%d)",
+        JOB_QUEUE_BACKEND,
+        WORKER_CONCURRENCY,
+    )
 
     r = aioredis.from_url(settings.redis_url, decode_responses=True)
+    consumer = make_consumer(r, on_dead_letter=lambda job, reason: _fail_dead_job(settings.redis_url, job, reason))
+    await consumer.setup()
+    log.info("Worker pid %d ready in %.0f ms.", os.getpid(), (time.perf_counter() - _process_started) * 1000)
+    scheduler_task = asyncio.create_task(run_scheduler(settings.redis_url), name="scheduler")
+    from agent import cache as agent_cache
+    from agent import checkpoint, extraction, outbox, search_cache
+    from agent.integrations import blocking, gmail
+    from agent.action_log import action_log_writer
+    cache_task = asyncio.create_task(
+        agent_cache.listen_for_invalidation(settings.redis_url), name="agent-cache-invalidation"
+    )
+    outbox_task = asyncio.create_task(outbox.run_sender(settings.redis_url), name="outbox-sender")
+    # Start the extraction processes now rather than on the first read_webpage
+    warm_task = asyncio.create_task(extraction.warm(), name="extraction-warmup")
+    creds_task = asyncio.create_task(
+        credentials.listen_for_invalidation(settings.redis_url), name="credential-cache-invalidation"
+    )
+    slots = asyncio.Semaphore(WORKER_CONCURRENCY)
+    in_flight: set[asyncio.Task] = set()
+    job_seq = 0
 
-    while True:
-        try:
-            result = await r.brpop(REDIS_JOB_QUEUE, timeout=30)
-            if result is None:
+    try:
+        while True:
+            # Backpressure: don't take a job off the queue until we can run it
+            await slots.acquire()
+            try:
+                job = await consumer.fetch(timeout=30)
+                if job is None:
+                    slots.release()
+                    continue
+            except aioredis.ConnectionError as exc:
+                slots.release()
+                log.error("Redis connection error: %s — retrying in 5s", exc)
+                await asyncio.sleep(5)
+                continue
+            except Exception as exc:
+                slots.release()
+                log.error("Unexpected error in worker loop: %s", exc, exc_info=True)
                 continue
-            _, raw = result
-            job = json.loads(raw)
-            await process_job(job, settings.redis_url)
-        except aioredis.ConnectionError as exc:
-            log.error("Redis connection error: %s — retrying in 5s", exc)
-            await asyncio.sleep(5)
+
+            job_seq += 1
+            task = asyncio.create_task(
+                _run_job(consumer, job, settings.redis_url), name=f"job-{job_seq}"
+            )
+            in_flight.add(task)
+            task.add_done_callback(lambda t: _on_job_done(t, slots, in_flight))
+    finally:
+        scheduler_task.cancel()
+        cache_task.cancel()
+        creds_task.cancel()
+        outbox_task.cancel()
+        if in_flight:
+            log.info("Worker stopping — waiting for %d in-flight run(s).", len(in_flight))
+            await asyncio.gather(*in_flight, return_exceptions=True)
+        await action_log_writer.aclose()
+        await checkpoint.close_checkpointer()
+        await agent_cache.close()
+        await search_cache.close()
+        warm_task.cancel()
+        extraction.shutdown()
+        blocking.shutdown()
+        gmail.close_sessions()
+        await http_client.aclose()
+        await r.aclose()
+
+
+def preload_modules() -> None:
+    """Import the agent stack up front and log how long each module took."""
+    total_start = time.perf_counter()
+    for name in PRELOAD_MODULES:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
         except Exception as exc:
-            log.error("Unexpected error in worker loop: %s", exc, exc_info=True)
+            log.warning("Preload of %s failed: %s", name, exc)
+            continue
+        log.info("Preloaded %s in %.0f ms", name, (time.perf_counter() - start) * 1000)
+    log.info("Preload finished in %.0f ms", (time.perf_counter() - total_start) * 1000)
+
+
+async def _serve() -> None:
+    """run_loop with SIGTERM/SIGINT cancelling it, so its shutdown path (drain
+    in-flight runs, flush the action log, close pools) runs on stop and deploy."""
+    task = asyncio.create_task(run_loop(), name="run-loop")
+    loop = asyncio.get_running_loop()
+
+    def _stop() -> None:
+        if not task.done() and not task.cancelling():
+            log.info("Worker pid %d stopping.", os.getpid())
+            task.cancel()
+
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, _stop)
+    try:
+        await task
+    except asyncio.CancelledError:
+        pass
+
+
+def _spawn_child(index: int) -> int:
+    pid = os.fork()
+    if pid:
+        return pid
+    # ── child ──
+    global _process_started
+    _process_started = time.perf_counter()
+    # Drop the supervisor's handlers; _serve installs the graceful ones on the child's loop
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    code = 0
+    try:
+        log.info("Worker child %d started (pid %d).", index, os.getpid())
+        asyncio.run(_serve())
+    except BaseException as exc:
+        log.error("Worker child %d crashed: %s", index, exc, exc_info=True)
+        code = 1
+    finally:
+        logging.shutdown()
+        os._exit(code)
+
+
+def supervise(processes: int) -> None:
+    """Prefork supervisor: preload, fork `processes` consumers, restart them on exit.
+    Nothing here may open DB/Redis connections — they must be created after fork."""
+    preload_modules()
+    # Keep preloaded objects out of the cyclic GC so children don't dirty the shared pages
+    gc.freeze()
+
+    children: dict[int, int] = {}
+    stopping = False
+
+    def _stop(signum, _frame) -> None:
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, _stop)
+    signal.signal(signal.SIGINT, _stop)
+
+    for index in range(processes):
+        children[_spawn_child(index)] = index
+    log.info(
+        "Supervisor pid %d running %d worker process(es); startup took %.0f ms.",
+        os.getpid(), processes, (time.perf_counter() - _process_started) * 1000,
+    )
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        except InterruptedError:
+            continue
+        index = children.pop(pid, None)
+        if index is None or stopping:
+            continue
+        log.warning("Worker child %d (pid %d) exited with status %d — restarting.", index, pid, status)
+        time.sleep(CHILD_RESTART_DELAY_SECONDS)
+        children[_spawn_child(index)] = index
 
 
 def main() -> None:
-    asyncio.run(run_loop())
+    if WORKER_PROCESSES > 1:
+        supervise(WORKER_PROCESSES)
+        return
+    preload_modules()
+    asyncio.run(_serve())
 
 
 if __name__ == "__main__":
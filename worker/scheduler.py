@@ -0,0 +1,163 @@
+"""
+worker/scheduler.py — Fires scheduled agent runs from the toora:schedule sorted set.
+Each tick atomically claims the members whose due time has passed (ZRANGEBYSCORE,
+O(log n + m)) by pushing them a lease into the future, enqueues a
+triggered_by="schedule" job for each, then sets their real next due time.
+Safe to run in every worker replica; a crash between claim and reschedule only
+delays that user by SCHEDULE_LEASE_SECONDS.
+
+The same loop expires approvals of suspended runs (toora:approval_expiry) and
+enqueues a resume job so the run continues with an "expired" decision, and
+re-enqueues resume jobs that found the run locked (toora:resume_retry) after a
+bounded backoff.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import time
+from typing import Any, Dict
+
+import redis.asyncio as aioredis
+from sqlalchemy import select
+
+from backend.services.agent_svc import enqueue_run
+from core.queue import enqueue_job
+from core.schedule import REDIS_SCHEDULE_KEY, SCHEDULE_INTERVALS, next_due, set_user_schedule
+from db.base import session_context
+from db.models import AgentConfig, AgentRun, PendingApproval
+
+log = logging.getLogger(__name__)
+
+SCHEDULER_TICK_SECONDS = 15
+SCHEDULE_LEASE_SECONDS = 300
+SCHEDULE_BATCH = 100
+SCHEDULED_RUN_INPUT = "Process my inbox and provide a daily briefing."
+REDIS_APPROVAL_EXPIRY_KEY = "toora:approval_expiry"
+# Delayed resume jobs: member = job JSON, score = due time
+REDIS_RESUME_RETRY_KEY = "toora:resume_retry"
+# Backoff per retry; the last one lands well after a crashed holder's lock (60s) expires
+RESUME_RETRY_DELAYS = (30, 90, 180)
+
+# KEYS[1] = schedule zset; ARGV = now, batch size, lease seconds
+_CLAIM_DUE = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, tonumber(ARGV[2]))
+for _, member in ipairs(due) do
+  redis.call('ZADD', KEYS[1], tonumber(ARGV[1]) + tonumber(ARGV[3]), member)
+end
+return due
+"""
+
+
+async def bootstrap_schedules(r: aioredis.Redis) -> None:
+    """Seed the zset from agent_config once at startup (keeps existing due times)."""
+    async with session_context() as db:
+        result = await db.execute(
+            select(AgentConfig.user_id, AgentConfig.schedule).where(
+                AgentConfig.schedule.in_(list(SCHEDULE_INTERVALS))
+            )
+        )
+        rows = result.all()
+    for user_id, schedule in rows:
+        await set_user_schedule(r, user_id, schedule, keep_existing=True)
+    log.info("Scheduler bootstrapped %d scheduled user(s).", len(rows))
+
+
+async def _current_schedule(user_id: int) -> str:
+    async with session_context() as db:
+        result = await db.execute(
+            select(AgentConfig.schedule).where(AgentConfig.user_id == user_id)
+        )
+        return result.scalar_one_or_none() or "manual"
+
+
+async def _tick(r: aioredis.Redis, claim_due) -> int:
+    due = await claim_due(
+        keys=[REDIS_SCHEDULE_KEY],
+        args=[time.time(), SCHEDULE_BATCH, SCHEDULE_LEASE_SECONDS],
+    )
+    for member in due:
+        user_id = int(member)
+        # The zset is kept in sync by update_config, but re-check in case it drifted
+        schedule = await _current_schedule(user_id)
+        if next_due(schedule) is None:
+            await r.zrem(REDIS_SCHEDULE_KEY, member)
+            continue
+        run_id, attached = await enqueue_run(r, user_id, "schedule", SCHEDULED_RUN_INPUT)
+        await set_user_schedule(r, user_id, schedule)
+        log.info(
+            "Scheduled run %s for user %d (%s): run %d.",
+            "attached" if attached else "enqueued", user_id, schedule, run_id,
+        )
+    return len(due)
+
+
+async def _expire_approvals(r: aioredis.Redis) -> None:
+    """Expire overdue approvals of suspended runs and wake those runs up."""
+    from agent.approval import expire_approval
+
+    due = await r.zrangebyscore(REDIS_APPROVAL_EXPIRY_KEY, "-inf", time.time(), start=0, num=SCHEDULE_BATCH)
+    for member in due:
+        # ZREM is the claim: exactly one of resolve() / this sweep wins
+        if await r.zrem(REDIS_APPROVAL_EXPIRY_KEY, member) != 1:
+            continue
+        approval_id = int(member)
+        await expire_approval(approval_id)
+        async with session_context() as db:
+            result = await db.execute(
+                select(AgentRun.id, AgentRun.user_id)
+                .join(PendingApproval, PendingApproval.run_id == AgentRun.id)
+                .where(PendingApproval.id == approval_id)
+            )
+            row = result.one_or_none()
+        if row is None:
+            continue
+        run_id, user_id = row
+        await enqueue_job(r, {"type": "resume", "run_id": run_id, "user_id": user_id, "approval_id": approval_id})
+        log.info("Approval %d expired; resuming run %d.", approval_id, run_id)
+
+
+async def schedule_resume_retry(r: aioredis.Redis, job: Dict[str, Any]) -> bool:
+    """Re-enqueue a resume job later with backoff; False once its retries are used up."""
+    retry = int(job.get("retry", 0))
+    if retry >= len(RESUME_RETRY_DELAYS):
+        return False
+    member = json.dumps({**job, "retry": retry + 1}, sort_keys=True)
+    await r.zadd(REDIS_RESUME_RETRY_KEY, {member: time.time() + RESUME_RETRY_DELAYS[retry]})
+    return True
+
+
+async def _retry_resumes(r: aioredis.Redis) -> None:
+    due = await r.zrangebyscore(REDIS_RESUME_RETRY_KEY, "-inf", time.time(), start=0, num=SCHEDULE_BATCH)
+    for member in due:
+        # ZREM is the claim across worker replicas
+        if await r.zrem(REDIS_RESUME_RETRY_KEY, member) != 1:
+            continue
+        await enqueue_job(r, json.loads(member))
+
+
+async def run_scheduler(redis_url: str) -> None:
+    """Long-running task started by the worker loop."""
+    r = aioredis.from_url(redis_url, decode_responses=True)
+    claim_due = r.register_script(_CLAIM_DUE)
+    try:
+        try:
+            await bootstrap_schedules(r)
+        except Exception as exc:
+            log.error("Scheduler bootstrap failed: %s", exc)
+        while True:
+            try:
+                await _expire_approvals(r)
+                await _retry_resumes(r)
+                fired = await _tick(r, claim_due)
+                if fired >= SCHEDULE_BATCH:
+                    continue  # backlog — drain without sleeping
+            except aioredis.ConnectionError as exc:
+                log.error("Scheduler Redis error: %s", exc)
+            except Exception as exc:
+                log.error("Scheduler tick failed: %s", exc, exc_info=True)
+            await asyncio.sleep(SCHEDULER_TICK_SECONDS)
+    finally:
+        await r.aclose()